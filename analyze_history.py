@@ -0,0 +1,50 @@
+import argparse
+import time
+from datetime import datetime, timezone
+
+from app.history import load_history
+from app.analytics import question_difficulty, theme_time_series
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Difficulté, discrimination et séries par thème d'un export d'historique (nécessite NumPy)"
+    )
+    parser.add_argument('history_file', nargs='?', default='instance/history.cqh')
+    parser.add_argument('--period', choices=['day', 'week'], default='week')
+    parser.add_argument('--min-answers', type=int, default=20, help="Réponses minimum par question")
+    parser.add_argument('--top', type=int, default=10, help="Questions affichées par classement")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    history = load_history(args.history_file, use_numpy=True)
+    loaded = time.perf_counter()
+    questions = question_difficulty(history, min_answers=args.min_answers)
+    series = theme_time_series(history, period=args.period)
+    elapsed = time.perf_counter() - loaded
+    print(f"{len(history)} réponses chargées en {loaded - start:.2f} s, analysées en {elapsed:.2f} s")
+
+    import numpy as np
+
+    print(f"\nQuestions les plus difficiles (au moins {args.min_answers} réponses) :")
+    for i in np.argsort(questions['p_correct'])[:args.top]:
+        print(f"  #{questions['question_id'][i]:<6} {questions['p_correct'][i]:6.1%} de réussite"
+              f"  ({questions['answers'][i]} réponses, discrimination {questions['discrimination'][i]:+.2f})")
+
+    print("\nQuestions les moins discriminantes :")
+    defined = np.flatnonzero(~np.isnan(questions['discrimination']))
+    for i in defined[np.argsort(questions['discrimination'][defined])][:args.top]:
+        print(f"  #{questions['question_id'][i]:<6} discrimination {questions['discrimination'][i]:+.2f}"
+              f"  ({questions['p_correct'][i]:.1%} de réussite)")
+
+    print(f"\nRéussite par thème, dernières périodes ({args.period}) :")
+    periods = series['periods'][-4:]
+    print(' ' * 42 + ''.join(
+        f"{datetime.fromtimestamp(int(p), timezone.utc):%d/%m/%Y}".rjust(12) for p in periods
+    ))
+    for theme, values in zip(series['themes'], series['p_correct'][:, -4:]):
+        print(f"  {theme[:40]:<40}" + ''.join('           -' if np.isnan(v) else f"{v:12.1%}" for v in values))
+
+
+if __name__ == "__main__":
+    main()
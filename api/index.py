@@ -0,0 +1,7 @@
+"""Point d'entrée Vercel : l'application WSGI de run.py.
+
+vercel.json exécute build_snapshot.py et precompile.py au build ; leurs
+fichiers (instance/questions.snap, instance/jinja_cache) sont inclus dans la
+fonction.
+"""
+from run import app  # noqa: F401
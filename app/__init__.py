@@ -1,23 +1,50 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from config import Config
+from .database import RoutingSession
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    mode = app.config.get('STARTUP_MODE', 'full')
+    if mode not in ('full', 'fast'):
+        raise ValueError(f"STARTUP_MODE inconnu : {mode}")
+
+    from .startup import configure_templates
+    configure_templates(app)
+
     # Expose some Python builtins to Jinja templates (used in templates)
     app.jinja_env.globals.update(enumerate=enumerate, chr=chr, max=max, min=min, range=range)
 
 
+    from .database import configure as configure_database, init_app as init_database
+    configure_database(app)
     db.init_app(app)
+    init_database(app, db)
+
+    from .instrumentation import init_app as init_instrumentation
+    init_instrumentation(app)
 
     with app.app_context():
         from . import models 
         from . import routes
-        db.create_all()
+
+        # Mode 'fast' : une requête suffit si le schéma est déjà à jour
+        from .startup import schema_is_current
+        if mode == 'full' or not schema_is_current():
+            db.create_all()
+
+            from .migrations import upgrade
+            upgrade()
+
+            from .stats import ensure_question_stats
+            ensure_question_stats()
+
+    from .ingestion import init_app as init_ingestion
+    init_ingestion(app)
 
     return app
\ No newline at end of file
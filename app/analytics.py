@@ -0,0 +1,106 @@
+"""Analyse vectorisée d'un export d'historique (app.history), avec NumPy.
+
+Tous les indicateurs sont calculés en une passe de np.bincount sur les
+colonnes de l'export, sans boucle Python par réponse :
+
+- difficulté d'une question : taux de bonnes réponses (p), et nombre de réponses ;
+- discrimination : corrélation point-bisériale entre la réussite à la question
+  et le taux de réussite de l'apprenant sur ses autres réponses (score de
+  reste). Proche de 0 ou négative, la question ne distingue pas les
+  apprenants qui maîtrisent le programme ;
+- séries temporelles par thème : réponses et taux de réussite par thème et par
+  période (jour ou semaine de la date du quiz).
+
+NumPy est une dépendance optionnelle, nécessaire à ce module seulement.
+"""
+try:
+    import numpy as np
+except ImportError:  # Dépendance optionnelle
+    np = None
+
+PERIODS = {'day': 86400, 'week': 7 * 86400}
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("L'analyse de l'historique nécessite NumPy (pip install numpy)")
+
+
+def question_difficulty(history, min_answers=1):
+    """Difficulté et discrimination par question.
+
+    Retourne un dict de tableaux alignés : question_id, answers, p_correct,
+    discrimination (NaN si elle n'est pas définie : moins de deux réponses,
+    ou réussite ou score de reste constants).
+    """
+    _require_numpy()
+    question = history.question_id.astype(np.intp)
+    user = history.user_id.astype(np.intp)
+    correct = history.is_correct.astype(np.float64)
+
+    # Score de reste : taux de réussite de l'apprenant sans la réponse courante
+    user_answers = np.bincount(user)
+    user_correct = np.bincount(user, weights=correct)
+    others = user_answers[user] - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rest = np.where(others > 0, (user_correct[user] - correct) / np.maximum(others, 1), np.nan)
+
+    # Sommes par question pour la corrélation de Pearson entre réussite (x) et score de reste (y)
+    valid = ~np.isnan(rest)
+    q, x, y = question[valid], correct[valid], rest[valid]
+    size = question.max() + 1 if len(question) else 0
+    n = np.bincount(q, minlength=size)
+    sx = np.bincount(q, weights=x, minlength=size)
+    sy = np.bincount(q, weights=y, minlength=size)
+    sxy = np.bincount(q, weights=x * y, minlength=size)
+    sxx = np.bincount(q, weights=x * x, minlength=size)
+    syy = np.bincount(q, weights=y * y, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n * sxy - sx * sy
+        var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+        discrimination = np.where(var > 0, cov / np.sqrt(np.where(var > 0, var, 1)), np.nan)
+
+    answers = np.bincount(question, minlength=size)
+    correct_answers = np.bincount(question, weights=correct, minlength=size)
+    ids = np.flatnonzero(answers >= max(min_answers, 1))
+    return {
+        'question_id': ids,
+        'answers': answers[ids],
+        'p_correct': correct_answers[ids] / answers[ids],
+        'discrimination': discrimination[ids],
+    }
+
+
+def theme_time_series(history, period='day'):
+    """Réponses et taux de réussite par thème et par période.
+
+    Retourne un dict : themes (noms), periods (début de chaque période, en
+    secondes depuis l'epoch), answers et p_correct (tableaux thèmes × périodes ;
+    p_correct vaut NaN pour une période sans réponse).
+    """
+    _require_numpy()
+    if period not in PERIODS:
+        raise ValueError(f"Période inconnue : {period}")
+    if len(history) == 0:
+        return {'themes': list(history.themes), 'periods': np.empty(0, dtype=np.int64),
+                'answers': np.zeros((len(history.themes), 0), dtype=np.int64),
+                'p_correct': np.zeros((len(history.themes), 0))}
+    step = PERIODS[period]
+    buckets = history.created_at // step
+    first = buckets.min()
+    bucket = (buckets - first).astype(np.intp)
+    num_periods = int(bucket.max()) + 1
+    num_themes = len(history.themes)
+
+    cell = history.theme.astype(np.intp) * num_periods + bucket
+    answers = np.bincount(cell, minlength=num_themes * num_periods).reshape(num_themes, num_periods)
+    correct = np.bincount(cell, weights=history.is_correct, minlength=num_themes * num_periods) \
+        .reshape(num_themes, num_periods)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_correct = np.where(answers > 0, correct / np.maximum(answers, 1), np.nan)
+    return {
+        'themes': list(history.themes),
+        'periods': (first + np.arange(num_periods)) * step,
+        'answers': answers,
+        'p_correct': p_correct,
+    }
@@ -0,0 +1,319 @@
+"""Cache en mémoire de la banque de questions, partagé par tout le processus.
+
+Les questions sont indexées par thème et par statut sous forme d'ensembles de
+bits (un entier Python dont le bit `n` correspond à la question d'ID `n`).
+Sélectionner ou compter des questions revient alors à des opérations & / |
+sur des entiers, sans requête supplémentaire.
+
+Le nombre de questions par thème et par statut est aussi précalculé et tenu à
+jour à chaque réponse enregistrée, pour que le comptage de la page de
+configuration ne dépende que du nombre de thèmes sélectionnés.
+
+Les IDs de chaque thème sont aussi gardés en tableaux triés, dans lesquels le
+tirage des quiz pioche directement : voir app.sampling.
+
+Le filtre 'due' (répétition espacée) dépend de l'heure et n'est pas mis en
+cache ici : voir app.review.
+
+Chaque banque de questions (app.banks) a son propre index, chargé et versionné
+séparément : sa version (nombre de questions, dernier updated_at) est lue par
+l'index (bank_id, updated_at), et ses questions par l'index couvrant
+(bank_id, theme, id). Le coût d'une requête sur une banque ne dépend donc pas
+du nombre ni de la taille des autres banques.
+"""
+import threading
+from array import array
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, func, select
+
+from app import db
+from app.models import Questions, QuestionStats
+from app.meta import revision_query, stats_revision_key
+from app.users import DEFAULT_USER_ID
+from app.banks import DEFAULT_BANK_ID
+
+
+def iter_bits(mask):
+    """Énumérer les positions des bits à 1 (donc les IDs de questions) d'un masque"""
+    digits = bin(mask)[:1:-1]  # bit de poids faible en premier
+    position = digits.find('1')
+    while position != -1:
+        yield position
+        position = digits.find('1', position + 1)
+
+
+def ids_mask(question_ids):
+    """Masque de bits d'une liste d'IDs de questions"""
+    mask = 0
+    for question_id in question_ids:
+        mask |= 1 << question_id
+    return mask
+
+
+# Statuts d'une question : jamais répondue, toujours correcte, toujours incorrecte, les deux
+NEW, CORRECT_ONLY, INCORRECT_ONLY, MIXED = range(4)
+
+FILTER_STATUSES = {
+    'new': (NEW,),
+    'answered': (CORRECT_ONLY, MIXED),
+    'incorrect': (INCORRECT_ONLY, MIXED),
+}
+
+
+def filter_statuses(question_filters):
+    """Statuts correspondant à une liste de filtres ('new', 'answered', 'incorrect')"""
+    return sorted({status for f in question_filters for status in FILTER_STATUSES.get(f, ())})
+
+
+class QuestionBank:
+    """Index des IDs de questions d'une banque par thème, partagé par tous les apprenants"""
+
+    def __init__(self, bank_version, rows, bank_id=DEFAULT_BANK_ID):
+        self.bank_id = bank_id
+        self.bank_version = bank_version
+        self.theme_masks = {}
+        self.question_themes = {}
+        self.all_mask = 0
+        for question_id, theme in rows:
+            bit = 1 << question_id
+            self.theme_masks[theme] = self.theme_masks.get(theme, 0) | bit
+            self.question_themes[question_id] = theme
+            self.all_mask |= bit
+        self.themes = sorted(self.theme_masks)
+        self.theme_ids = {theme: array('L', iter_bits(mask)) for theme, mask in self.theme_masks.items()}
+        self.learners = OrderedDict()  # user_id -> LearnerBank, du moins au plus récemment utilisé
+
+
+class LearnerBank:
+    """Statuts de réponse d'un apprenant sur la banque, par thème"""
+
+    def __init__(self, bank, user_id):
+        self.bank = bank
+        self.user_id = user_id
+        self.stats_version = None  # Statuts pas encore chargés
+        self.answered_mask = 0
+        self.correct_mask = 0  # Répondues correctement au moins une fois
+        self.incorrect_mask = 0  # Répondues incorrectement au moins une fois
+        self.error_counts = {}  # question -> (réponses, réponses incorrectes), pour le tirage pondéré
+        self.status_counts = {theme: [mask.bit_count(), 0, 0, 0] for theme, mask in bank.theme_masks.items()}
+
+    @property
+    def themes(self):
+        return self.bank.themes
+
+    def load_statuses(self, stats_version, rows):
+        all_mask = self.bank.all_mask
+        answered = correct = incorrect = 0
+        error_counts = {}
+        for question_id, attempts, correct_count in rows:
+            error_counts[question_id] = (attempts, attempts - correct_count)
+            bit = 1 << question_id
+            answered |= bit
+            if correct_count:
+                correct |= bit
+            if attempts > correct_count:
+                incorrect |= bit
+        self.answered_mask = answered & all_mask
+        self.correct_mask = correct & all_mask
+        self.incorrect_mask = incorrect & all_mask
+        self.error_counts = error_counts
+        self.stats_version = stats_version
+
+        both = self.correct_mask & self.incorrect_mask
+        for theme, mask in self.bank.theme_masks.items():
+            self.status_counts[theme] = [
+                (mask & ~self.answered_mask).bit_count(),
+                (mask & self.correct_mask & ~both).bit_count(),
+                (mask & self.incorrect_mask & ~both).bit_count(),
+                (mask & both).bit_count(),
+            ]
+
+    def status_of(self, question_id):
+        bit = 1 << question_id
+        correct = bool(self.correct_mask & bit)
+        incorrect = bool(self.incorrect_mask & bit)
+        if correct and incorrect:
+            return MIXED
+        if correct:
+            return CORRECT_ONLY
+        if incorrect:
+            return INCORRECT_ONLY
+        return NEW
+
+    def apply_answers(self, answers, stats_revision):
+        """Prendre en compte des réponses tout juste enregistrées sans recharger les statuts.
+
+        Les réponses ne sont appliquées que si elles sont la seule écriture depuis
+        l'état en cache (révision précédente) ; sinon le cache reste périmé et
+        get_bank() rechargera les statuts.
+        """
+        if stats_revision is None or self.stats_version != stats_revision - 1:
+            return
+        for answer in answers:
+            theme = self.bank.question_themes.get(answer.question_id)
+            if theme is None or answer.id is None:
+                continue
+            old_status = self.status_of(answer.question_id)
+            attempts, incorrect = self.error_counts.get(answer.question_id, (0, 0))
+            self.error_counts[answer.question_id] = (attempts + 1, incorrect + (0 if answer.is_correct else 1))
+            bit = 1 << answer.question_id
+            self.answered_mask |= bit
+            if answer.is_correct:
+                self.correct_mask |= bit
+            else:
+                self.incorrect_mask |= bit
+            new_status = self.status_of(answer.question_id)
+            if new_status != old_status:
+                counts = self.status_counts[theme]
+                counts[old_status] -= 1
+                counts[new_status] += 1
+        self.stats_version = stats_revision
+
+    def status_mask(self, question_filters):
+        mask = 0
+        if 'new' in question_filters:
+            mask |= self.bank.all_mask & ~self.answered_mask
+        if 'answered' in question_filters:
+            mask |= self.correct_mask
+        if 'incorrect' in question_filters:
+            mask |= self.incorrect_mask
+        return mask
+
+    def select(self, themes, question_filters):
+        """Masque des questions des thèmes donnés correspondant aux filtres"""
+        theme_mask = 0
+        for theme in themes:
+            theme_mask |= self.bank.theme_masks.get(theme, 0)
+        return theme_mask & self.status_mask(question_filters)
+
+    def count(self, themes, question_filters):
+        """Nombre de questions éligibles, en O(thèmes sélectionnés) grâce aux compteurs"""
+        statuses = filter_statuses(question_filters)
+        total = 0
+        for theme in set(themes):
+            counts = self.status_counts.get(theme)
+            if counts is not None:
+                total += sum(counts[status] for status in statuses)
+        return total
+
+    @property
+    def version(self):
+        return (self.bank.bank_id, self.bank.bank_version, self.user_id, self.stats_version)
+
+    def sample(self, themes, question_filters, num_questions, rng=None, exclude=0, within=None, **options):
+        """Tirer au hasard jusqu'à `num_questions` IDs de questions éligibles (voir app.sampling).
+
+        `exclude` retire des questions du tirage ; `within`, s'il est donné, le
+        restreint (résultats d'une recherche par exemple).
+        """
+        from app.sampling import sample_questions
+        return sample_questions(self, themes, question_filters, num_questions, rng=rng,
+                                exclude=exclude, within=within, **options)
+
+
+# Apprenants dont les statuts restent en cache (les moins récents sont évincés)
+MAX_CACHED_LEARNERS = 1000
+
+_banks = {}  # bank_id -> QuestionBank
+_lock = threading.Lock()
+_versions_query = None
+_all_versions_query = None
+
+
+def _current_versions(user_id, bank_id):
+    """Versions d'une banque (questions) et des statuts de l'apprenant en une requête.
+
+    Toutes les sous-requêtes sont servies par un index : le coût ne dépend pas de
+    l'historique ni du nombre d'apprenants, ni des autres banques. La requête
+    est construite une seule fois et exécutée sur la connexion de la session :
+    une seconde connexion par requête épuiserait le pool sous forte concurrence.
+    """
+    global _versions_query
+    if _versions_query is None:
+        _versions_query = select(
+            select(func.count()).select_from(Questions)
+            .where(Questions.bank_id == bindparam('bank_id')).scalar_subquery(),
+            select(func.max(Questions.updated_at))
+            .where(Questions.bank_id == bindparam('bank_id')).scalar_subquery(),
+            revision_query(bindparam('revision_key'))
+        )
+    return db.session.execute(_versions_query, {
+        'bank_id': bank_id, 'revision_key': stats_revision_key(user_id)
+    }).one()
+
+
+def _question_themes(bank_id):
+    """(id, thème) des questions d'une banque, depuis l'instantané binaire s'il est à jour"""
+    from app.snapshot import get_snapshot
+
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.iter_themes(bank_id)
+    return db.session.query(Questions.id, Questions.theme).filter(Questions.bank_id == bank_id)
+
+
+def bank_version():
+    """Version de l'ensemble des questions, toutes banques confondues : (nombre, dernier updated_at).
+
+    Elle date l'instantané binaire et l'index de recherche, qui couvrent toutes les banques.
+    """
+    global _all_versions_query
+    if _all_versions_query is None:
+        _all_versions_query = select(
+            select(func.count()).select_from(Questions).scalar_subquery(),
+            select(func.max(Questions.updated_at)).scalar_subquery()
+        )
+    questions_count, questions_updated = db.session.execute(_all_versions_query).one()
+    return (questions_count, questions_updated)
+
+
+def get_bank(user_id=DEFAULT_USER_ID, bank_id=DEFAULT_BANK_ID):
+    """Retourner une banque vue par un apprenant, rechargée si ses questions ou les statuts ont changé"""
+    questions_count, questions_updated, stats_version = _current_versions(user_id, bank_id)
+    bank_version = (questions_count, questions_updated)
+
+    bank = _banks.get(bank_id)
+    if bank is not None and bank.bank_version == bank_version:
+        learner = bank.learners.get(user_id)
+        if learner is not None and learner.stats_version == stats_version:
+            return learner
+
+    with _lock:
+        bank = _banks.get(bank_id)
+        if bank is None or bank.bank_version != bank_version:
+            bank = _banks[bank_id] = QuestionBank(bank_version, _question_themes(bank_id), bank_id)
+
+        learner = bank.learners.get(user_id)
+        if learner is None:
+            learner = bank.learners[user_id] = LearnerBank(bank, user_id)
+            while len(bank.learners) > MAX_CACHED_LEARNERS:
+                bank.learners.popitem(last=False)
+        else:
+            bank.learners.move_to_end(user_id)
+        if learner.stats_version != stats_version:
+            # Seules les lignes de l'apprenant dans cette banque sont lues (index (user_id, bank_id))
+            learner.load_statuses(stats_version, db.session.query(
+                QuestionStats.question_id, QuestionStats.attempts, QuestionStats.correct_count
+            ).filter(QuestionStats.user_id == user_id, QuestionStats.bank_id == bank_id))
+    return learner
+
+
+def record_answers(user_id, answers, stats_revision):
+    """Répercuter dans le cache des réponses d'un apprenant qui viennent d'être commitées.
+
+    Les statuts de l'apprenant sont communs à toutes ses banques (une révision
+    par apprenant) : chaque banque en cache applique les réponses qui la
+    concernent, ou reste périmée si elle a manqué une écriture.
+    """
+    with _lock:
+        for bank in _banks.values():
+            learner = bank.learners.get(user_id)
+            if learner is not None:
+                learner.apply_answers(answers, stats_revision)
+
+
+def invalidate():
+    """Vider le cache de toutes les banques (appelé après un import de questions)"""
+    with _lock:
+        _banks.clear()
@@ -0,0 +1,74 @@
+"""Banques de questions (CISA, CISM, CISSP...) et banque de la requête courante.
+
+Chaque question, quiz et statistique appartient à une banque. La banque est
+choisie par son code dans l'URL (?bank=cism) ou dans le JSON envoyé
+(champ 'bank') : les pages mises en cache (configuration, recherche) restent
+ainsi partagées par tous les visiteurs, une entrée par banque. Sans code, la
+banque est DEFAULT_BANK_ID, qui porte les questions et l'historique antérieurs
+au multi-banque.
+
+Les codes sont associés à leurs IDs dans un cache du processus : une banque
+n'est jamais renommée ni supprimée, et un code inconnu est relu en base avant
+de répondre 404.
+"""
+import threading
+
+from flask import abort, request
+
+from app import db
+from app.models import Bank
+
+DEFAULT_BANK_ID = 1
+DEFAULT_BANK_CODE = 'cisa'
+DEFAULT_BANK_NAME = 'CISA'
+
+_bank_ids = {}  # code -> ID
+_lock = threading.Lock()
+
+
+def bank_id_for(code):
+    """ID de la banque de ce code, ou None si elle n'existe pas"""
+    bank_id = _bank_ids.get(code)
+    if bank_id is None:
+        bank_id = db.session.query(Bank.id).filter(Bank.code == code).scalar()
+        if bank_id is not None:
+            with _lock:
+                _bank_ids[code] = bank_id
+    return bank_id
+
+
+def current_bank_id(data=None):
+    """ID de la banque de la requête courante (paramètre 'bank' de l'URL ou de `data`) ; 404 si inconnue"""
+    code = (data or {}).get('bank') or request.args.get('bank')
+    if not code:
+        return DEFAULT_BANK_ID
+    bank_id = bank_id_for(code)
+    if bank_id is None:
+        abort(404)
+    return bank_id
+
+
+def get_or_create_bank(code, name=None):
+    """ID de la banque de ce code, créée si besoin (dans la transaction courante)"""
+    bank_id = bank_id_for(code)
+    if bank_id is None:
+        bank = Bank(code=code, name=name or code.upper())
+        db.session.add(bank)
+        db.session.flush()
+        bank_id = bank.id
+    return bank_id
+
+
+def ensure_default_bank():
+    """Créer la banque par défaut, propriétaire des questions antérieures au multi-banque"""
+    if db.session.get(Bank, DEFAULT_BANK_ID) is None:
+        db.session.add(Bank(id=DEFAULT_BANK_ID, code=DEFAULT_BANK_CODE, name=DEFAULT_BANK_NAME))
+        db.session.flush()
+
+
+def list_banks():
+    """(id, code, nom) de toutes les banques, par ID ; complète le cache des codes"""
+    banks = db.session.query(Bank.id, Bank.code, Bank.name).order_by(Bank.id).all()
+    with _lock:
+        _bank_ids.update((code, bank_id) for bank_id, code, _ in banks)
+    return banks
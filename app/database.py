@@ -0,0 +1,122 @@
+"""Configuration des moteurs SQLAlchemy : pragmas SQLite, pools et pool de lecture.
+
+- SQLite : chaque connexion reçoit les pragmas de Config (WAL, synchronous,
+  mmap_size, cache_size, busy_timeout). En WAL, les lecteurs ne sont plus
+  bloqués par l'écriture d'une page de résultats.
+- Pools : taille, débordement, recyclage et pre-ping (utile pour PostgreSQL,
+  dont les connexions inactives peuvent être coupées) viennent de Config.
+- Pool de lecture : avec DB_READ_POOL (même base) ou DATABASE_READ_URL (un
+  réplica, SQLALCHEMY_READ_DATABASE_URI), les routes décorées par @read_only lisent sur un moteur séparé,
+  de sorte que les lectures n'attendent pas une connexion du pool d'écriture.
+  Seuls les SELECT y sont envoyés : les écritures (flush, instructions DML,
+  texte SQL autre qu'un SELECT, comme la synchronisation de l'index FTS)
+  restent sur le moteur principal.
+"""
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.elements import TextClause
+
+READ_BIND = 'read'
+
+
+def _is_read(clause):
+    """Vrai si l'instruction est une lecture : SELECT construit ou texte SQL commençant par SELECT"""
+    if clause is None:
+        return True  # session.connection() ou get() sans instruction : lecture
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip().upper().startswith('SELECT')
+    return bool(getattr(clause, 'is_select', False))
+
+
+class RoutingSession(Session):
+    """Session qui envoie les lectures des routes @read_only au moteur de lecture"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and _is_read(clause)
+                and has_app_context() and g.get('_read_only') and READ_BIND in self._db.engines):
+            return self._db.engines[READ_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Faire lire la vue sur le pool de lecture, s'il est configuré"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _is_sqlite_file(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_options(config, uri):
+    """Options de create_engine pour une URI, d'après Config"""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and not _is_sqlite_file(url):
+        return {}  # Base en mémoire : pool imposé par Flask-SQLAlchemy
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+    }
+    if url.get_backend_name() != 'sqlite':
+        options['pool_pre_ping'] = config['DB_POOL_PRE_PING']
+        options['pool_recycle'] = config['DB_POOL_RECYCLE']
+    return options
+
+
+def configure(app):
+    """Renseigner les options des moteurs et le pool de lecture (avant db.init_app)"""
+    config = app.config
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if not uri:
+        return
+    config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    for key, value in engine_options(config, uri).items():
+        config['SQLALCHEMY_ENGINE_OPTIONS'].setdefault(key, value)
+
+    read_uri = config.get('SQLALCHEMY_READ_DATABASE_URI') or (uri if config.get('DB_READ_POOL') else None)
+    if read_uri:
+        options = engine_options(config, read_uri)
+        if options:
+            options['pool_size'] = config['DB_READ_POOL_SIZE']
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[READ_BIND] = {'url': read_uri, **options}
+        config['SQLALCHEMY_BINDS'] = binds
+
+def _pragma_listener(pragmas):
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            if value is not None and value != '':
+                cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return set_sqlite_pragmas
+
+
+def init_app(app, db):
+    """Appliquer les pragmas SQLite à chaque nouvelle connexion (après db.init_app)"""
+    config = app.config
+    pragmas = [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('cache_size', config['SQLITE_CACHE_SIZE']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+    ]
+    with app.app_context():
+        engines = dict(db.engines)
+    for key, engine in engines.items():
+        if engine.dialect.name != 'sqlite':
+            continue
+        if key == READ_BIND:
+            # Garde-fou : une écriture routée par erreur vers le pool de lecture échoue
+            event.listen(engine, 'connect', _pragma_listener(pragmas + [('query_only', 1)]))
+        else:
+            event.listen(engine, 'connect', _pragma_listener(pragmas))
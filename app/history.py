@@ -0,0 +1,193 @@
+"""Export colonnaire de l'historique des réponses, pour l'analyse hors ligne.
+
+Chaque réponse (session_answers) est exportée avec le thème de sa question et
+la date de son quiz, colonne par colonne, en tableaux typés :
+
+    answer_id    u4   ID de la réponse (ordre chronologique)
+    user_id      u4
+    session_id   u4
+    question_id  u4
+    theme        u2   code du thème, index dans la liste `themes` du pied de page
+    created_at   i8   date du quiz, en secondes depuis l'epoch (UTC)
+    user_answer  u1
+    is_correct   u1
+
+Format (little-endian) : magic (8 octets), puis des blocs de CHUNK_SIZE lignes
+au plus (chaque bloc contient ses colonnes bout à bout), puis un pied de page
+JSON (colonnes, thèmes, nombre de lignes et position de chaque bloc) suivi de
+sa position (u64). L'export lit les réponses en flux et écrit bloc par bloc :
+seuls un bloc, les thèmes des questions et les dates des quiz sont en mémoire.
+
+load_history() relit le fichier en tableaux NumPy si NumPy est installé
+(voir app.analytics), en array.array sinon.
+"""
+import array
+import json
+import os
+import struct
+import sys
+from datetime import timezone
+
+from app import db
+from app.models import Questions, SessionAnswer, SessionQuiz
+
+MAGIC = b'CQHIST01'
+FOOTER_POSITION = struct.Struct('<Q')
+CHUNK_SIZE = 65536
+
+# (nom, type NumPy) dans l'ordre des colonnes d'un bloc
+COLUMNS = [
+    ('answer_id', '<u4'),
+    ('user_id', '<u4'),
+    ('session_id', '<u4'),
+    ('question_id', '<u4'),
+    ('theme', '<u2'),
+    ('created_at', '<i8'),
+    ('user_answer', '<u1'),
+    ('is_correct', '<u1'),
+]
+
+
+def _typecode(dtype):
+    """Code array.array de même taille et de même signe qu'un type NumPy ('<u4', '<i8'...)"""
+    kind, size = dtype[1], int(dtype[2:])
+    for code in ('BHILQ' if kind == 'u' else 'bhilq'):
+        if array.array(code).itemsize == size:
+            return code
+    raise ValueError(f"Type de colonne non pris en charge : {dtype}")
+
+
+def _write_chunk(f, columns):
+    for name, dtype in COLUMNS:
+        values = array.array(_typecode(dtype), columns[name])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        values.tofile(f)
+
+
+def _epoch(created_at):
+    if created_at is None:
+        return 0
+    if created_at.tzinfo is None:  # SQLite rend des dates naïves, en UTC
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return int(created_at.timestamp())
+
+
+def export_history(path, user_id=None, chunk_size=CHUNK_SIZE):
+    """Exporter l'historique des réponses (d'un apprenant ou de tous) ; retourne le nombre de lignes.
+
+    Le thème de chaque question et la date de chaque quiz sont lus une fois,
+    à part : la requête principale ne parcourt que session_answers, par ordre
+    d'ID, et chaque bloc est converti colonne par colonne. Le fichier est écrit
+    à côté puis renommé, comme l'instantané des questions.
+    """
+    themes = {}  # thème -> code
+    question_themes = {}  # question -> code du thème
+    for question_id, theme in db.session.query(Questions.id, Questions.theme):
+        question_themes[question_id] = themes.setdefault(theme, len(themes))
+
+    sessions = db.session.query(SessionQuiz.id_session, SessionQuiz.created_at)
+    table = SessionAnswer.__table__  # Requête Core : pas de chargement ORM ligne par ligne
+    answers = db.select(
+        table.c.id, table.c.user_id, table.c.session_id, table.c.question_id,
+        table.c.user_answer, table.c.is_correct
+    ).order_by(table.c.id)
+    if user_id is not None:
+        sessions = sessions.filter(SessionQuiz.user_id == user_id)
+        answers = answers.where(table.c.user_id == user_id)
+    session_dates = {session_id: _epoch(created_at) for session_id, created_at in sessions}
+
+    chunks = []  # (position, lignes)
+    rows = 0
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        result = db.session.connection().execute(answers.execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            answer_ids, user_ids, session_ids, question_ids, user_answers, is_correct = zip(*partition)
+            chunks.append((f.tell(), len(answer_ids)))
+            _write_chunk(f, {
+                'answer_id': answer_ids,
+                'user_id': user_ids,
+                'session_id': session_ids,
+                'question_id': question_ids,
+                'theme': [question_themes[question_id] for question_id in question_ids],
+                'created_at': [session_dates.get(session_id, 0) for session_id in session_ids],
+                'user_answer': user_answers,
+                'is_correct': is_correct,
+            })
+            rows += len(answer_ids)
+
+        footer = json.dumps({
+            'rows': rows,
+            'columns': COLUMNS,
+            'themes': sorted(themes, key=themes.get),
+            'chunks': chunks,
+        }).encode('utf-8')
+        footer_position = f.tell()
+        f.write(footer)
+        f.write(FOOTER_POSITION.pack(footer_position))
+    os.replace(tmp_path, path)
+    return rows
+
+
+class History:
+    """Historique chargé : une colonne par attribut (tableau NumPy ou array.array) et la liste des thèmes"""
+
+    def __init__(self, columns, themes):
+        self.columns = columns
+        self.themes = themes
+
+    def __len__(self):
+        return len(self.columns['answer_id'])
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def read_footer(f):
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{f.name} n'est pas un export d'historique")
+    f.seek(-FOOTER_POSITION.size, os.SEEK_END)
+    end = f.tell()
+    (footer_position,) = FOOTER_POSITION.unpack(f.read(FOOTER_POSITION.size))
+    f.seek(footer_position)
+    return json.loads(f.read(end - footer_position))
+
+
+def load_history(path, use_numpy=None):
+    """Charger un export ; en tableaux NumPy si disponible (ou si use_numpy=True), sinon en array.array"""
+    if use_numpy is None:
+        try:
+            import numpy  # noqa: F401
+            use_numpy = True
+        except ImportError:
+            use_numpy = False
+
+    with open(path, 'rb') as f:
+        footer = read_footer(f)
+        columns_spec = [(name, dtype) for name, dtype in footer['columns']]
+        if use_numpy:
+            import numpy as np
+            columns = {name: np.empty(footer['rows'], dtype=dtype) for name, dtype in columns_spec}
+        else:
+            columns = {name: array.array(_typecode(dtype)) for name, dtype in columns_spec}
+
+        start = 0
+        for position, count in footer['chunks']:
+            f.seek(position)
+            for name, _ in columns_spec:
+                if use_numpy:
+                    # Lecture directe dans le tableau final : pas de copie intermédiaire
+                    f.readinto(memoryview(columns[name][start:start + count]).cast('B'))
+                else:
+                    columns[name].fromfile(f, count)
+            start += count
+    if not use_numpy and sys.byteorder != 'little':
+        for values in columns.values():
+            values.byteswap()
+    return History(columns, footer['themes'])
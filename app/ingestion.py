@@ -0,0 +1,447 @@
+"""Écriture différée des réponses et des finalisations de quiz (INGESTION='async').
+
+En mode 'sync' (par défaut), chaque soumission et chaque page de résultats
+écrit et commite elle-même. En mode 'async', les routes ajoutent leurs
+écritures à une file et un thread de fond les regroupe en une seule
+transaction dès que la file atteint INGESTION_BATCH_SIZE opérations ou que
+INGESTION_FLUSH_INTERVAL secondes se sont écoulées : quand une cohorte termine
+un examen en même temps, un seul verrou d'écriture SQLite est pris pour toutes
+les finalisations au lieu d'un par requête.
+
+- Lecture de ses propres écritures : les réponses en attente d'un quiz sont
+  superposées à sa progression (pending_answers), et les pages qui lisent les
+  statistiques d'un apprenant attendent d'abord que ses écritures soient
+  commitées (wait), ce qui déclenche une écriture immédiate.
+- Reprise après redémarrage : chaque opération est ajoutée à un journal
+  (fichiers INGESTION_JOURNAL.<pid>.<n>, une ligne JSON par opération) avant
+  d'être acquittée ; un segment est supprimé une fois ses opérations
+  commitées. Chaque processus ne journalise que dans ses propres segments et
+  garde un verrou (INGESTION_JOURNAL.<pid>.lock) tant qu'il tourne : au
+  démarrage, sous le verrou INGESTION_JOURNAL.lock, un processus ne rejoue que
+  les segments dont le propriétaire n'est plus là, jamais ceux d'un autre
+  processus en cours. Les opérations sont idempotentes : un rejeu partiel ne
+  fausse rien.
+- Échecs : un lot qui échoue est réessayé, au plus INGESTION_MAX_RETRIES fois,
+  puis écrit opération par opération ; celles qui échouent encore sont
+  ajoutées au fichier INGESTION_DEAD_LETTER (une ligne JSON par opération) et
+  signalées dans le journal applicatif, pour que les autres soient commitées.
+  Le rejeu du journal au démarrage suit la même règle.
+
+La file est propre au processus : le mode 'async' suppose que les requêtes d'un
+même apprenant arrivent au même processus (un serveur multi-thread).
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou, un seul processus par journal
+    fcntl = None
+
+from flask import current_app
+from sqlalchemy import bindparam
+
+from app import db
+from app.models import SessionQuiz, SessionAnswer
+from app.sql import upsert
+
+
+class Ingestor:
+    def __init__(self, app, batch_size, flush_interval, journal_path, fsync=False, wait_timeout=10,
+                 max_retries=3, dead_letter_path=None):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+        self.fsync = fsync
+        self.wait_timeout = wait_timeout
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path or journal_path + '.failed'
+        self.journal_prefix = f'{journal_path}.{os.getpid()}'  # Segments de ce processus
+
+        self._cond = threading.Condition()
+        self._queue = []  # (séquence, opération)
+        self._inflight = []  # Opérations en cours d'écriture, pas encore commitées
+        self._seq = 0
+        self._committed = 0  # Toutes les opérations de séquence <= _committed sont commitées
+        self._last_seq = {}  # ('session', id) / ('user', id) -> dernière séquence
+        self._flush_requested = False
+        self._stopping = False
+        self._segments = []  # Segments du journal couverts par la file et le lot en cours
+        self._journal = None
+        self._journal_lock = None  # Verrou de ce processus sur ses segments
+        self._segment_number = 0
+        self._thread = None
+        self._failures = 0  # Échecs consécutifs du lot en tête de file
+
+    # -- Journal -------------------------------------------------------------
+
+    def _segments_by_owner(self):
+        """Segments du journal groupés par préfixe de processus, chaque groupe dans l'ordre d'écriture"""
+        owners = {}
+        for path in glob.glob(glob.escape(self.journal_path) + '.*.*'):
+            prefix, number = path.rsplit('.', 1)
+            if number.isdigit() and prefix.rsplit('.', 1)[1].isdigit():
+                owners.setdefault(prefix, []).append(path)
+        return {prefix: sorted(paths, key=lambda p: int(p.rsplit('.', 1)[1])) for prefix, paths in owners.items()}
+
+    def _open_segment(self):
+        self._segment_number += 1
+        path = f'{self.journal_prefix}.{self._segment_number:08d}'
+        self._journal = open(path, 'a', encoding='utf-8')
+        self._segments.append(path)
+
+    def _append_journal(self, operations):
+        if self._journal is None:
+            self._open_segment()
+        for operation in operations:
+            self._journal.write(json.dumps(operation, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _rotate(self):
+        """Fermer le segment courant ; retourner les segments couverts par le lot à écrire"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        segments, self._segments = self._segments, []
+        return segments
+
+    def replay(self):
+        """Rejouer les opérations journalisées non commitées (au démarrage, avant le thread).
+
+        Prend le verrou des segments de ce processus, puis rejoue ceux des
+        processus arrêtés : un groupe dont le verrou est tenu appartient à un
+        processus en cours, qui l'écrira lui-même.
+        """
+        self._journal_lock = _lock(self.journal_prefix + '.lock')
+        replay_lock = _lock(self.journal_path + '.lock')
+        try:
+            count = 0
+            for prefix, paths in self._segments_by_owner().items():
+                if prefix == self.journal_prefix:
+                    # Segments d'un processus arrêté qui portait le même pid
+                    count += self._replay_segments(paths)
+                    continue
+                owner_lock = _lock(prefix + '.lock', blocking=False)
+                if owner_lock is None:
+                    continue
+                try:
+                    count += self._replay_segments(paths)
+                    os.remove(prefix + '.lock')
+                finally:
+                    _unlock(owner_lock)
+            return count
+        finally:
+            _unlock(replay_lock)
+
+    def _replay_segments(self, paths):
+        operations = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        operations.append(json.loads(line))
+                    except ValueError:
+                        break  # Dernière ligne tronquée par un arrêt brutal
+        if operations:
+            try:
+                apply_operations(operations)
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception("Ingestion : échec du rejeu du journal, rejeu opération par opération")
+                self._apply_one_by_one(operations)
+            current_app.logger.info("Ingestion : %d opérations rejouées depuis le journal", len(operations))
+        for path in paths:
+            os.remove(path)
+        return len(operations)
+
+    def _apply_one_by_one(self, operations):
+        """Écrire chaque opération dans sa propre transaction ; mettre de côté celles qui échouent"""
+        failed = []
+        for operation in operations:
+            try:
+                apply_operations([operation])
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception("Ingestion : opération rejetée : %s", operation)
+                failed.append(operation)
+        if failed:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                for operation in failed:
+                    f.write(json.dumps(operation, separators=(',', ':')) + '\n')
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            current_app.logger.error("Ingestion : %d opération(s) rejetée(s), conservées dans %s",
+                                     len(failed), self.dead_letter_path)
+        return failed
+
+    # -- File ----------------------------------------------------------------
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ingestion', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, operations):
+        """Journaliser puis mettre en file des opérations ; retourne leur dernière séquence"""
+        with self._cond:
+            self._append_journal(operations)
+            for operation in operations:
+                self._seq += 1
+                self._queue.append((self._seq, operation))
+                self._last_seq['session', operation['session_id']] = self._seq
+                self._last_seq['user', operation['user_id']] = self._seq
+            if len(self._queue) >= self.batch_size:
+                self._flush_requested = True
+            self._cond.notify_all()
+            return self._seq
+
+    def enqueue_answers(self, session_id, user_id, answers):
+        return self.enqueue([
+            {'op': 'answer', 'session_id': session_id, 'user_id': user_id, 'question_id': question_id,
+             'user_answer': user_answer, 'is_correct': is_correct}
+            for question_id, user_answer, is_correct in answers
+        ])
+
+    def enqueue_finalize(self, session_id, user_id, score, theme_results=None, duration=None):
+        return self.enqueue([{'op': 'finalize', 'session_id': session_id, 'user_id': user_id, 'score': score,
+                              'theme_results': theme_results, 'duration': duration}])
+
+    def pending_answers(self, session_id):
+        """Réponses d'un quiz pas encore commitées, dans l'ordre de soumission"""
+        with self._cond:
+            return [
+                (op['question_id'], op['user_answer'], op['is_correct'])
+                for op in self._inflight + [op for _, op in self._queue]
+                if op['op'] == 'answer' and op['session_id'] == session_id
+            ]
+
+    def wait(self, session_id=None, user_id=None):
+        """Attendre que les écritures en attente d'un quiz ou d'un apprenant soient commitées.
+
+        S'il faut attendre, la session SQLAlchemy de la requête est fermée pour
+        rendre sa connexion au pool : le thread d'écriture en a besoin.
+        """
+        key = ('session', session_id) if session_id is not None else ('user', user_id)
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            target = self._last_seq.get(key, 0)
+            if target <= self._committed:
+                return True
+        db.session.close()
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while target > self._committed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    current_app.logger.warning("Ingestion : écritures de %s toujours en attente", key)
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self):
+        """Écrire ce qui reste en file, arrêter le thread puis rendre les segments de ce processus"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._journal_lock is not None:
+            if not self._segments_by_owner().get(self.journal_prefix):
+                os.remove(self.journal_prefix + '.lock')
+            _unlock(self._journal_lock)
+            self._journal_lock = None
+
+    def _next_batch(self):
+        """Attendre le déclencheur (taille, délai, demande explicite) et prendre la file"""
+        with self._cond:
+            deadline = None
+            while True:
+                if self._queue and (self._flush_requested or self._stopping
+                                    or len(self._queue) >= self.batch_size):
+                    break
+                if not self._queue:
+                    if self._stopping:
+                        return None
+                    deadline = None
+                    self._cond.wait()
+                    continue
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, self._queue = self._queue, []
+            self._inflight = [op for _, op in batch]
+            self._flush_requested = False
+            return batch, self._rotate()
+
+    def _run(self):
+        while True:
+            taken = self._next_batch()
+            if taken is None:
+                return
+            batch, segments = taken
+            try:
+                with self.app.app_context():
+                    apply_operations(self._inflight)
+            except Exception:
+                self._failures += 1
+                if self._failures < self.max_retries:
+                    self.app.logger.exception("Ingestion : échec de l'écriture d'un lot, nouvel essai (%d/%d)",
+                                              self._failures, self.max_retries)
+                    with self._cond:
+                        # Remettre le lot en tête de file, ses segments restent à supprimer plus tard
+                        self._queue = batch + self._queue
+                        self._inflight = []
+                        self._segments = segments + self._segments
+                    time.sleep(self.flush_interval)
+                    continue
+                # Échec persistant (contrainte violée...) : isoler les opérations fautives
+                self.app.logger.exception("Ingestion : échecs répétés d'un lot, écriture opération par opération")
+                with self.app.app_context():
+                    self._apply_one_by_one(self._inflight)
+            self._failures = 0
+
+            for path in segments:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            with self._cond:
+                self._committed = batch[-1][0]
+                self._inflight = []
+                # Oublier les quiz et apprenants dont tout est commité
+                self._last_seq = {k: s for k, s in self._last_seq.items() if s > self._committed}
+                self._cond.notify_all()
+
+
+def _lock(path, blocking=True):
+    """Ouvrir `path` et y prendre un verrou exclusif ; None si `blocking` est faux et qu'il est déjà pris"""
+    f = open(path, 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            f.close()
+            return None
+    return f
+
+
+def _unlock(f):
+    # Fermer le fichier rend le verrou
+    f.close()
+
+
+def apply_operations(operations):
+    """Écrire un lot d'opérations en une transaction (idempotent : rejouable)"""
+    from app.bank import record_answers
+    from app.quiz_state import get_quiz_state_store
+    from app.review import update_review_states
+    from app.stats import update_question_stats
+
+    answers = {}  # (quiz, question) -> ligne ; une resoumission remplace la précédente
+    finalized = {}  # quiz -> opération de finalisation
+    for operation in operations:
+        if operation['op'] == 'answer':
+            answers[operation['session_id'], operation['question_id']] = operation
+        elif operation['op'] == 'finalize':
+            finalized.setdefault(operation['session_id'], operation)  # La première finalisation fait foi
+
+    store = get_quiz_state_store()
+    if answers:
+        upsert(SessionAnswer.__table__, [{
+            'session_id': op['session_id'],
+            'user_id': op['user_id'],
+            'question_id': op['question_id'],
+            'user_answer': op['user_answer'],
+            'is_correct': op['is_correct']
+        } for op in answers.values()], ['session_id', 'question_id'], ['user_answer', 'is_correct'])
+        # Recompter les questions répondues de chaque quiz après l'écriture
+        by_session = {}
+        for op in answers.values():
+            by_session.setdefault(op['session_id'], []).append(
+                (op['question_id'], op['user_answer'], op['is_correct'])
+            )
+        for session_id, session_answers in by_session.items():
+            store.add_answers(session_id, session_answers)
+
+    revisions = {}
+    rows_by_user = {}
+    if finalized:
+        # Score, résultats et statistiques ne s'écrivent qu'à la première finalisation, désignée
+        # par la bascule de stats_applied (comme en mode 'sync') : ni un rechargement de la page
+        # de résultats ni le rejeu du lot ne les réécrivent
+        table = SessionQuiz.__table__
+        finalize_stmt = table.update().where(
+            table.c.id_session == bindparam('b_id'), table.c.stats_applied == False
+        ).values(
+            score=bindparam('score'),
+            theme_results=bindparam('theme_results', type_=table.c.theme_results.type),
+            duration=db.func.coalesce(table.c.duration, bindparam('duration', type_=table.c.duration.type)),
+            stats_applied=True
+        ).returning(table.c.id_session)
+        first_finalized = [
+            session_id for session_id, op in finalized.items()
+            if db.session.execute(finalize_stmt, {
+                'b_id': session_id, 'score': op['score'], 'theme_results': op.get('theme_results'),
+                'duration': op.get('duration')
+            }).scalar() is not None
+        ]
+
+        # Réponses de ces quiz, pour les statistiques de chaque apprenant
+        if first_finalized:
+            for row in db.session.query(
+                SessionAnswer.id, SessionAnswer.user_id, SessionAnswer.question_id,
+                SessionAnswer.user_answer, SessionAnswer.is_correct
+            ).filter(SessionAnswer.session_id.in_(first_finalized)).order_by(SessionAnswer.id):
+                rows_by_user.setdefault(row.user_id, []).append(row)
+        for user_id, user_rows in rows_by_user.items():
+            revisions[user_id] = update_question_stats(user_id, user_rows)
+            update_review_states(user_id, user_rows)
+        store.delete_many(list(finalized))
+
+    db.session.commit()
+    for user_id, user_rows in rows_by_user.items():
+        record_answers(user_id, user_rows, revisions[user_id])
+
+
+def get_ingestor():
+    """Ingestor de l'application courante, ou None en mode 'sync'"""
+    return current_app.extensions.get('ingestion')
+
+
+def init_app(app):
+    """Rejouer le journal et démarrer le thread d'écriture si INGESTION='async' (appelé par create_app)"""
+    mode = app.config.get('INGESTION', 'sync')
+    if mode == 'sync':
+        return
+    if mode != 'async':
+        raise ValueError(f"INGESTION inconnu : {mode}")
+
+    journal_path = app.config.get('INGESTION_JOURNAL') or os.path.join(app.instance_path, 'ingestion.journal')
+    os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+    ingestor = Ingestor(
+        app,
+        batch_size=app.config.get('INGESTION_BATCH_SIZE', 500),
+        flush_interval=app.config.get('INGESTION_FLUSH_INTERVAL', 0.05),
+        journal_path=journal_path,
+        fsync=app.config.get('INGESTION_FSYNC', False),
+        wait_timeout=app.config.get('INGESTION_WAIT_TIMEOUT', 10),
+        max_retries=app.config.get('INGESTION_MAX_RETRIES', 3),
+        dead_letter_path=app.config.get('INGESTION_DEAD_LETTER'),
+    )
+    with app.app_context():
+        ingestor.replay()
+    ingestor.start()
+    app.extensions['ingestion'] = ingestor
+    atexit.register(ingestor.close)
@@ -0,0 +1,204 @@
+"""Instrumentation optionnelle des requêtes (INSTRUMENTATION=1).
+
+Pour chaque requête HTTP : durée totale, nombre de requêtes SQL et temps SQL
+cumulé, renvoyés dans l'en-tête Server-Timing et agrégés par endpoint. Les
+agrégats et les requêtes SQL les plus lentes sont exposés au format texte
+Prometheus sur /metrics.
+
+count_queries() et assert_max_queries() fonctionnent même sans l'option : ils
+servent aux scripts de vérification (benchmarks/check_query_counts.py) pour
+détecter les régressions N+1.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+from app import db
+
+# Bornes (en secondes) de l'histogramme des durées de requête
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+STATEMENT_MAX_LENGTH = 300
+
+
+class RequestStats:
+    """Compteurs SQL de la requête HTTP en cours"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+
+
+class Metrics:
+    """Agrégats par endpoint et requêtes SQL les plus lentes, partagés par le processus"""
+
+    def __init__(self, slow_statements=10):
+        self.slow_statements = slow_statements
+        self._lock = threading.Lock()
+        self.endpoints = {}  # endpoint -> {'count', 'duration', 'queries', 'sql_time', 'buckets'}
+        self._slowest = {}  # (endpoint, requête SQL) -> durée maximale observée
+
+    def record_request(self, endpoint, duration, stats):
+        with self._lock:
+            entry = self.endpoints.get(endpoint)
+            if entry is None:
+                entry = self.endpoints[endpoint] = {
+                    'count': 0, 'duration': 0.0, 'queries': 0, 'sql_time': 0.0,
+                    'buckets': [0] * len(DURATION_BUCKETS)
+                }
+            entry['count'] += 1
+            entry['duration'] += duration
+            entry['queries'] += stats.queries
+            entry['sql_time'] += stats.sql_time
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    entry['buckets'][i] += 1
+
+    def record_statement(self, duration, endpoint, statement):
+        key = (endpoint, statement[:STATEMENT_MAX_LENGTH])
+        with self._lock:
+            if key in self._slowest:
+                self._slowest[key] = max(self._slowest[key], duration)
+            elif len(self._slowest) < self.slow_statements:
+                self._slowest[key] = duration
+            else:
+                # Remplacer la plus rapide des requêtes retenues (peu d'entrées : parcours linéaire)
+                fastest = min(self._slowest, key=self._slowest.get)
+                if duration > self._slowest[fastest]:
+                    del self._slowest[fastest]
+                    self._slowest[key] = duration
+
+    def slowest(self):
+        """(durée, endpoint, requête SQL), de la plus lente à la plus rapide"""
+        with self._lock:
+            return sorted(((d, e, s) for (e, s), d in self._slowest.items()), reverse=True)
+
+    def render(self):
+        """Texte au format d'exposition Prometheus"""
+        with self._lock:
+            endpoints = {name: dict(entry, buckets=list(entry['buckets']))
+                         for name, entry in sorted(self.endpoints.items())}
+        lines = [
+            '# HELP cisaquiz_request_duration_seconds Durée des requêtes HTTP par endpoint',
+            '# TYPE cisaquiz_request_duration_seconds histogram',
+        ]
+        for name, entry in endpoints.items():
+            label = _label(name)
+            for bound, count in zip(DURATION_BUCKETS, entry['buckets']):
+                lines.append(f'cisaquiz_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+            lines.append(f'cisaquiz_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'cisaquiz_request_duration_seconds_sum{{endpoint="{label}"}} {entry["duration"]:.6f}')
+            lines.append(f'cisaquiz_request_duration_seconds_count{{endpoint="{label}"}} {entry["count"]}')
+
+        lines += [
+            '# HELP cisaquiz_sql_queries_total Requêtes SQL exécutées par endpoint',
+            '# TYPE cisaquiz_sql_queries_total counter',
+        ]
+        lines += [f'cisaquiz_sql_queries_total{{endpoint="{_label(name)}"}} {entry["queries"]}'
+                  for name, entry in endpoints.items()]
+        lines += [
+            '# HELP cisaquiz_sql_duration_seconds_total Temps SQL cumulé par endpoint',
+            '# TYPE cisaquiz_sql_duration_seconds_total counter',
+        ]
+        lines += [f'cisaquiz_sql_duration_seconds_total{{endpoint="{_label(name)}"}} {entry["sql_time"]:.6f}'
+                  for name, entry in endpoints.items()]
+        lines += [
+            '# HELP cisaquiz_slow_statement_seconds Requêtes SQL les plus lentes depuis le démarrage',
+            '# TYPE cisaquiz_slow_statement_seconds gauge',
+        ]
+        lines += [f'cisaquiz_slow_statement_seconds{{endpoint="{_label(endpoint)}",statement="{_label(statement)}"}} '
+                  f'{duration:.6f}' for duration, endpoint, statement in self.slowest()]
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    """Échapper une valeur d'étiquette Prometheus"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _current_stats():
+    return g.get('_request_stats') if has_app_context() else None
+
+
+def init_app(app):
+    """Brancher l'instrumentation si INSTRUMENTATION est activé (appelé par create_app)"""
+    if not app.config.get('INSTRUMENTATION'):
+        return
+
+    metrics = Metrics(app.config.get('INSTRUMENTATION_SLOW_STATEMENTS', 10))
+    app.extensions['metrics'] = metrics
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start'].pop()
+        stats = _current_stats()
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_time += duration
+            metrics.record_statement(duration, request.endpoint or 'unknown', statement)
+
+    # Tous les moteurs : les routes @read_only lisent sur le pool de lecture (app.database)
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_request_stats():
+        g._request_stats = RequestStats()
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+        duration = time.perf_counter() - stats.start
+        metrics.record_request(request.endpoint or 'unknown', duration, stats)
+        response.headers.add('Server-Timing', f'app;dur={duration * 1000:.2f}')
+        response.headers.add('Server-Timing',
+                             f'sql;dur={stats.sql_time * 1000:.2f};desc="{stats.queries} queries"')
+        return response
+
+    def metrics_endpoint():
+        return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
+
+
+@contextmanager
+def count_queries():
+    """Compter les requêtes SQL exécutées dans le bloc (liste des instructions dans le résultat)"""
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = list(db.engines.values())  # Y compris le pool de lecture
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+
+def assert_max_queries(client, method, url, max_queries, **kwargs):
+    """Appeler une route avec le client de test et échouer au-delà de `max_queries` requêtes SQL.
+
+    Retourne la réponse et le nombre de requêtes. À appeler dans un app context.
+    """
+    with count_queries() as statements:
+        response = client.open(url, method=method, **kwargs)
+    if len(statements) > max_queries:
+        details = '\n'.join(f'  {s}' for s in statements)
+        raise AssertionError(
+            f"{method} {url} : {len(statements)} requêtes SQL (maximum {max_queries})\n{details}"
+        )
+    return response, len(statements)
@@ -0,0 +1,51 @@
+from app import db
+from app.models import AppMeta
+
+# Révision incrémentée à chaque écriture dans question_stats, une par apprenant
+STATS_REVISION = 'stats_revision'
+# Heure (secondes depuis l'epoch) du dernier import de questions, voir app.response_cache
+BANK_REVISION = 'bank_revision'
+
+
+def stats_revision_key(user_id):
+    return f'{STATS_REVISION}:{user_id}'
+
+
+def bump_revision(key):
+    """Incrémenter un compteur de révision dans la transaction courante et retourner sa valeur"""
+    table = AppMeta.__table__
+    result = db.session.execute(
+        table.update().where(table.c.key == key).values(value=table.c.value + 1)
+    )
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(key=key, value=1))
+    return db.session.execute(
+        db.select(table.c.value).where(table.c.key == key)
+    ).scalar_one()
+
+
+def revision_query(key):
+    """Sous-requête scalaire lisant un compteur de révision (0 s'il n'existe pas).
+
+    `key` peut être un bindparam, pour construire la requête une seule fois.
+    """
+    table = AppMeta.__table__
+    return db.func.coalesce(
+        db.select(table.c.value).where(table.c.key == key).scalar_subquery(), 0
+    )
+
+
+def get_meta(key, default=0):
+    """Lire une valeur de app_meta"""
+    value = db.session.execute(
+        db.select(AppMeta.__table__.c.value).where(AppMeta.__table__.c.key == key)
+    ).scalar()
+    return default if value is None else value
+
+
+def set_meta(key, value):
+    """Écrire une valeur de app_meta dans la transaction courante"""
+    table = AppMeta.__table__
+    result = db.session.execute(table.update().where(table.c.key == key).values(value=value))
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(key=key, value=value))
@@ -0,0 +1,250 @@
+"""Migrations versionnées du schéma.
+
+db.create_all() crée les tables manquantes mais ne modifie jamais une table
+existante (index, contraintes). Les changements de ce type sont listés ici et
+appliqués au démarrage, une seule fois par base ; les versions appliquées sont
+enregistrées dans la table schema_migrations.
+
+Chaque migration doit être idempotente : sur une base neuve, create_all() a
+déjà créé les index déclarés dans les modèles. Une nouvelle table doit elle
+aussi venir avec une migration, même vide : en STARTUP_MODE='fast',
+create_all() n'est appelé que si la version du schéma a changé.
+
+Les reconstructions de données dérivées (question_stats, theme_stats,
+review_state) sont différées après la dernière migration : elles lisent le
+schéma des modèles actuels, qu'une base ancienne n'a qu'une fois toutes les
+migrations passées. Les migrations qui les ont demandées ne sont enregistrées
+qu'après leur réussite.
+"""
+from sqlalchemy import bindparam, func, inspect, text
+
+from app import db
+from app.models import SchemaMigration, SessionQuiz, SessionAnswer, QuestionStats, ReviewState, QuizState, Questions, \
+    ThemeStats
+
+# Reconstructions demandées par les migrations, exécutées à la fin de upgrade()
+_pending_rebuilds = set()
+
+
+def _unique_session_answers():
+    # Supprimer les doublons (session, question) laissés par les anciens
+    # rechargements de la page de résultats avant de poser l'index unique
+    removed = db.session.execute(text(
+        "DELETE FROM session_answers WHERE id NOT IN ("
+        "SELECT max(id) FROM session_answers GROUP BY session_id, question_id)"
+    )).rowcount
+    db.session.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_session_answers_session_question "
+        "ON session_answers (session_id, question_id)"
+    ))
+    # Les réponses en cours sont désormais écrites directement dans session_answers
+    db.session.execute(text("DROP TABLE IF EXISTS quiz_state_answers"))
+
+    if removed:
+        _pending_rebuilds.add('question_stats')
+
+
+def _hot_query_indexes():
+    for statement in (
+        # Version de la banque : max(updated_at) et count(*) servis par l'index
+        "CREATE INDEX IF NOT EXISTS ix_questions_updated_at ON questions (updated_at)",
+        # Chargement et tirage par thème
+        "CREATE INDEX IF NOT EXISTS ix_questions_theme_id ON questions (theme, id)",
+        # Dernière réponse par question (reconstruction de question_stats)
+        "CREATE INDEX IF NOT EXISTS ix_session_answers_question_id_id ON session_answers (question_id, id)",
+        # Redondant avec l'index unique (session_id, question_id)
+        "DROP INDEX IF EXISTS ix_session_answers_session_id",
+        # Agrégats par thème du dashboard, couverts par l'index
+        "CREATE INDEX IF NOT EXISTS ix_question_stats_theme_correct ON question_stats (theme, last_is_correct)",
+        "DROP INDEX IF EXISTS ix_question_stats_theme",
+    ):
+        db.session.execute(text(statement))
+
+
+def _review_states():
+    # La table est créée par create_all() ; la remplir à partir de l'historique
+    _pending_rebuilds.add('review_state')
+
+
+def _search_index():
+    # Table FTS5 (SQLite uniquement) ; elle est remplie à la première synchronisation
+    from app.search import create_fts_table
+    create_fts_table()
+
+
+def _per_user_partitioning():
+    from app.users import ensure_default_user
+
+    # L'historique existant appartient à l'apprenant par défaut
+    ensure_default_user()
+    connection = db.session.connection()
+    inspector = inspect(connection)
+    quote = connection.dialect.identifier_preparer.quote
+    for model in (SessionQuiz, SessionAnswer):
+        table = model.__tablename__
+        if 'user_id' not in {column['name'] for column in inspector.get_columns(table)}:
+            db.session.execute(text(
+                f"ALTER TABLE {quote(table)} ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1"
+            ))
+
+    # question_stats et review_state sont dérivées de l'historique : plutôt que de
+    # migrer leur clé primaire, les recréer avec (user_id, question_id) et les reconstruire
+    for model, rebuild in ((QuestionStats, 'question_stats'), (ReviewState, 'review_state')):
+        table = model.__table__
+        if 'user_id' not in inspector.get_pk_constraint(table.name)['constrained_columns']:
+            table.drop(connection)
+            table.create(connection)
+            _pending_rebuilds.add(rebuild)
+
+    for statement in (
+        "DROP INDEX IF EXISTS ix_session_answers_question_id_id",
+        "DROP INDEX IF EXISTS ix_question_stats_theme_correct",
+        "DROP INDEX IF EXISTS ix_review_state_next_due_theme",
+    ):
+        db.session.execute(text(statement))
+    for model in (SessionQuiz, SessionAnswer):
+        # Nouvel inspecteur : le précédent garde en cache les colonnes d'avant ALTER TABLE
+        columns = {column['name'] for column in inspect(connection).get_columns(model.__tablename__)}
+        for index in model.__table__.indexes:
+            # Un index sur une colonne ajoutée plus tard est créé par la migration de cette colonne
+            if {column.name for column in index.columns} <= columns:
+                index.create(connection, checkfirst=True)
+
+
+def _session_rollups():
+    # theme_stats est créée par create_all() ; la remplir à partir de question_stats
+    _pending_rebuilds.add('theme_stats')
+
+    # Résultats par thème des quiz déjà finalisés (ceux qui n'ont plus d'état en cours) ;
+    # la durée des anciens quiz n'est pas connue et reste vide
+    from app.stats import theme_results
+    rows = db.session.query(SessionAnswer.session_id, SessionAnswer.is_correct, Questions.theme) \
+        .join(Questions, Questions.id == SessionAnswer.question_id) \
+        .filter(SessionAnswer.session_id.notin_(db.select(QuizState.session_id))) \
+        .order_by(SessionAnswer.session_id).all()
+    by_session = {}
+    for row in rows:
+        by_session.setdefault(row.session_id, []).append(row)
+    table = SessionQuiz.__table__
+    if by_session:
+        db.session.execute(table.update().where(table.c.id_session == bindparam('b_id')).values(
+            theme_results=bindparam('theme_results', type_=table.c.theme_results.type)
+        ), [{'b_id': session_id, 'theme_results': theme_results(session_rows)}
+            for session_id, session_rows in by_session.items()])
+
+
+def _question_banks():
+    from app.banks import ensure_default_bank
+
+    # Les questions et l'historique existants appartiennent à la banque par défaut
+    ensure_default_bank()
+    connection = db.session.connection()
+    inspector = inspect(connection)
+    quote = connection.dialect.identifier_preparer.quote
+    for model in (Questions, SessionQuiz, QuestionStats, ReviewState):
+        table = model.__tablename__
+        if 'bank_id' not in {column['name'] for column in inspector.get_columns(table)}:
+            db.session.execute(text(
+                f"ALTER TABLE {quote(table)} ADD COLUMN bank_id INTEGER NOT NULL DEFAULT 1"
+            ))
+
+    # theme_stats est dérivée de question_stats : la recréer avec (user_id, bank_id, theme)
+    table = ThemeStats.__table__
+    if 'bank_id' not in inspector.get_pk_constraint(table.name)['constrained_columns']:
+        table.drop(connection)
+        table.create(connection)
+        _pending_rebuilds.add('theme_stats')
+
+    for statement in (
+        "DROP INDEX IF EXISTS ix_questions_theme_id",
+        'DROP INDEX IF EXISTS "ix_sessionQuiz_user_id_session"',
+        "DROP INDEX IF EXISTS ix_question_stats_user_theme_correct",
+        "DROP INDEX IF EXISTS ix_review_state_user_next_due",
+    ):
+        db.session.execute(text(statement))
+    for model in (Questions, SessionQuiz, QuestionStats, ReviewState):
+        for index in model.__table__.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def _stats_applied_flag():
+    connection = db.session.connection()
+    if 'stats_applied' not in {column['name'] for column in inspect(connection).get_columns('sessionQuiz')}:
+        db.session.execute(text('ALTER TABLE "sessionQuiz" ADD COLUMN stats_applied BOOLEAN NOT NULL DEFAULT 0'))
+    # Quiz déjà finalisés : ceux qui n'ont plus d'état en cours (comme pour la migration 6)
+    table = SessionQuiz.__table__
+    db.session.execute(table.update().where(
+        table.c.id_session.notin_(db.select(QuizState.session_id))
+    ).values(stats_applied=True))
+    # Les statistiques ne comptent plus que les réponses des quiz finalisés
+    _pending_rebuilds.update(('question_stats', 'review_state'))
+
+
+def _quiz_state_answered():
+    connection = db.session.connection()
+    if 'answered' not in {column['name'] for column in inspect(connection).get_columns('quiz_state')}:
+        db.session.execute(text("ALTER TABLE quiz_state ADD COLUMN answered INTEGER NOT NULL DEFAULT 0"))
+    # Quiz en cours : compter une fois les réponses déjà enregistrées
+    db.session.execute(text(
+        "UPDATE quiz_state SET answered = "
+        "(SELECT count(*) FROM session_answers WHERE session_answers.session_id = quiz_state.session_id)"
+    ))
+
+
+# (version, description, fonction) ; ne jamais modifier une migration publiée,
+# en ajouter une nouvelle à la fin
+MIGRATIONS = [
+    (1, "Index unique (session_id, question_id) sur session_answers", _unique_session_answers),
+    (2, "Index composites des requêtes chaudes", _hot_query_indexes),
+    (3, "États de répétition espacée (review_state)", _review_states),
+    (4, "Index de recherche plein texte (questions_fts)", _search_index),
+    (5, "Données partitionnées par apprenant (user_id)", _per_user_partitioning),
+    (6, "Résultats par thème des quiz et totaux par thème (theme_stats)", _session_rollups),
+    (7, "Banques de questions (bank_id) et index (bank_id, theme)", _question_banks),
+    (8, "Statistiques appliquées une fois par quiz (sessionQuiz.stats_applied)", _stats_applied_flag),
+    (9, "Nombre de questions répondues des quiz en cours (quiz_state.answered)", _quiz_state_answered),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version():
+    return db.session.query(func.max(SchemaMigration.version)).scalar() or 0
+
+
+def upgrade():
+    """Appliquer, dans l'ordre, les migrations pas encore enregistrées.
+
+    Une migration qui demande une reconstruction n'est enregistrée qu'une fois
+    les reconstructions réussies (ainsi que les suivantes) : si l'une échoue,
+    ces migrations, idempotentes, sont rejouées au prochain démarrage et
+    redemandent la reconstruction.
+    """
+    version = current_version()
+    unrecorded = []  # Migrations appliquées, enregistrées après les reconstructions
+    try:
+        for migration_version, name, apply in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            apply()
+            unrecorded.append(SchemaMigration(version=migration_version, name=name))
+            if not _pending_rebuilds:
+                db.session.add_all(unrecorded)
+                unrecorded = []
+            db.session.commit()
+
+        if 'question_stats' in _pending_rebuilds:
+            from app.stats import rebuild_question_stats
+            rebuild_question_stats()  # Reconstruit aussi theme_stats
+        elif 'theme_stats' in _pending_rebuilds:
+            from app.stats import rebuild_theme_stats
+            rebuild_theme_stats()
+            db.session.commit()
+        if 'review_state' in _pending_rebuilds:
+            from app.review import rebuild_review_states
+            rebuild_review_states()
+        if unrecorded:
+            db.session.add_all(unrecorded)
+            db.session.commit()
+    finally:
+        _pending_rebuilds.clear()
@@ -2,15 +2,43 @@ from app import db
 from datetime import datetime, timezone
 
 
+class User(db.Model):
+    """Apprenant : sessions, réponses et statistiques lui sont rattachées"""
+    __tablename__ = 'users'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<User id={self.id}>"
+
+
+class Bank(db.Model):
+    """Banque de questions (CISA, CISM...) : questions, quiz et statistiques y sont rattachés"""
+    __tablename__ = 'banks'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    code = db.Column(db.String(50), nullable=False, unique=True)  # Identifiant dans les URL (?bank=cisa)
+    name = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<Bank id={self.id} code='{self.code}'>"
+
+
 class Questions(db.Model):
     __tablename__ = 'questions'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    bank_id = db.Column(db.Integer, db.ForeignKey('banks.id'), nullable=False, default=1)
     text = db.Column(db.Text, nullable=False)
     options = db.Column(db.JSON, nullable=False)  # Liste de réponses possibles
     correct = db.Column(db.Integer, nullable=False)  # Index de la bonne réponse (0-based)
     explanation = db.Column(db.Text, nullable=True)
     theme = db.Column(db.String(100), nullable=False)
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    __table_args__ = (
+        db.Index('ix_questions_bank_theme_id', 'bank_id', 'theme', 'id'),  # Questions d'un thème (couvrant)
+        db.Index('ix_questions_bank_updated_at', 'bank_id', 'updated_at'),  # Version d'une banque
+    )
 
     def __repr__(self):
         return f"<Questions id={self.id} theme='{self.theme}'>"
@@ -19,12 +47,21 @@ class Questions(db.Model):
 class SessionQuiz(db.Model):
     __tablename__ = 'sessionQuiz'
     id_session = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, default=1)
+    bank_id = db.Column(db.Integer, db.ForeignKey('banks.id'), nullable=False, default=1)
     score = db.Column(db.Float, nullable=False, default=0)  # Score total
     theme_results = db.Column(db.JSON, nullable=True)  # Résultats par thème
     duration = db.Column(db.Integer, nullable=True)  # Durée en secondes
+    # Réponses prises en compte dans les statistiques (une seule fois, à la première finalisation)
+    stats_applied = db.Column(db.Boolean, nullable=False, default=False)
     param_quiz = db.Column(db.JSON, nullable=True)  # Paramètres du quiz
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        # Historique d'un apprenant dans une banque
+        db.Index('ix_sessionQuiz_user_bank_session', 'user_id', 'bank_id', 'id_session'),
+    )
+
     def __repr__(self):
         return f"<SessionQuiz id_session={self.id_session} score={self.score}>"
 
@@ -33,11 +70,110 @@ class SessionAnswer(db.Model):
     __tablename__ = 'session_answers'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     session_id = db.Column(db.Integer, db.ForeignKey('sessionQuiz.id_session'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, default=1)  # Copie de celui du quiz
     question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
     user_answer = db.Column(db.Integer, nullable=False)  # Index de la réponse donnée
     is_correct = db.Column(db.Boolean, nullable=False)
 
+    # Une seule réponse par question et par quiz : les réponses sont écrites à la
+    # soumission et une resoumission remplace la précédente
+    __table_args__ = (
+        db.Index('uq_session_answers_session_question', 'session_id', 'question_id', unique=True),
+        # Dernière réponse par question d'un apprenant
+        db.Index('ix_session_answers_user_question_id', 'user_id', 'question_id', 'id'),
+    )
 
     def __repr__(self):
         return f"<SessionAnswer session={self.session_id} question={self.question_id}>"
 
+
+class QuestionStats(db.Model):
+    __tablename__ = 'question_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), primary_key=True)
+    bank_id = db.Column(db.Integer, nullable=False, default=1)  # Copie de celui de la question
+    theme = db.Column(db.String(100), nullable=False)
+    last_answer_id = db.Column(db.Integer, nullable=False)  # ID de la dernière SessionAnswer prise en compte
+    last_user_answer = db.Column(db.Integer, nullable=False)
+    last_is_correct = db.Column(db.Boolean, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # Nombre total de réponses
+    correct_count = db.Column(db.Integer, nullable=False, default=0)  # Nombre de réponses correctes
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # Agrégats par thème d'un apprenant (reconstruction de theme_stats)
+        db.Index('ix_question_stats_user_bank_theme', 'user_id', 'bank_id', 'theme', 'last_is_correct'),
+    )
+
+    def __repr__(self):
+        return f"<QuestionStats question={self.question_id} last_is_correct={self.last_is_correct}>"
+
+
+class ThemeStats(db.Model):
+    """Totaux par thème d'un apprenant, agrégés de question_stats et tenus à jour à chaque finalisation"""
+    __tablename__ = 'theme_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    bank_id = db.Column(db.Integer, db.ForeignKey('banks.id'), primary_key=True)
+    theme = db.Column(db.String(100), primary_key=True)
+    answered = db.Column(db.Integer, nullable=False, default=0)  # Questions répondues au moins une fois
+    correct = db.Column(db.Integer, nullable=False, default=0)  # Questions dont la dernière réponse est correcte
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # Nombre total de réponses
+    correct_attempts = db.Column(db.Integer, nullable=False, default=0)  # Nombre de réponses correctes
+
+    def __repr__(self):
+        return f"<ThemeStats user={self.user_id} bank={self.bank_id} theme='{self.theme}' " \
+               f"{self.correct}/{self.answered}>"
+
+
+class ReviewState(db.Model):
+    """État de répétition espacée d'une question (ordonnanceur SM-2, voir app.review)"""
+    __tablename__ = 'review_state'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), primary_key=True)
+    bank_id = db.Column(db.Integer, nullable=False, default=1)  # Copie de celui de la question
+    theme = db.Column(db.String(100), nullable=False)
+    ease = db.Column(db.Float, nullable=False, default=2.5)  # Facteur de facilité
+    interval = db.Column(db.Float, nullable=False, default=0)  # Intervalle courant en jours
+    repetitions = db.Column(db.Integer, nullable=False, default=0)  # Bonnes réponses consécutives
+    next_due = db.Column(db.DateTime, nullable=False)  # Prochaine révision
+    last_answer_id = db.Column(db.Integer, nullable=False)  # ID de la dernière SessionAnswer prise en compte
+
+    __table_args__ = (
+        # Questions à réviser d'un apprenant dans une banque, les plus en retard d'abord
+        db.Index('ix_review_state_user_bank_next_due', 'user_id', 'bank_id', 'next_due', 'theme', 'question_id'),
+    )
+
+    def __repr__(self):
+        return f"<ReviewState question={self.question_id} next_due={self.next_due}>"
+
+
+class AppMeta(db.Model):
+    __tablename__ = 'app_meta'
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)  # Compteur de révision
+
+    def __repr__(self):
+        return f"<AppMeta {self.key}={self.value}>"
+
+
+class QuizState(db.Model):
+    """État d'un quiz en cours (remplace le stockage dans le cookie de session)"""
+    __tablename__ = 'quiz_state'
+    session_id = db.Column(db.Integer, db.ForeignKey('sessionQuiz.id_session'), primary_key=True)
+    question_ids = db.Column(db.JSON, nullable=False)  # Questions du quiz, dans l'ordre
+    config = db.Column(db.JSON, nullable=True)  # show_answers, total_questions
+    answered = db.Column(db.Integer, nullable=False, default=0)  # Questions répondues, compté à la soumission
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<QuizState session={self.session_id}>"
+
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<SchemaMigration {self.version} {self.name}>"
@@ -0,0 +1,180 @@
+"""Stockage côté serveur de l'état des quiz en cours.
+
+Le cookie de session Flask ne contient plus que l'ID du quiz ; la liste des
+questions et la progression sont conservées ici, indexées par
+SessionQuiz.id_session. Deux implémentations, choisies par QUIZ_STATE_BACKEND :
+
+- 'sql'    : table quiz_state partagée entre processus ; les réponses sont dans
+             session_answers, où elles sont écrites à la soumission, et la
+             ligne d'état tient le nombre de questions répondues ;
+- 'memory' : dictionnaire LRU en mémoire, pour un seul processus.
+
+Dans les deux cas la lecture de l'état et l'enregistrement d'une réponse sont
+en O(1) : le nombre de questions répondues est tenu à jour à chaque
+soumission (add_answers), sans relire les réponses du quiz. Les états expirent après QUIZ_STATE_TTL secondes
+sans activité.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+
+from app import db
+from app.models import QuizState, SessionAnswer
+
+
+class QuizProgress:
+    """Questions d'un quiz en cours et nombre de questions déjà répondues"""
+
+    def __init__(self, question_ids, config=None, answered=0):
+        self.question_ids = question_ids
+        self.config = config or {}
+        self.answered = answered  # Questions distinctes ayant une réponse
+
+
+class SQLQuizStateStore:
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def _expiry(self):
+        return datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+
+    def create(self, session_id, question_ids, config):
+        self.purge_expired()
+        db.session.add(QuizState(
+            session_id=session_id,
+            question_ids=list(question_ids),
+            config=config,
+            expires_at=self._expiry()
+        ))
+        db.session.commit()
+
+    def get(self, session_id):
+        state = db.session.get(QuizState, session_id)
+        if state is None or _aware(state.expires_at) <= datetime.now(timezone.utc):
+            return None
+        return QuizProgress(state.question_ids, state.config, state.answered)
+
+    def answered_among(self, session_id, question_ids):
+        """Parmi ces questions, celles qui ont déjà une réponse (index (session_id, question_id))"""
+        if not question_ids:
+            return set()
+        return {question_id for (question_id,) in db.session.query(SessionAnswer.question_id).filter(
+            SessionAnswer.session_id == session_id, SessionAnswer.question_id.in_(list(question_ids))
+        )}
+
+    def add_answers(self, session_id, answers):
+        """Recompter les questions répondues et prolonger l'expiration ; retourne le nombre de questions répondues.
+
+        À appeler après avoir écrit les réponses dans session_answers, dans la
+        même transaction (commitée par l'appelant). Le compte est relu dans
+        session_answers (une ligne par question, index (session_id, question_id))
+        par l'instruction qui l'écrit : deux soumissions simultanées de la même
+        question ne le font pas avancer deux fois.
+        """
+        table = QuizState.__table__
+        answered = db.select(db.func.count()).select_from(SessionAnswer) \
+            .where(SessionAnswer.session_id == session_id).scalar_subquery()
+        return db.session.execute(
+            table.update().where(table.c.session_id == session_id)
+            .values(expires_at=self._expiry(), answered=answered).returning(table.c.answered)
+        ).scalar() or 0
+
+    def delete(self, session_id):
+        QuizState.query.filter(QuizState.session_id == session_id).delete()
+        db.session.commit()
+
+    def delete_many(self, session_ids):
+        # Dans la transaction courante (écriture différée, voir app.ingestion)
+        QuizState.query.filter(QuizState.session_id.in_(session_ids)).delete(synchronize_session=False)
+
+    def purge_expired(self):
+        QuizState.query.filter(QuizState.expires_at <= datetime.now(timezone.utc)) \
+            .delete(synchronize_session=False)
+
+
+class MemoryQuizStateStore:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._states = OrderedDict()  # session_id -> (expiration, questions, config, questions répondues)
+        self._lock = threading.Lock()
+
+    def create(self, session_id, question_ids, config):
+        with self._lock:
+            self._states[session_id] = (time.monotonic() + self.ttl, list(question_ids), config, set())
+            self._states.move_to_end(session_id)
+            # Évincer les états les moins récemment utilisés
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+
+    def _touch(self, session_id):
+        entry = self._states.get(session_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._states[session_id]
+            return None
+        entry = self._states[session_id] = (time.monotonic() + self.ttl,) + entry[1:]
+        self._states.move_to_end(session_id)
+        return entry
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._touch(session_id)
+            if entry is None:
+                return None
+            _, question_ids, config, answered = entry
+            return QuizProgress(question_ids, config, len(answered))
+
+    def answered_among(self, session_id, question_ids):
+        with self._lock:
+            entry = self._states.get(session_id)
+            return set(question_ids) & entry[3] if entry is not None else set()
+
+    def add_answers(self, session_id, answers):
+        with self._lock:
+            entry = self._touch(session_id)
+            if entry is None:
+                return 0
+            answered = entry[3]
+            answered.update(question_id for question_id, _, _ in answers)
+            return len(answered)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._states.pop(session_id, None)
+
+    def delete_many(self, session_ids):
+        with self._lock:
+            for session_id in session_ids:
+                self._states.pop(session_id, None)
+
+    def purge_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            for session_id in [k for k, entry in self._states.items() if entry[0] <= now]:
+                del self._states[session_id]
+
+
+def _aware(value):
+    # SQLite renvoie des datetimes naïfs (stockés en UTC)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def get_quiz_state_store():
+    """Retourner le store configuré pour l'application courante (créé au premier appel)"""
+    store = current_app.extensions.get('quiz_state')
+    if store is None:
+        backend = current_app.config.get('QUIZ_STATE_BACKEND', 'sql')
+        ttl = current_app.config.get('QUIZ_STATE_TTL', 24 * 3600)
+        if backend == 'memory':
+            store = MemoryQuizStateStore(ttl, current_app.config.get('QUIZ_STATE_MAX_ENTRIES', 10000))
+        elif backend == 'sql':
+            store = SQLQuizStateStore(ttl)
+        else:
+            raise ValueError(f"QUIZ_STATE_BACKEND inconnu : {backend}")
+        current_app.extensions['quiz_state'] = store
+    return store
@@ -0,0 +1,208 @@
+"""Cache des réponses des pages qui ne dépendent que de la banque de questions.
+
+Les pages décorées par @cached_response (accueil, configuration du quiz,
+recherche) sont rendues une fois par version de la banque puis servies depuis
+le cache. La version est la révision 'bank_revision' de app_meta, fixée par
+l'importeur (bank_changed) à l'heure de l'import en secondes : elle sert à la
+fois de clé de cache et d'en-tête Last-Modified.
+
+Deux implémentations, choisies par RESPONSE_CACHE :
+
+- 'memory'     : LRU en mémoire, propre au processus ;
+- 'filesystem' : un fichier par réponse dans RESPONSE_CACHE_DIR, partagé par
+                 les processus d'une même machine.
+
+Les deux sont bornés à RESPONSE_CACHE_MAX_ENTRIES entrées, les moins
+récemment servies étant évincées. La clé ne retient que les paramètres de
+l'URL que la vue lit (argument `params` du décorateur) : des paramètres
+quelconques ajoutés à l'URL ne créent pas de nouvelle entrée.
+
+Les réponses portent ETag, Last-Modified et Cache-Control (public, avec
+s-maxage pour les caches partagés comme l'edge de Vercel) : les requêtes
+conditionnelles reçoivent un 304.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request
+
+from app.meta import BANK_REVISION, get_meta, set_meta
+
+# Version des pages qui ne dépendent pas de la banque : le démarrage du processus
+_STARTED = int(time.time())
+
+
+class CachedResponse:
+    """Corps et métadonnées d'une réponse rendue"""
+
+    def __init__(self, body, mimetype, etag, last_modified):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.last_modified = last_modified  # Secondes depuis l'epoch, 0 si inconnue
+
+
+class MemoryResponseCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemResponseCache:
+    def __init__(self, directory, max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.response')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(self._path(key))  # Date de dernier accès, pour l'éviction
+        except OSError:
+            pass
+        return CachedResponse(body, header['mimetype'], header['etag'], header['last_modified'])
+
+    def set(self, key, entry):
+        # Écriture atomique : un autre processus ne lit jamais un fichier partiel
+        header = json.dumps({'mimetype': entry.mimetype, 'etag': entry.etag,
+                             'last_modified': entry.last_modified})
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header.encode() + b'\n' + entry.body)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        # Appelé à chaque écriture, donc seulement quand une page est rendue
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith('.response')]
+        if len(paths) <= self.max_entries:
+            return
+        entries = []
+        for path in paths:
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.response'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+def get_response_cache():
+    """Retourner le cache configuré pour l'application courante, ou None s'il est désactivé"""
+    extensions = current_app.extensions
+    if 'response_cache' not in extensions:
+        backend = current_app.config.get('RESPONSE_CACHE', 'memory')
+        max_entries = current_app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 256)
+        if backend == 'memory':
+            cache = MemoryResponseCache(max_entries)
+        elif backend == 'filesystem':
+            directory = current_app.config.get('RESPONSE_CACHE_DIR') or \
+                os.path.join(current_app.instance_path, 'response_cache')
+            cache = FileSystemResponseCache(directory, max_entries)
+        elif backend in ('', 'none'):
+            cache = None
+        else:
+            raise ValueError(f"RESPONSE_CACHE inconnu : {backend}")
+        extensions['response_cache'] = cache
+    return extensions['response_cache']
+
+
+def bank_changed():
+    """Marquer la banque comme modifiée (appelé par l'importeur) et vider le cache local.
+
+    La révision est l'heure courante en secondes, strictement croissante même
+    pour deux imports dans la même seconde. Écrite dans la transaction
+    courante : à l'appelant de commiter.
+    """
+    revision = max(int(time.time()), get_meta(BANK_REVISION) + 1)
+    set_meta(BANK_REVISION, revision)
+    cache = get_response_cache()
+    if cache is not None:
+        cache.clear()
+    return revision
+
+
+def cached_response(bank=True, params=()):
+    """Mettre en cache la réponse GET d'une vue, par paramètres et par version de la banque.
+
+    La réponse est partagée par tous les visiteurs : la vue ne doit dépendre
+    ni de la session ni de l'apprenant, et seulement des paramètres d'URL
+    listés dans `params`. Avec bank=False, la page ne dépend que du code : elle
+    est gardée jusqu'au redémarrage du processus, sans lire la révision en base.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            if cache is None or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            revision = get_meta(BANK_REVISION) if bank else _STARTED
+            query = urlencode([(name, value) for name in params for value in request.args.getlist(name)])
+            key = f'{request.endpoint}:{revision}:{request.path}?{query}'
+            entry = cache.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                entry = CachedResponse(body, response.mimetype, hashlib.sha1(body).hexdigest(), revision)
+                cache.set(key, entry)
+
+            response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+            if entry.last_modified:
+                response.last_modified = datetime.fromtimestamp(entry.last_modified, timezone.utc)
+            max_age = current_app.config.get('RESPONSE_CACHE_SHARED_MAX_AGE', 60)
+            response.headers['Cache-Control'] = f'public, max-age=0, s-maxage={max_age}'
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
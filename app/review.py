@@ -0,0 +1,165 @@
+"""Répétition espacée : ordonnanceur SM-2 simplifié et filtre 'due'.
+
+Chaque question répondue a, pour chaque apprenant, une ligne review_state
+(facilité, intervalle, prochaine révision). Elle est mise à jour à la première
+finalisation d'un quiz, comme question_stats (voir SessionQuiz.stats_applied) ;
+last_answer_id est le plus grand ID de réponse appliqué.
+
+Les questions à réviser sont lues par un parcours de l'index
+(user_id, bank_id, next_due, theme) borné par LIMIT : le coût dépend du nombre de
+questions demandées, pas de la taille de l'historique ni du nombre
+d'apprenants.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam
+
+from app import db
+from app.models import Questions, SessionAnswer, SessionQuiz, ReviewState
+from app.banks import DEFAULT_BANK_ID
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+EASE_PENALTY = 0.2  # Retirée à la facilité après une mauvaise réponse
+MAX_INTERVAL = 365  # Jours ; borne la croissance géométrique des intervalles
+
+
+def schedule(state, is_correct, now):
+    """Appliquer une réponse à un état de révision (SM-2 avec une note binaire)"""
+    if is_correct:
+        state.repetitions += 1
+        if state.repetitions == 1:
+            state.interval = 1
+        elif state.repetitions == 2:
+            state.interval = 6
+        else:
+            state.interval = min(MAX_INTERVAL, round(state.interval * state.ease, 2))
+    else:
+        # Question ratée : à revoir dès le prochain quiz
+        state.repetitions = 0
+        state.interval = 0
+        state.ease = max(MIN_EASE, state.ease - EASE_PENALTY)
+    state.next_due = now + timedelta(days=state.interval)
+
+
+class _State:
+    """État de révision en cours de calcul, écrit ensuite en une seule instruction"""
+
+    def __init__(self, user_id, question_id, bank_id, theme, ease=INITIAL_EASE, interval=0, repetitions=0,
+                 next_due=None, last_answer_id=0):
+        self.user_id = user_id
+        self.question_id = question_id
+        self.bank_id = bank_id
+        self.theme = theme
+        self.ease = ease
+        self.interval = interval
+        self.repetitions = repetitions
+        self.next_due = next_due
+        self.last_answer_id = last_answer_id
+
+    def row(self):
+        return {'user_id': self.user_id, 'question_id': self.question_id, 'bank_id': self.bank_id,
+                'theme': self.theme, 'ease': self.ease,
+                'interval': self.interval, 'repetitions': self.repetitions,
+                'next_due': self.next_due, 'last_answer_id': self.last_answer_id}
+
+
+def update_review_states(user_id, answers, now=None):
+    """Mettre à jour les review_state d'un apprenant à partir de ses réponses déjà insérées.
+
+    Les réponses sont celles de quiz finalisés pour la première fois : toutes
+    sont appliquées, dans l'ordre des IDs, même si un quiz finalisé plus tôt a
+    des réponses plus récentes. Les écritures sont groupées en un UPDATE et un
+    INSERT. Retourne le nombre de questions mises à jour.
+    """
+    answers = sorted((a for a in answers if a.id is not None), key=lambda a: a.id)
+    if not answers:
+        return 0
+
+    now = now or datetime.now(timezone.utc)
+    question_ids = {a.question_id for a in answers}
+    states = {
+        row.question_id: _State(*row)
+        for row in db.session.query(
+            ReviewState.user_id, ReviewState.question_id, ReviewState.bank_id, ReviewState.theme, ReviewState.ease,
+            ReviewState.interval, ReviewState.repetitions, ReviewState.next_due, ReviewState.last_answer_id
+        ).filter(ReviewState.user_id == user_id, ReviewState.question_id.in_(question_ids))
+    }
+
+    missing_ids = question_ids - states.keys()
+    themes = {}
+    if missing_ids:
+        themes = {
+            question_id: (bank_id, theme) for question_id, bank_id, theme in db.session.query(
+                Questions.id, Questions.bank_id, Questions.theme
+            ).filter(Questions.id.in_(missing_ids))
+        }
+
+    inserts, updates = {}, {}
+    for answer in answers:
+        state = states.get(answer.question_id)
+        if state is None:
+            if answer.question_id not in themes:
+                continue
+            state = states[answer.question_id] = inserts[answer.question_id] = \
+                _State(user_id, answer.question_id, *themes[answer.question_id])
+        elif answer.question_id not in inserts:
+            updates[answer.question_id] = state
+
+        schedule(state, answer.is_correct, now)
+        state.last_answer_id = max(state.last_answer_id, answer.id)
+
+    table = ReviewState.__table__
+    if updates:
+        db.session.execute(table.update().where(
+            table.c.user_id == bindparam('b_user_id'), table.c.question_id == bindparam('b_id')
+        ).values(
+            ease=bindparam('ease'),
+            interval=bindparam('interval'),
+            repetitions=bindparam('repetitions'),
+            next_due=bindparam('next_due'),
+            last_answer_id=bindparam('last_answer_id')
+        ), [{'b_user_id': user_id, 'b_id': state.question_id, 'ease': state.ease, 'interval': state.interval,
+             'repetitions': state.repetitions, 'next_due': state.next_due,
+             'last_answer_id': state.last_answer_id} for state in updates.values()])
+    if inserts:
+        db.session.execute(table.insert(), [state.row() for state in inserts.values()])
+    return len(inserts) + len(updates)
+
+
+def rebuild_review_states():
+    """Reconstruire review_state en rejouant les quiz finalisés, datés par leur création"""
+    rows = db.session.query(
+        SessionAnswer.id, SessionAnswer.user_id, SessionAnswer.question_id, SessionAnswer.is_correct,
+        SessionQuiz.created_at, Questions.bank_id, Questions.theme
+    ).join(SessionQuiz, SessionQuiz.id_session == SessionAnswer.session_id) \
+     .join(Questions, Questions.id == SessionAnswer.question_id) \
+     .filter(SessionQuiz.stats_applied == True) \
+     .order_by(SessionAnswer.id).execution_options(yield_per=10000)
+
+    now = datetime.now(timezone.utc)
+    states = {}
+    for answer_id, user_id, question_id, is_correct, created_at, bank_id, theme in rows:
+        state = states.get((user_id, question_id))
+        if state is None:
+            state = states[user_id, question_id] = _State(user_id, question_id, bank_id, theme)
+        schedule(state, is_correct, created_at or now)
+        state.last_answer_id = answer_id
+
+    ReviewState.query.delete()
+    if states:
+        db.session.execute(ReviewState.__table__.insert(), [state.row() for state in states.values()])
+    db.session.commit()
+
+
+def due_question_ids(user_id, themes, limit=None, now=None, bank_id=DEFAULT_BANK_ID):
+    """IDs des questions à réviser par l'apprenant dans ces thèmes d'une banque, les plus en retard d'abord"""
+    query = db.session.query(ReviewState.question_id).filter(
+        ReviewState.user_id == user_id,
+        ReviewState.bank_id == bank_id,
+        ReviewState.next_due <= (now or datetime.now(timezone.utc)),
+        ReviewState.theme.in_(list(themes))
+    ).order_by(ReviewState.next_due)
+    if limit is not None:
+        query = query.limit(limit)
+    return [question_id for (question_id,) in query]
@@ -1,61 +1,62 @@
 from flask import render_template, request, jsonify, session, redirect, url_for, current_app as app
 from app import db
-from app.models import Questions, SessionQuiz, SessionAnswer
+from app.models import Questions, SessionQuiz, SessionAnswer, ThemeStats
+from app.stats import update_question_stats, theme_results, quiz_duration
+from app.bank import get_bank, record_answers, filter_statuses, ids_mask
+from app.review import update_review_states, due_question_ids
+from app.search import search_questions, search_question_ids
+from app.snapshot import get_question_or_404, get_questions
+from app.quiz_state import get_quiz_state_store
+from app.sql import upsert
+from app.users import current_user_id
+from app.response_cache import cached_response
+from app.ingestion import get_ingestor
+from app.database import read_only
+from app.sampling import BALANCES, WEIGHTINGS
+from app.banks import DEFAULT_BANK_ID, current_bank_id, list_banks
+import hashlib
 import json
+import random
 from datetime import datetime, timezone
 
+# Filtres de questions quand la requête n'en précise aucun
+DEFAULT_QUESTION_FILTERS = ['new', 'answered', 'incorrect']
+
 @app.route('/')
+@cached_response(bank=False)
 def index():
     return render_template('index.html')
 
 @app.route('/dashboard')
+@read_only
 def dashboard():
     """Afficher le dashboard avec les statistiques d'étude"""
-    # Récupérer toutes les sessions de quiz
-    all_sessions = SessionQuiz.query.all()
-    
-    # Récupérer TOUTES les réponses (y compris les doublons par question)
-    all_answers = SessionAnswer.query.all()
-    
-    # Créer un dictionnaire : question_id -> dernière réponse (chronologiquement)
-    last_answer_by_question = {}
-    for answer in all_answers:
-        question_id = answer.question_id
-        # Garder seulement la réponse la plus récente (la plus haute ID)
-        if question_id not in last_answer_by_question or answer.id > last_answer_by_question[question_id].id:
-            last_answer_by_question[question_id] = answer
-    
-    # Utiliser seulement la dernière réponse par question
-    unique_answers = list(last_answer_by_question.values())
-    
-    # Calculer les statistiques globales (basées sur les réponses uniques)
-    total_answers = len(unique_answers)
-    correct_answers = sum(1 for a in unique_answers if a.is_correct)
+    from sqlalchemy import func, case
+
+    user_id = current_user_id()
+    bank_id = current_bank_id()
+    wait_for_writes(user_id)
+    total_sessions = db.session.query(func.count(SessionQuiz.id_session)).filter(
+        SessionQuiz.user_id == user_id, SessionQuiz.bank_id == bank_id
+    ).scalar()
+
+    # Statistiques par thème et globales : theme_stats tient, par thème, le nombre
+    # de questions répondues et de questions dont la dernière réponse est correcte
+    theme_rows = db.session.query(ThemeStats.theme, ThemeStats.correct, ThemeStats.answered) \
+        .filter(ThemeStats.user_id == user_id, ThemeStats.bank_id == bank_id, ThemeStats.answered > 0) \
+        .order_by(ThemeStats.theme).all()
+    total_answers = sum(answered for _, _, answered in theme_rows)
+    correct_answers = sum(correct for _, correct, _ in theme_rows)
     incorrect_answers = total_answers - correct_answers
-    
+
     overall_score = (correct_answers / total_answers * 100) if total_answers > 0 else 0
     
-    # Calculer le pourcentage de progression globale (par rapport au total de la BD)
-    total_questions_in_db = Questions.query.count()
+    # Calculer le pourcentage de progression globale (par rapport au total de la banque)
+    total_questions_in_db = db.session.query(func.count(Questions.id)).filter(Questions.bank_id == bank_id).scalar()
     progression_percentage = (total_answers / total_questions_in_db * 100) if total_questions_in_db > 0 else 0
     
-    # Récupérer les statistiques par thème (basées sur les réponses uniques)
-    theme_stats_dict = {}
-    for answer in unique_answers:
-        question = Questions.query.get(answer.question_id)
-        if question:
-            theme = question.theme
-            if theme not in theme_stats_dict:
-                theme_stats_dict[theme] = {'correct': 0, 'total': 0}
-            
-            theme_stats_dict[theme]['total'] += 1
-            if answer.is_correct:
-                theme_stats_dict[theme]['correct'] += 1
-    
     theme_data = []
-    for theme, stats in sorted(theme_stats_dict.items()):
-        total = stats['total']
-        correct = stats['correct']
+    for theme, correct, total in theme_rows:
         percentage = (correct / total * 100) if total > 0 else 0
         theme_data.append({
             'name': theme,
@@ -65,18 +66,36 @@ def dashboard():
         })
     
     # Récupérer l'historique des quiz (derniers 10)
-    recent_sessions = SessionQuiz.query.order_by(SessionQuiz.id_session.desc()).limit(10).all()
+    recent_sessions = SessionQuiz.query.filter(SessionQuiz.user_id == user_id, SessionQuiz.bank_id == bank_id) \
+        .order_by(SessionQuiz.id_session.desc()).limit(10).all()
+    
+    # Les quiz finalisés portent leurs résultats par thème ; compter les réponses
+    # des quiz encore en cours, en une seule requête
+    answer_counts = {}
+    in_progress = [s.id_session for s in recent_sessions if s.theme_results is None]
+    if in_progress:
+        answer_counts = {
+            session_id: (correct or 0, total)
+            for session_id, correct, total in db.session.query(
+                SessionAnswer.session_id,
+                func.sum(case((SessionAnswer.is_correct == True, 1), else_=0)),
+                func.count(SessionAnswer.id)
+            ).filter(SessionAnswer.session_id.in_(in_progress)).group_by(SessionAnswer.session_id)
+        }
     
     session_history = []
     for sess in recent_sessions:
-        answers = SessionAnswer.query.filter(SessionAnswer.session_id == sess.id_session).all()
-        correct = sum(1 for a in answers if a.is_correct)
-        total = len(answers)
+        if sess.theme_results is not None:
+            correct = sum(result['correct'] for result in sess.theme_results.values())
+            total = sum(result['total'] for result in sess.theme_results.values())
+        else:
+            correct, total = answer_counts.get(sess.id_session, (0, 0))
         session_history.append({
             'session_id': sess.id_session,
             'score': round(sess.score, 1) if sess.score else 0,
             'correct': correct,
             'total': total,
+            'duration': sess.duration,
             'date': sess.created_at.strftime('%d/%m/%Y %H:%M') if sess.created_at else 'N/A'
         })
     
@@ -89,17 +108,23 @@ def dashboard():
                          total_questions_in_db=total_questions_in_db,
                          theme_stats=theme_data,
                          session_history=session_history,
-                         total_sessions=len(all_sessions))
+                         total_sessions=total_sessions,
+                         bank_code=request.args.get('bank'))
 
 @app.route('/quiz/config', methods=['GET', 'POST'])
+@cached_response(params=('bank',))
 def quiz_config():
     """Page de configuration du quiz avec sélection des options"""
     if request.method == 'GET':
-        # Récupérer les thèmes disponibles
-        themes = db.session.query(Questions.theme).distinct().all()
+        # Récupérer les thèmes disponibles dans la banque (index (bank_id, theme)) ;
+        # la liste des banques renseigne aussi le cache des codes
+        banks = list_banks()
+        bank_id = current_bank_id()
+        themes = db.session.query(Questions.theme).filter(Questions.bank_id == bank_id).distinct().all()
         themes = [t[0] for t in themes]
+        bank_code = next((code for id_, code, _ in banks if id_ == bank_id), None)
         
-        return render_template('quiz/config.html', themes=themes)
+        return render_template('quiz/config.html', themes=themes, banks=banks, bank_code=bank_code)
     
     elif request.method == 'POST':
         # Récupérer les paramètres du formulaire
@@ -109,122 +134,134 @@ def quiz_config():
         selected_themes = data.get('themes', [])
         num_questions = int(data.get('num_questions', 10))
         show_answers = data.get('show_answers', 'end')  # 'go' ou 'end'
-        question_filters = data.get('question_filters', ['new', 'answered', 'incorrect'])
+        question_filters = data.get('question_filters', DEFAULT_QUESTION_FILTERS)
+        search_query = (data.get('search') or '').strip()  # Quiz sur les résultats d'une recherche
+        balance = data.get('balance', 'none')  # Répartition par thème : 'none', 'exam' ou 'even'
+        weighting = data.get('weighting', 'uniform')  # 'errors' : privilégier les questions ratées
+        # Graine du tirage, conservée avec le quiz pour pouvoir le reproduire
+        seed = data.get('seed')
         
-        if not selected_themes or num_questions <= 0:
+        if not selected_themes or num_questions <= 0 or balance not in BALANCES or weighting not in WEIGHTINGS:
+            return jsonify({'error': 'Paramètres invalides'}), 400
+        try:
+            seed = random.getrandbits(32) if seed in (None, '') else int(seed)
+        except (TypeError, ValueError):
             return jsonify({'error': 'Paramètres invalides'}), 400
         
-        # Générer le quiz avec filtres
-        questions = generate_quiz_questions(selected_themes, num_questions, question_filters)
+        # Générer le quiz avec filtres, dans la banque choisie
+        bank_id = current_bank_id(data)
+        user_id = current_user_id()
+        wait_for_writes(user_id)
+        question_ids = generate_quiz_questions(user_id, selected_themes, num_questions, question_filters,
+                                               search_query, balance, weighting, random.Random(seed), bank_id)
         
-        if not questions:
+        if not question_ids:
             return jsonify({'error': 'Pas de questions disponibles pour ces thèmes et filtres'}), 400
         
         # Créer une session de quiz
         quiz_session = SessionQuiz(
+            user_id=user_id,
+            bank_id=bank_id,
             score=0,
             param_quiz=json.dumps({
+                'bank': data.get('bank'),
                 'themes': selected_themes,
                 'num_questions': num_questions,
                 'show_answers': show_answers,
                 'question_filters': question_filters,
-                'total_questions': len(questions)
+                'search': search_query,
+                'balance': balance,
+                'weighting': weighting,
+                'seed': seed,
+                'total_questions': len(question_ids)
             })
         )
         db.session.add(quiz_session)
         db.session.commit()
         
-        # Stocker les IDs des questions en session
-        session['quiz_session_id'] = quiz_session.id_session
-        session['quiz_questions'] = [q.id for q in questions]
-        session['quiz_config'] = {
+        # Stocker les IDs des questions côté serveur ; le cookie ne garde que l'ID du quiz
+        get_quiz_state_store().create(quiz_session.id_session, question_ids, {
             'show_answers': show_answers,
-            'total_questions': len(questions)
-        }
+            'total_questions': len(question_ids)
+        })
+        session['quiz_session_id'] = quiz_session.id_session
         
         return jsonify({
             'session_id': quiz_session.id_session,
             'redirect_url': url_for('quiz_page', session_id=quiz_session.id_session)
         }), 200
 
-@app.route('/quiz/config/questions-count', methods=['POST'])
+@app.route('/quiz/config/questions-count', methods=['GET', 'POST'])
+@read_only
 def get_questions_count():
     """Obtenir le nombre de questions disponibles pour les thèmes sélectionnés"""
-    data = request.get_json()
-    selected_themes = data.get('themes', [])
-    question_filters = data.get('question_filters', ['new', 'answered', 'incorrect'])
+    if request.method == 'GET':
+        bank_id = current_bank_id()
+        selected_themes = request.args.getlist('themes')
+        # Même défaut qu'en POST : une requête sans filtre compte la même chose par les deux méthodes
+        question_filters = request.args.getlist('question_filters') or DEFAULT_QUESTION_FILTERS
+        search_query = request.args.get('search', '').strip()
+    else:
+        data = request.get_json()
+        bank_id = current_bank_id(data)
+        selected_themes = data.get('themes', [])
+        question_filters = data.get('question_filters', DEFAULT_QUESTION_FILTERS)
+        search_query = (data.get('search') or '').strip()
     
     if not selected_themes:
         return jsonify({'count': 0}), 200
     
-    # Compter les questions selon les filtres
-    from sqlalchemy.sql.expression import func
-    
-    # Récupérer les IDs des questions répondues correctement et incorrectement
-    answered_correct = db.session.query(SessionAnswer.question_id).filter(
-        SessionAnswer.is_correct == True
-    ).all()
-    answered_correct = [q[0] for q in answered_correct]
-    
-    answered_incorrect = db.session.query(SessionAnswer.question_id).filter(
-        SessionAnswer.is_correct == False
-    ).all()
-    answered_incorrect = [q[0] for q in answered_incorrect]
-    
-    # Récupérer les IDs de toutes les questions répondues
-    answered_any = db.session.query(SessionAnswer.question_id).all()
-    answered_any = [q[0] for q in answered_any]
-    
-    # Construire la requête de base
-    query = Questions.query.filter(Questions.theme.in_(selected_themes))
-    
-    # Appliquer les filtres
-    filtered_questions = []
-    
-    if 'new' in question_filters:
-        # Questions non répondues
-        new_questions = query.filter(~Questions.id.in_(answered_any)).all()
-        filtered_questions.extend(new_questions)
-    
-    if 'answered' in question_filters:
-        # Questions répondues correctement
-        answered_q = query.filter(Questions.id.in_(answered_correct)).all()
-        filtered_questions.extend(answered_q)
-    
-    if 'incorrect' in question_filters:
-        # Questions répondues incorrectement
-        incorrect_q = query.filter(Questions.id.in_(answered_incorrect)).all()
-        filtered_questions.extend(incorrect_q)
-    
-    # Supprimer les doublons
-    unique_ids = set()
-    unique_questions = []
-    for q in filtered_questions:
-        if q.id not in unique_ids:
-            unique_ids.add(q.id)
-            unique_questions.append(q)
-    
-    count = len(unique_questions)
-    
-    return jsonify({'count': count}), 200
+    # Le résultat ne dépend que de la version du cache et des paramètres :
+    # un ETag permet de répondre 304 aux bascules répétées des cases à cocher
+    user_id = current_user_id()
+    wait_for_writes(user_id)
+    bank = get_bank(user_id, bank_id)
+    count = None
+    if 'due' in question_filters or search_query:
+        # Les questions à réviser dépendent de l'heure et une recherche passe par
+        # l'index plein texte : compter à chaque appel, en combinant les masques
+        count = eligible_mask(user_id, bank, selected_themes, question_filters, search_query).bit_count()
+    etag = hashlib.sha1(repr((
+        bank.version, sorted(set(selected_themes)), filter_statuses(question_filters), search_query, count
+    )).encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        # Compter les questions selon les filtres à partir des compteurs précalculés
+        if count is None:
+            count = bank.count(selected_themes, question_filters)
+        response = jsonify({'count': count})
+    response.set_etag(etag)
+    # La version du cache inclut l'apprenant : réponse propre à chacun
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/search', methods=['GET'])
+@cached_response(params=('q', 'themes', 'page', 'per_page', 'bank'))
+def search():
+    """Rechercher des questions par mots-clés (résultats classés, surlignés et paginés)"""
+    query = request.args.get('q', '')
+    themes = request.args.getlist('themes')
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    return jsonify(search_questions(query, themes, page, per_page, current_bank_id())), 200
 
 @app.route('/quiz/<int:session_id>', methods=['GET'])
 def quiz_page(session_id):
     """Page principale du quiz"""
-    # Vérifier que la session existe
-    quiz_session = SessionQuiz.query.get_or_404(session_id)
+    # Vérifier que la session existe et appartient à l'apprenant
+    quiz_session = get_user_quiz_or_404(session_id)
     
     # Récupérer les paramètres du quiz
     params = json.loads(quiz_session.param_quiz) if quiz_session.param_quiz else {}
     
-    # Récupérer les questions de cette session
-    question_ids = session.get('quiz_questions', [])
-    if not question_ids:
+    # Récupérer les questions et la progression de ce quiz
+    progress = get_quiz_progress(session_id)
+    if progress is None or not progress.question_ids:
         return redirect(url_for('quiz_config'))
+    question_ids = progress.question_ids
     
-    # Récupérer les réponses depuis la session Flask (pas depuis la BD)
-    quiz_answers = session.get('quiz_answers', {})
-    answered_count = len(quiz_answers)
+    answered_count = progress.answered
     
     # Déterminer la question actuelle
     current_question_index = answered_count
@@ -235,39 +272,37 @@ def quiz_page(session_id):
     
     # Récupérer la question actuelle
     current_question_id = question_ids[current_question_index]
-    question = Questions.query.get_or_404(current_question_id)
+    question = get_question_or_404(current_question_id)
     
     return render_template('quiz/session.html',
                          session_id=session_id,
                          question=question,
                          question_number=current_question_index + 1,
                          total_questions=len(question_ids),
-                         show_answers=params.get('show_answers', 'end'))
+                         show_answers=params.get('show_answers', 'end'),
+                         prefetch_size=app.config.get('QUIZ_PREFETCH_SIZE', 10))
 
 @app.route('/quiz/<int:session_id>/answer', methods=['POST'])
 def submit_answer(session_id):
-    """Soumettre une réponse pour une question (stockée en session, pas en BD)"""
-    quiz_session = SessionQuiz.query.get_or_404(session_id)
+    """Soumettre une réponse pour une question (enregistrée en BD dès la soumission)"""
+    quiz_session = get_user_quiz_or_404(session_id)
     
     data = request.get_json()
     question_id = int(data.get('question_id'))
     user_answer = int(data.get('answer'))
     
     # Récupérer la question
-    question = Questions.query.get_or_404(question_id)
+    question = get_question_or_404(question_id)
     
     # Vérifier si la réponse est correcte
     is_correct = (user_answer == question.correct)
     
-    # Stocker la réponse en session Flask (pas en BD pour le moment)
-    if 'quiz_answers' not in session:
-        session['quiz_answers'] = {}
+    progress = get_quiz_state_store().get(session_id)
+    if progress is None:
+        return jsonify({'error': 'Quiz expiré ou introuvable'}), 404
     
-    session['quiz_answers'][str(question_id)] = {
-        'user_answer': user_answer,
-        'is_correct': is_correct
-    }
-    session.modified = True
+    # Une resoumission remplace la précédente
+    save_answers(quiz_session, progress, [(question_id, user_answer, is_correct)])
     
     response = {
         'is_correct': is_correct,
@@ -277,61 +312,162 @@ def submit_answer(session_id):
     
     return jsonify(response), 200
 
+# Nombre maximal de questions renvoyées par /quiz/<id>/questions
+MAX_PREFETCH_SIZE = 100
+
+@app.route('/quiz/<int:session_id>/questions', methods=['GET'])
+def quiz_questions(session_id):
+    """Questions suivantes du quiz en JSON, par lots (préchargement côté navigateur).
+
+    La bonne réponse et l'explication ne sont incluses que si elles sont
+    affichées au fil du quiz (show_answers='go').
+    """
+    get_user_quiz_or_404(session_id)
+    progress = get_quiz_progress(session_id)
+    if progress is None:
+        return jsonify({'error': 'Quiz expiré ou introuvable'}), 404
+    show_answers = progress.config.get('show_answers', 'end')
+    
+    # Par défaut, à partir de la première question sans réponse
+    start = max(0, request.args.get('start', progress.answered, type=int))
+    limit = request.args.get('limit', app.config.get('QUIZ_PREFETCH_SIZE', 10), type=int)
+    limit = min(max(1, limit), MAX_PREFETCH_SIZE)
+    question_ids = progress.question_ids[start:start + limit]
+    questions = get_questions(question_ids)
+    
+    batch = []
+    for number, question_id in enumerate(question_ids, start + 1):
+        question = questions.get(question_id)
+        if question is None:
+            continue
+        item = {
+            'id': question_id,
+            'number': number,
+            'text': question.text,
+            'options': question.options,
+            'theme': question.theme
+        }
+        if show_answers == 'go':
+            item['correct'] = question.correct
+            item['explanation'] = question.explanation
+        batch.append(item)
+    
+    return jsonify({
+        'total_questions': len(progress.question_ids),
+        'answered': progress.answered,
+        'show_answers': show_answers,
+        'questions': batch
+    }), 200
+
+@app.route('/quiz/<int:session_id>/answers', methods=['POST'])
+def submit_answers(session_id):
+    """Soumettre un lot de réponses en une requête : {'answers': [{'question_id', 'answer'}, ...]}"""
+    quiz_session = get_user_quiz_or_404(session_id)
+    progress = get_quiz_progress(session_id)
+    if progress is None:
+        return jsonify({'error': 'Quiz expiré ou introuvable'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        # Une resoumission dans le même lot remplace la précédente
+        submitted = {int(a['question_id']): int(a['answer']) for a in data.get('answers') or []}
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Réponses invalides'}), 400
+    if not submitted:
+        return jsonify({'error': 'Aucune réponse'}), 400
+    if not submitted.keys() <= set(progress.question_ids):
+        return jsonify({'error': 'Question absente de ce quiz'}), 400
+    
+    questions = get_questions(list(submitted))
+    answers = [(question_id, user_answer, user_answer == questions[question_id].correct)
+               for question_id, user_answer in submitted.items() if question_id in questions]
+    
+    # Toutes les réponses en une instruction, comme une soumission unitaire
+    answered = save_answers(quiz_session, progress, answers)
+    response = {
+        'answered': answered,
+        'total_questions': len(progress.question_ids),
+        'finished': answered >= len(progress.question_ids)
+    }
+    if progress.config.get('show_answers', 'end') == 'go':
+        response['results'] = [{
+            'question_id': question_id,
+            'is_correct': is_correct,
+            'correct_answer': questions[question_id].correct,
+            'explanation': questions[question_id].explanation
+        } for question_id, user_answer, is_correct in answers]
+    
+    return jsonify(response), 200
+
 @app.route('/quiz/<int:session_id>/results', methods=['GET'])
 def quiz_results(session_id):
-    """Afficher et enregistrer les résultats du quiz"""
-    quiz_session = SessionQuiz.query.get_or_404(session_id)
+    """Afficher les résultats du quiz et le finaliser (idempotent)"""
+    quiz_session = get_user_quiz_or_404(session_id)
+    user_id = quiz_session.user_id
     
     # Récupérer les paramètres du quiz
     params = json.loads(quiz_session.param_quiz) if quiz_session.param_quiz else {}
     
-    # Récupérer les réponses depuis la session Flask
-    quiz_answers = session.get('quiz_answers', {})
-    question_ids = session.get('quiz_questions', [])
-    
-    # Enregistrer toutes les réponses en BD maintenant
-    for question_id_str, answer_data in quiz_answers.items():
-        question_id = int(question_id_str)
-        session_answer = SessionAnswer(
-            session_id=session_id,
-            question_id=question_id,
-            user_answer=answer_data['user_answer'],
-            is_correct=answer_data['is_correct']
-        )
-        db.session.add(session_answer)
-    
-    db.session.commit()
+    # Écriture différée : les réponses du quiz doivent être commitées avant d'être relues
+    ingestor = get_ingestor()
+    if ingestor is not None:
+        ingestor.wait(session_id=session_id)
+    
+    # Réponses du quiz (déjà enregistrées à la soumission) et leurs questions, en une requête.
+    # Des lignes plutôt que des objets ORM : le commit ci-dessous ne les expire pas,
+    # donc aucune relecture réponse par réponse
+    rows = db.session.query(
+        SessionAnswer.id, SessionAnswer.question_id, SessionAnswer.user_answer, SessionAnswer.is_correct,
+        Questions.text, Questions.options, Questions.correct, Questions.explanation, Questions.theme
+    ).join(Questions, Questions.id == SessionAnswer.question_id) \
+     .filter(SessionAnswer.session_id == session_id) \
+     .order_by(SessionAnswer.id).all()
     
     # Calculer le score
-    correct_count = sum(1 for a in quiz_answers.values() if a['is_correct'])
-    total_count = len(quiz_answers)
+    correct_count = sum(1 for a in rows if a.is_correct)
+    total_count = len(rows)
     score_percentage = (correct_count / total_count * 100) if total_count > 0 else 0
-    
-    # Mettre à jour la session avec le score
-    quiz_session.score = score_percentage
-    db.session.commit()
+    results_by_theme = theme_results(rows)
+    duration = quiz_duration(quiz_session.created_at)
+    
+    # Finaliser une seule fois : la mise à jour conditionnelle sur stats_applied
+    # désigne la requête qui applique les statistiques, donc recharger la page
+    # (ou deux onglets concurrents) ne modifie rien. En écriture différée, la
+    # finalisation (et la suppression de l'état du quiz) est regroupée avec
+    # celles des autres quiz
+    if ingestor is not None:
+        ingestor.enqueue_finalize(session_id, user_id, score_percentage, results_by_theme, duration)
+    else:
+        first_finalization = db.session.query(SessionQuiz).filter(
+            SessionQuiz.id_session == session_id, SessionQuiz.stats_applied == False
+        ).update({
+            SessionQuiz.score: score_percentage,
+            SessionQuiz.theme_results: results_by_theme,
+            SessionQuiz.duration: db.func.coalesce(SessionQuiz.duration, duration),
+            SessionQuiz.stats_applied: True
+        }, synchronize_session=False)
+        if first_finalization:
+            stats_revision = update_question_stats(user_id, rows)
+            update_review_states(user_id, rows)
+            db.session.commit()
+            record_answers(user_id, rows, stats_revision)
+            get_quiz_state_store().delete(session_id)
+        else:
+            db.session.commit()  # Rechargement : statistiques déjà appliquées
     
     # Préparer les résultats détaillés
     results_detail = []
-    for question_id_str, answer_data in quiz_answers.items():
-        question_id = int(question_id_str)
-        question = Questions.query.get(question_id)
-        if question:
-            results_detail.append({
-                'question': question.text,
-                'user_answer': question.options[answer_data['user_answer']],
-                'correct_answer': question.options[question.correct],
-                'is_correct': answer_data['is_correct'],
-                'explanation': question.explanation,
-                'theme': question.theme
-            })
+    for row in rows:
+        results_detail.append({
+            'question': row.text,
+            'user_answer': row.options[row.user_answer],
+            'correct_answer': row.options[row.correct],
+            'is_correct': row.is_correct,
+            'explanation': row.explanation,
+            'theme': row.theme
+        })
     
-    # Nettoyer la session
-    if 'quiz_answers' in session:
-        del session['quiz_answers']
-    if 'quiz_questions' in session:
-        del session['quiz_questions']
-    session.modified = True
+    session.pop('quiz_session_id', None)
     
     return render_template('quiz/results.html',
                          session_id=session_id,
@@ -341,56 +477,90 @@ def quiz_results(session_id):
                          results=results_detail,
                          params=params)
 
-def generate_quiz_questions(themes, num_questions, question_filters=['new', 'answered', 'incorrect']):
-    """Générer une liste aléatoire de questions selon les thèmes et les filtres"""
-    from sqlalchemy.sql.expression import func
-    
-    # Récupérer les IDs des questions répondues correctement et incorrectement
-    answered_correct = db.session.query(SessionAnswer.question_id).filter(
-        SessionAnswer.is_correct == True
-    ).all()
-    answered_correct = [q[0] for q in answered_correct]
-    
-    answered_incorrect = db.session.query(SessionAnswer.question_id).filter(
-        SessionAnswer.is_correct == False
-    ).all()
-    answered_incorrect = [q[0] for q in answered_incorrect]
-    
-    # Récupérer les IDs de toutes les questions répondues
-    answered_any = db.session.query(SessionAnswer.question_id).all()
-    answered_any = [q[0] for q in answered_any]
-    
-    # Construire la requête de base
-    base_query = Questions.query.filter(Questions.theme.in_(themes))
-    
-    # Appliquer les filtres
-    filtered_questions = []
-    
-    if 'new' in question_filters:
-        # Questions non répondues
-        new_questions = base_query.filter(~Questions.id.in_(answered_any)).all()
-        filtered_questions.extend(new_questions)
-    
-    if 'answered' in question_filters:
-        # Questions répondues correctement
-        answered_q = base_query.filter(Questions.id.in_(answered_correct)).all()
-        filtered_questions.extend(answered_q)
-    
-    if 'incorrect' in question_filters:
-        # Questions répondues incorrectement
-        incorrect_q = base_query.filter(Questions.id.in_(answered_incorrect)).all()
-        filtered_questions.extend(incorrect_q)
-    
-    # Supprimer les doublons en gardant l'ordre aléatoire
-    unique_ids = set()
-    unique_questions = []
-    for q in filtered_questions:
-        if q.id not in unique_ids:
-            unique_ids.add(q.id)
-            unique_questions.append(q)
-    
-    # Mélanger et limiter
-    import random
-    random.shuffle(unique_questions)
-    
-    return unique_questions[:num_questions]
\ No newline at end of file
+def get_quiz_progress(session_id):
+    """Progression d'un quiz, réponses en attente d'écriture comprises (lecture de ses propres écritures)"""
+    store = get_quiz_state_store()
+    progress = store.get(session_id)
+    ingestor = get_ingestor()
+    if progress is not None and ingestor is not None:
+        pending = {question_id for question_id, _, _ in ingestor.pending_answers(session_id)}
+        if pending:
+            progress.answered += len(pending - store.answered_among(session_id, pending))
+    return progress
+
+def save_answers(quiz_session, progress, answers):
+    """Enregistrer des réponses (question_id, user_answer, is_correct), tout de suite ou via la file d'écriture.
+
+    Retourne le nombre de questions du quiz qui ont maintenant une réponse.
+    """
+    session_id = quiz_session.id_session
+    store = get_quiz_state_store()
+    ingestor = get_ingestor()
+    if ingestor is not None:
+        question_ids = {question_id for question_id, _, _ in answers}
+        pending = {question_id for question_id, _, _ in ingestor.pending_answers(session_id)}
+        added = question_ids - pending
+        added -= store.answered_among(session_id, added)
+        ingestor.enqueue_answers(session_id, quiz_session.user_id, answers)
+        return progress.answered + len(added)
+    upsert(SessionAnswer.__table__, [{
+        'session_id': quiz_session.id_session,
+        'user_id': quiz_session.user_id,
+        'question_id': question_id,
+        'user_answer': user_answer,
+        'is_correct': is_correct
+    } for question_id, user_answer, is_correct in answers],
+        ['session_id', 'question_id'], ['user_answer', 'is_correct'])
+    # Recompter après l'écriture, dans la même transaction
+    answered = store.add_answers(session_id, answers)
+    db.session.commit()
+    return answered
+
+def wait_for_writes(user_id):
+    """Attendre que les écritures différées de l'apprenant soient commitées avant de lire ses statistiques"""
+    ingestor = get_ingestor()
+    if ingestor is not None:
+        ingestor.wait(user_id=user_id)
+
+def get_user_quiz_or_404(session_id):
+    """Quiz de l'apprenant courant ; 404 s'il n'existe pas ou appartient à un autre apprenant"""
+    return SessionQuiz.query.filter_by(id_session=session_id, user_id=current_user_id()).first_or_404()
+
+def eligible_mask(user_id, bank, themes, question_filters, search_query=''):
+    """Masque des questions éligibles de la banque, filtre 'due' et recherche compris"""
+    bank_id = bank.bank.bank_id
+    mask = bank.select(themes, question_filters)
+    if 'due' in question_filters:
+        mask |= ids_mask(due_question_ids(user_id, themes, bank_id=bank_id))
+    if search_query:
+        mask &= ids_mask(search_question_ids(search_query, themes, bank_id))
+    return mask
+
+def generate_quiz_questions(user_id, themes, num_questions, question_filters=DEFAULT_QUESTION_FILTERS,
+                            search_query='', balance='none', weighting='uniform', rng=None,
+                            bank_id=DEFAULT_BANK_ID):
+    """Générer une liste aléatoire d'IDs de questions d'une banque selon les thèmes, les filtres et une recherche.
+
+    `balance` et `weighting` choisissent la répartition par thème et la
+    pondération du tirage, `rng` le générateur (graine du quiz) : voir app.sampling.
+    """
+    # Tirage dans les tableaux d'IDs en mémoire : aucune ligne Questions n'est chargée
+    bank = get_bank(user_id, bank_id)
+    options = {'balance': balance, 'weighting': weighting, 'theme_weights': app.config.get('EXAM_THEME_WEIGHTS')}
+    if 'due' not in question_filters and not search_query:
+        return bank.sample(themes, question_filters, num_questions, rng=rng, **options)
+
+    # Restreindre aux résultats de la recherche
+    within = ids_mask(search_question_ids(search_query, themes, bank_id)) if search_query else None
+
+    # Questions à réviser d'abord, les plus en retard en tête, puis complément
+    # tiré au hasard parmi les autres filtres
+    due_ids = []
+    if 'due' in question_filters:
+        if within is None:
+            due_ids = due_question_ids(user_id, themes, num_questions, bank_id=bank_id)
+        else:
+            due_ids = [i for i in due_question_ids(user_id, themes, bank_id=bank_id) if within >> i & 1]
+            due_ids = due_ids[:num_questions]
+    return due_ids + bank.sample(themes, question_filters, num_questions - len(due_ids), rng=rng,
+                                 exclude=ids_mask(due_ids), within=within, **options)
@@ -0,0 +1,169 @@
+"""Tirage des questions d'un quiz dans les index en mémoire de la banque (app.bank).
+
+Le tirage se fait directement dans les tableaux d'IDs triés de chaque thème
+(QuestionBank.theme_ids), sans énumérer la banque quand ce n'est pas
+nécessaire :
+
+- tirage uniforme : indices tirés au hasard dans les tableaux et rejetés
+  s'ils ne sont pas éligibles (statut, recherche, exclusion). Tant que les
+  questions éligibles sont assez nombreuses, le coût est O(N) pour N
+  questions ; sinon, les éligibles sont énumérées une fois ;
+- pondération par les erreurs ('errors') : chaque question éligible a un poids
+  égal à son taux d'erreur lissé (incorrectes + 1) / (réponses + 2), 0,5 pour
+  une question jamais répondue, et N questions sont tirées sans remise
+  proportionnellement à leur poids (clés u^(1/w) d'Efraimidis-Spirakis).
+  Le coût est proportionnel au nombre de questions déjà répondues ;
+- répartition par thème ('exam', 'even') : N est d'abord réparti entre les
+  thèmes sélectionnés (plus forts restes), selon les poids des domaines de
+  l'examen (Config.EXAM_THEME_WEIGHTS) ou à parts égales, puis chaque thème est
+  tiré séparément. Un thème qui n'a pas assez de questions éligibles cède le
+  reste de son quota aux autres.
+
+Le générateur est un random.Random initialisé par une graine : même graine,
+même banque et mêmes statuts de l'apprenant donnent le même quiz.
+"""
+import bisect
+import heapq
+import random
+
+from app.bank import iter_bits
+
+BALANCES = ('none', 'exam', 'even')
+WEIGHTINGS = ('uniform', 'errors')
+
+
+def allocate(weights, available, total):
+    """Répartir `total` questions entre des thèmes selon leurs poids, sans dépasser leurs disponibilités.
+
+    Méthode des plus forts restes, répétée tant qu'un thème plafonné libère
+    des questions à redistribuer. Retourne {thème: quota}.
+    """
+    quotas = {theme: 0 for theme in weights}
+    open_themes = [theme for theme in sorted(weights) if available.get(theme, 0) > 0]
+    remaining = min(total, sum(available.get(theme, 0) for theme in open_themes))
+    while remaining > 0 and open_themes:
+        weight_sum = sum(weights[theme] for theme in open_themes)
+        if weight_sum <= 0:
+            shares = {theme: remaining / len(open_themes) for theme in open_themes}
+        else:
+            shares = {theme: remaining * weights[theme] / weight_sum for theme in open_themes}
+        granted = {theme: int(share) for theme, share in shares.items()}
+        leftover = remaining - sum(granted.values())
+        for theme in sorted(open_themes, key=lambda t: (granted[t] - shares[t], t))[:leftover]:
+            granted[theme] += 1
+        for theme in open_themes:
+            granted[theme] = min(granted[theme], available[theme] - quotas[theme])
+            quotas[theme] += granted[theme]
+        remaining -= sum(granted.values())
+        open_themes = [theme for theme in open_themes if quotas[theme] < available[theme]]
+    return quotas
+
+
+class _Stratum:
+    """Tableaux d'IDs de plusieurs thèmes vus comme un seul tableau indexable, avec leur masque"""
+
+    def __init__(self, arrays, mask):
+        self.arrays = [ids for ids in arrays if len(ids)]
+        self.mask = mask
+        self.starts = []
+        self.size = 0
+        for ids in self.arrays:
+            self.starts.append(self.size)
+            self.size += len(ids)
+
+    def __getitem__(self, index):
+        k = bisect.bisect_right(self.starts, index) - 1
+        return self.arrays[k][index - self.starts[k]]
+
+
+def _draw_uniform(rng, stratum, eligible, k):
+    """Tirer k IDs distincts parmi les éligibles d'une strate"""
+    eligible &= stratum.mask
+    eligible_count = eligible.bit_count()
+    k = min(k, eligible_count)
+    if k <= 0:
+        return []
+    # Rejet tant que les éligibles sont nombreux : quelques essais par question tirée
+    if eligible_count >= 4 * k and eligible_count * 8 >= stratum.size:
+        picked = set()
+        while len(picked) < k:
+            question_id = stratum[rng.randrange(stratum.size)]
+            if eligible >> question_id & 1:
+                picked.add(question_id)
+        return sorted(picked)
+    return rng.sample(list(iter_bits(eligible)), k)
+
+
+def _draw_weighted(rng, stratum, eligible, k, learner):
+    """Tirer k IDs distincts, avec une probabilité proportionnelle au taux d'erreur lissé.
+
+    Seules les questions déjà répondues ont un poids propre et reçoivent
+    chacune une clé. Les questions jamais répondues ont toutes le poids 0,5 :
+    les plus grandes de leurs clés sont engendrées directement (statistiques
+    d'ordre de m uniformes), puis autant de questions nouvelles sont tirées
+    uniformément. Le coût ne dépend que du nombre de questions répondues et de k.
+    """
+    eligible &= stratum.mask
+    if k <= 0 or not eligible:
+        return []
+    keys = []
+    for question_id in iter_bits(eligible & learner.answered_mask):
+        attempts, incorrect = learner.error_counts.get(question_id, (0, 0))
+        keys.append((rng.random() ** ((attempts + 2) / (incorrect + 1)), question_id))
+
+    new = eligible & ~learner.answered_mask
+    m = new.bit_count()
+    top = 1.0
+    for i in range(min(k, m)):
+        top *= rng.random() ** (1 / (m - i))  # i-ème plus grande de m uniformes
+        keys.append((top ** 2, None))  # Clé u^(1/w) pour w = 0,5
+
+    chosen = heapq.nlargest(k, keys)
+    selected = [question_id for _, question_id in chosen if question_id is not None]
+    return selected + _draw_uniform(rng, stratum, new, len(chosen) - len(selected))
+
+
+def sample_questions(learner, themes, question_filters, num_questions, balance='none', weighting='uniform',
+                     rng=None, exclude=0, within=None, theme_weights=None):
+    """Tirer jusqu'à `num_questions` IDs éligibles pour un apprenant (LearnerBank).
+
+    `exclude` retire des questions du tirage ; `within`, s'il est donné, le
+    restreint (résultats d'une recherche par exemple). `theme_weights` donne
+    les poids des thèmes pour balance='exam' (1 pour un thème absent).
+    """
+    if balance not in BALANCES:
+        raise ValueError(f"Répartition inconnue : {balance}")
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"Pondération inconnue : {weighting}")
+    rng = rng or random
+    bank = learner.bank
+    themes = sorted(set(themes) & bank.theme_masks.keys())
+    eligible = learner.select(themes, question_filters) & ~exclude
+    if within is not None:
+        eligible &= within
+    if num_questions <= 0 or not eligible:
+        return []
+
+    if balance == 'none':
+        quotas = {None: num_questions}
+        union = 0
+        for theme in themes:
+            union |= bank.theme_masks[theme]
+        strata = {None: _Stratum([bank.theme_ids[theme] for theme in themes], union)}
+    else:
+        counts = {theme: (bank.theme_masks[theme] & eligible).bit_count() for theme in themes}
+        if balance == 'exam':
+            weights = {theme: (theme_weights or {}).get(theme, 1) for theme in themes}
+        else:
+            weights = {theme: 1 for theme in themes}
+        quotas = allocate(weights, counts, num_questions)
+        strata = {theme: _Stratum([bank.theme_ids[theme]], bank.theme_masks[theme]) for theme in themes}
+
+    selected = []
+    for key in sorted(quotas, key=lambda t: t or ''):
+        if weighting == 'errors':
+            selected += _draw_weighted(rng, strata[key], eligible, quotas[key], learner)
+        else:
+            selected += _draw_uniform(rng, strata[key], eligible, quotas[key])
+    rng.shuffle(selected)
+    return selected
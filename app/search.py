@@ -0,0 +1,391 @@
+"""Recherche plein texte dans les questions (énoncé, options, explication).
+
+Deux implémentations, choisies par SEARCH_BACKEND ('auto' par défaut) :
+
+- 'fts'    : table virtuelle SQLite FTS5 questions_fts (rowid = ID de la
+             question), classement BM25 et surlignage par SQLite ;
+- 'memory' : index inversé en mémoire avec le même classement BM25, pour les
+             bases sans FTS5 (PostgreSQL, SQLite compilé sans FTS5).
+
+L'index est synchronisé par Questions.updated_at : les questions modifiées
+depuis la dernière synchronisation sont réindexées. La synchronisation est
+lancée par l'importeur et, à défaut, à la première recherche qui voit une
+nouvelle version de la banque.
+
+Un seul index couvre toutes les banques de questions (app.banks) : une
+recherche est restreinte à une banque comme à des thèmes, par un filtre.
+"""
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from flask import current_app
+from markupsafe import escape
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Questions
+from app.meta import get_meta, set_meta
+
+FTS_TABLE = 'questions_fts'
+FTS_WATERMARK = 'search_watermark'  # updated_at le plus récent indexé (µs depuis l'epoch)
+
+# Poids de l'énoncé, des options et de l'explication dans le score BM25
+FIELD_WEIGHTS = (10.0, 4.0, 1.0)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MAX_PER_PAGE = 100
+SNIPPET_TOKENS = 20
+
+# Délimiteurs de surlignage, remplacés par <mark> après échappement HTML
+MARK_START, MARK_END = '\x02', '\x03'
+
+WORD = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=65536)
+def normalize(word):
+    """Minuscules sans accents, comme le tokenizer unicode61 remove_diacritics 2"""
+    decomposed = unicodedata.normalize('NFKD', word.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def query_terms(query):
+    """Termes normalisés d'une recherche, sans doublons, dans l'ordre"""
+    return list(dict.fromkeys(normalize(w) for w in WORD.findall(query or '')))
+
+
+def to_html(marked):
+    """Échapper un texte surligné par les délimiteurs et les convertir en <mark>"""
+    return str(escape(marked)).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def _question_fields(options, explanation):
+    """Options (une par ligne) et explication telles qu'indexées"""
+    return '\n'.join(options or []), explanation or ''
+
+
+def _to_micros(value):
+    if value is None:
+        return 0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1_000_000)
+
+
+def _from_micros(value):
+    return datetime.fromtimestamp(value / 1_000_000, timezone.utc)
+
+
+def _changed_questions(watermark):
+    """Questions modifiées depuis le repère (toutes si le repère est 0).
+
+    La borne est incluse : une question écrite dans la même microseconde que le
+    repère est réindexée, ce qui est sans effet.
+    """
+    query = db.session.query(
+        Questions.id, Questions.text, Questions.options, Questions.explanation,
+        Questions.bank_id, Questions.theme, Questions.updated_at
+    )
+    if watermark:
+        query = query.filter(Questions.updated_at >= _from_micros(watermark))
+    return query.order_by(Questions.id).execution_options(yield_per=1000)
+
+
+class FTSSearchIndex:
+    """Recherche servie par la table FTS5 questions_fts"""
+
+    def __init__(self):
+        self._synced_version = None
+        self._lock = threading.Lock()
+
+    def sync(self, bank_version=None):
+        from app.bank import bank_version as current_bank_version
+
+        bank_version = bank_version or current_bank_version()
+        if bank_version == self._synced_version:
+            return
+        with self._lock:
+            if bank_version == self._synced_version:
+                return
+            watermark = get_meta(FTS_WATERMARK)
+            indexed = db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+            if indexed > bank_version[0]:
+                # Des questions ont disparu : tout réindexer
+                db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+                watermark = 0
+            rows = []
+            for question_id, q_text, options, explanation, _, _, updated_at in _changed_questions(watermark):
+                options_text, explanation = _question_fields(options, explanation)
+                rows.append({'id': question_id, 'text': q_text, 'options': options_text,
+                             'explanation': explanation})
+                watermark = max(watermark, _to_micros(updated_at))
+            if rows:
+                ids = [{'id': row['id']} for row in rows]
+                db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), ids)
+                db.session.execute(text(
+                    f"INSERT INTO {FTS_TABLE} (rowid, text, options, explanation) "
+                    "VALUES (:id, :text, :options, :explanation)"
+                ), rows)
+            set_meta(FTS_WATERMARK, watermark)
+            db.session.commit()
+            self._synced_version = bank_version
+
+    @staticmethod
+    def _match(terms):
+        # Les termes ne contiennent que des caractères \w : les guillemets suffisent
+        return ' '.join(f'"{term}"' for term in terms)
+
+    @staticmethod
+    def _theme_filter(themes, bank_id, params):
+        where = ''
+        if bank_id is not None:
+            params['bank_id'] = bank_id
+            where = " AND q.bank_id = :bank_id"
+        if not themes:
+            return where
+        names = []
+        for i, theme in enumerate(themes):
+            params[f'theme{i}'] = theme
+            names.append(f':theme{i}')
+        return where + f" AND q.theme IN ({', '.join(names)})"
+
+    def search(self, terms, themes, limit, offset, bank_id=None):
+        params = {'match': self._match(terms), 'limit': limit, 'offset': offset,
+                  'start': MARK_START, 'end': MARK_END, 'ellipsis': '…', 'tokens': SNIPPET_TOKENS}
+        where = f"{FTS_TABLE} MATCH :match" + self._theme_filter(themes, bank_id, params)
+        total = db.session.execute(text(
+            f"SELECT count(*) FROM {FTS_TABLE} JOIN questions q ON q.id = {FTS_TABLE}.rowid WHERE {where}"
+        ), params).scalar()
+        rows = db.session.execute(text(
+            f"SELECT {FTS_TABLE}.rowid, q.theme, "
+            f"bm25({FTS_TABLE}, {', '.join(map(str, FIELD_WEIGHTS))}) AS rank, "
+            f"highlight({FTS_TABLE}, 0, :start, :end), "
+            f"snippet({FTS_TABLE}, 2, :start, :end, :ellipsis, :tokens) "
+            f"FROM {FTS_TABLE} JOIN questions q ON q.id = {FTS_TABLE}.rowid "
+            f"WHERE {where} ORDER BY rank LIMIT :limit OFFSET :offset"
+        ), params).all()
+        # bm25() est négatif (plus petit = plus pertinent)
+        return total, [(question_id, theme, -rank, marked_text, marked_explanation)
+                       for question_id, theme, rank, marked_text, marked_explanation in rows]
+
+    def matching_ids(self, terms, themes, bank_id=None):
+        params = {'match': self._match(terms)}
+        where = f"{FTS_TABLE} MATCH :match" + self._theme_filter(themes, bank_id, params)
+        return [question_id for (question_id,) in db.session.execute(text(
+            f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} JOIN questions q ON q.id = {FTS_TABLE}.rowid WHERE {where}"
+        ), params)]
+
+
+def _mark(source, terms):
+    """Surligner dans `source` les mots dont la forme normalisée est un des termes"""
+    parts = []
+    position = 0
+    for match in WORD.finditer(source):
+        if normalize(match.group()) in terms:
+            parts.append(source[position:match.start()])
+            parts.append(MARK_START + match.group() + MARK_END)
+            position = match.end()
+    parts.append(source[position:])
+    return ''.join(parts)
+
+
+def _snippet(source, terms):
+    """Extrait d'environ SNIPPET_TOKENS mots autour du premier terme trouvé"""
+    words = list(WORD.finditer(source))
+    first = next((i for i, m in enumerate(words) if normalize(m.group()) in terms), 0)
+    if len(words) <= SNIPPET_TOKENS:
+        return _mark(source, terms)
+    start = max(0, min(first - SNIPPET_TOKENS // 4, len(words) - SNIPPET_TOKENS))
+    end = start + SNIPPET_TOKENS
+    begin = words[start].start() if start else 0
+    finish = words[end - 1].end() if end < len(words) else len(source)
+    return ('…' if start else '') + _mark(source[begin:finish], terms) + ('…' if end < len(words) else '')
+
+
+class MemorySearchIndex:
+    """Index inversé en mémoire : terme -> {ID de question: fréquence pondérée}"""
+
+    def __init__(self):
+        self._synced_version = None
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._watermark = 0
+        self.postings = {}
+        self.documents = {}  # ID -> (thème, énoncé, options, explication, termes, longueur, banque)
+        self.total_length = 0
+
+    def _remove(self, question_id):
+        document = self.documents.pop(question_id, None)
+        if document is None:
+            return
+        for term in document[4]:
+            postings = self.postings[term]
+            del postings[question_id]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= document[5]
+
+    def _add(self, question_id, bank_id, theme, q_text, options_text, explanation):
+        frequencies = Counter()
+        for weight, field in zip(FIELD_WEIGHTS, (q_text, options_text, explanation)):
+            for word in WORD.findall(field):
+                frequencies[normalize(word)] += weight
+        length = sum(frequencies.values())
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[question_id] = frequency
+        self.documents[question_id] = (theme, q_text, options_text, explanation, tuple(frequencies), length,
+                                       bank_id)
+        self.total_length += length
+
+    def sync(self, bank_version=None):
+        from app.bank import bank_version as current_bank_version
+
+        bank_version = bank_version or current_bank_version()
+        if bank_version == self._synced_version:
+            return
+        with self._lock:
+            if bank_version == self._synced_version:
+                return
+            watermark = self._watermark
+            if len(self.documents) > bank_version[0]:
+                # Des questions ont disparu : tout réindexer
+                self._clear()
+                watermark = 0
+            for question_id, q_text, options, explanation, bank_id, theme, updated_at in _changed_questions(watermark):
+                options_text, explanation = _question_fields(options, explanation)
+                self._remove(question_id)
+                self._add(question_id, bank_id, theme, q_text, options_text, explanation)
+                watermark = max(watermark, _to_micros(updated_at))
+            self._watermark = watermark
+            self._synced_version = bank_version
+
+    def _scores(self, terms, themes, bank_id=None):
+        """Scores BM25 des documents contenant tous les termes"""
+        postings = [self.postings.get(term, {}) for term in terms]
+        if not postings or not all(postings):
+            return {}
+        candidates = set(min(postings, key=len))
+        for term_postings in postings:
+            candidates.intersection_update(term_postings)
+        if bank_id is not None:
+            candidates = {i for i in candidates if self.documents[i][6] == bank_id}
+        if themes:
+            themes = set(themes)
+            candidates = {i for i in candidates if self.documents[i][0] in themes}
+
+        count = len(self.documents)
+        average = self.total_length / count if count else 0
+        scores = {}
+        for question_id in candidates:
+            length = self.documents[question_id][5]
+            score = 0.0
+            for term_postings in postings:
+                frequency = term_postings[question_id]
+                idf = math.log(1 + (count - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                score += idf * frequency * (BM25_K1 + 1) / (
+                    frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average))
+            scores[question_id] = score
+        return scores
+
+    def search(self, terms, themes, limit, offset, bank_id=None):
+        scores = self._scores(terms, themes, bank_id)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[offset:offset + limit]
+        term_set = set(terms)
+        results = []
+        for question_id, score in ranked:
+            theme, q_text, _, explanation, _, _, _ = self.documents[question_id]
+            results.append((question_id, theme, score, _mark(q_text, term_set), _snippet(explanation, term_set)))
+        return len(scores), results
+
+    def matching_ids(self, terms, themes, bank_id=None):
+        return list(self._scores(terms, themes, bank_id))
+
+
+def fts_available():
+    """La table FTS5 existe-t-elle dans la base courante ?"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    return db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': FTS_TABLE}).first() is not None
+
+
+def create_fts_table():
+    """Créer la table FTS5 si SQLite le permet ; retourne False sinon"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "text, options, explanation, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+    except OperationalError:
+        # SQLite compilé sans FTS5 : l'index en mémoire prendra le relais
+        db.session.rollback()
+        return False
+    return True
+
+
+def get_search_index():
+    """Retourner l'index de recherche de l'application courante (créé au premier appel)"""
+    index = current_app.extensions.get('search')
+    if index is None:
+        backend = current_app.config.get('SEARCH_BACKEND', 'auto')
+        if backend == 'auto':
+            backend = 'fts' if fts_available() else 'memory'
+        if backend == 'fts':
+            index = FTSSearchIndex()
+        elif backend == 'memory':
+            index = MemorySearchIndex()
+        else:
+            raise ValueError(f"SEARCH_BACKEND inconnu : {backend}")
+        current_app.extensions['search'] = index
+    return index
+
+
+def search_questions(query, themes=None, page=1, per_page=20, bank_id=None):
+    """Rechercher des questions (d'une banque, ou de toutes) : résultats classés par BM25, surlignés et paginés"""
+    terms = query_terms(query)
+    page = max(1, page)
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    if not terms:
+        return {'query': query, 'total': 0, 'page': page, 'per_page': per_page, 'results': []}
+
+    index = get_search_index()
+    index.sync()
+    total, rows = index.search(terms, themes, per_page, (page - 1) * per_page, bank_id)
+    return {
+        'query': query,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'results': [
+            {
+                'id': question_id,
+                'theme': theme,
+                'score': round(score, 4),
+                'text': to_html(marked_text),
+                'explanation': to_html(marked_explanation),
+            }
+            for question_id, theme, score, marked_text, marked_explanation in rows
+        ],
+    }
+
+
+def search_question_ids(query, themes=None, bank_id=None):
+    """IDs de toutes les questions correspondant à la recherche (pour créer un quiz)"""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    index = get_search_index()
+    index.sync()
+    return index.matching_ids(terms, themes, bank_id)
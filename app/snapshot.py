@@ -0,0 +1,279 @@
+"""Instantané binaire de la banque de questions, lu par mmap.
+
+Format (entiers little-endian) :
+
+    en-tête   : magic (8 octets) | nombre de questions (u32) | ID max (u32)
+                | version de la banque (u32 longueur + JSON)
+                | plages d'IDs par banque (u32 longueur + JSON {bank_id: [min, max]})
+    index     : (ID max + 1) offsets u64, un par ID, 0 si l'ID n'existe pas
+    questions : bonne réponse (i32), banque (u32) puis thème, énoncé, options
+                (JSON) et explication, chacun préfixé par sa longueur (u32)
+
+Une lecture par ID est un accès direct dans l'index puis un découpage de
+memoryview : aucune requête SQL ni aucun objet ORM. Les textes ne sont décodés
+qu'au premier accès à l'attribut correspondant. Le chargement d'une banque
+(iter_themes) ne parcourt que la plage d'IDs de cette banque.
+"""
+import json
+import mmap
+import os
+import struct
+from functools import cached_property
+
+from flask import abort, current_app
+
+from app import db
+from app.models import Questions
+
+MAGIC = b'CQSNAP02'
+HEADER = struct.Struct('<8sII')
+U32 = struct.Struct('<I')
+I32 = struct.Struct('<i')
+OFFSET = struct.Struct('<Q')
+BANK_AND_LENGTH = struct.Struct('<II')  # Banque d'une question et longueur de son thème
+
+
+def encode_version(bank_version):
+    """Sérialiser la version de la banque (nombre de questions, dernier updated_at)"""
+    count, updated_at = bank_version
+    return json.dumps([count, updated_at.isoformat() if updated_at else None])
+
+
+def write_snapshot(path, rows, bank_version):
+    """Écrire l'instantané à partir de dicts (id, bank_id, text, options, correct, explanation, theme).
+
+    Le fichier est écrit à côté puis renommé : un lecteur ne voit jamais un
+    instantané partiel.
+    """
+    records = []
+    max_id = 0
+    ranges = {}
+    for row in rows:
+        blobs = [
+            row['theme'].encode('utf-8'),
+            row['text'].encode('utf-8'),
+            json.dumps(row['options'], ensure_ascii=False).encode('utf-8'),
+            (row['explanation'] or '').encode('utf-8'),
+        ]
+        record = I32.pack(row['correct']) + U32.pack(row['bank_id']) + \
+            b''.join(U32.pack(len(b)) + b for b in blobs)
+        records.append((row['id'], record))
+        max_id = max(max_id, row['id'])
+        low, high = ranges.get(row['bank_id'], (row['id'], row['id']))
+        ranges[row['bank_id']] = (min(low, row['id']), max(high, row['id']))
+
+    version = encode_version(bank_version).encode('utf-8')
+    bank_ranges = json.dumps({str(bank_id): list(bounds) for bank_id, bounds in ranges.items()}).encode('utf-8')
+    index_pos = HEADER.size + U32.size + len(version) + U32.size + len(bank_ranges)
+    offsets = [0] * (max_id + 1)
+    position = index_pos + OFFSET.size * (max_id + 1)
+    for question_id, record in records:
+        offsets[question_id] = position
+        position += len(record)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records), max_id))
+        f.write(U32.pack(len(version)) + version)
+        f.write(U32.pack(len(bank_ranges)) + bank_ranges)
+        f.write(struct.pack(f'<{max_id + 1}Q', *offsets))
+        for _, record in records:
+            f.write(record)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def build_from_db(path):
+    """Compiler l'instantané depuis la table questions (à appeler dans un app context)"""
+    from app.bank import bank_version
+
+    rows = (
+        {'id': q_id, 'bank_id': bank_id, 'text': text, 'options': options, 'correct': correct,
+         'explanation': explanation, 'theme': theme}
+        for q_id, bank_id, text, options, correct, explanation, theme in db.session.query(
+            Questions.id, Questions.bank_id, Questions.text, Questions.options, Questions.correct,
+            Questions.explanation, Questions.theme
+        ).order_by(Questions.id).execution_options(yield_per=1000)
+    )
+    return write_snapshot(path, rows, bank_version())
+
+
+class SnapshotQuestion:
+    """Question lue dans l'instantané, avec les mêmes attributs que Questions"""
+
+    def __init__(self, question_id, bank_id, correct, blobs):
+        self.id = question_id
+        self.bank_id = bank_id
+        self.correct = correct
+        self._blobs = blobs
+
+    @cached_property
+    def theme(self):
+        return str(self._blobs[0], 'utf-8')
+
+    @cached_property
+    def text(self):
+        return str(self._blobs[1], 'utf-8')
+
+    @cached_property
+    def options(self):
+        return json.loads(str(self._blobs[2], 'utf-8'))
+
+    @cached_property
+    def explanation(self):
+        return str(self._blobs[3], 'utf-8')
+
+    def __repr__(self):
+        return f"<SnapshotQuestion id={self.id}>"
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        magic, self.count, self.max_id = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} n'est pas un instantané de questions")
+        (version_len,) = U32.unpack_from(self._mm, HEADER.size)
+        version_pos = HEADER.size + U32.size
+        self.version = str(self._view[version_pos:version_pos + version_len], 'utf-8')
+        ranges_pos = version_pos + version_len
+        (ranges_len,) = U32.unpack_from(self._mm, ranges_pos)
+        ranges_pos += U32.size
+        self.bank_ranges = {
+            int(bank_id): tuple(bounds)
+            for bank_id, bounds in json.loads(str(self._view[ranges_pos:ranges_pos + ranges_len], 'utf-8')).items()
+        }
+        self._index_pos = ranges_pos + ranges_len
+
+    def get(self, question_id):
+        if not 0 < question_id <= self.max_id:
+            return None
+        (offset,) = OFFSET.unpack_from(self._mm, self._index_pos + OFFSET.size * question_id)
+        if offset == 0:
+            return None
+        (correct,) = I32.unpack_from(self._mm, offset)
+        (bank_id,) = U32.unpack_from(self._mm, offset + I32.size)
+        position = offset + I32.size + U32.size
+        blobs = []
+        for _ in range(4):
+            (length,) = U32.unpack_from(self._mm, position)
+            position += U32.size
+            blobs.append(self._view[position:position + length])
+            position += length
+        return SnapshotQuestion(question_id, bank_id, correct, blobs)
+
+    def iter_themes(self, bank_id):
+        """Énumérer les (id, thème) des questions d'une banque, pour construire son cache"""
+        if bank_id not in self.bank_ranges:
+            return
+        low, high = self.bank_ranges[bank_id]
+        for question_id in range(low, high + 1):
+            (offset,) = OFFSET.unpack_from(self._mm, self._index_pos + OFFSET.size * question_id)
+            if offset:
+                (question_bank_id, length) = BANK_AND_LENGTH.unpack_from(self._mm, offset + I32.size)
+                if question_bank_id == bank_id:
+                    position = offset + I32.size + BANK_AND_LENGTH.size
+                    yield question_id, str(self._view[position:position + length], 'utf-8')
+
+
+_snapshot = None
+_snapshot_opened = False
+_stale_version = None  # (version de la base, mtime du fichier) pour lesquels l'instantané est périmé
+
+
+def snapshot_path(app):
+    path = app.config.get('QUESTION_SNAPSHOT')
+    if path is None:
+        path = os.path.join(app.instance_path, 'questions.snap')
+    return path
+
+
+def _open_snapshot():
+    path = snapshot_path(current_app)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return Snapshot(path)
+    except ValueError:
+        # Format d'une version précédente : à recompiler (build_snapshot.py)
+        current_app.logger.warning("Instantané %s illisible, lecture depuis la base", path)
+        return None
+
+
+def get_snapshot():
+    """Retourner l'instantané s'il existe et correspond à la base, None sinon.
+
+    Le fichier n'est ouvert qu'une fois par processus, mais sa version est
+    comparée à celle de la base (bank_version) à chaque appel : un import fait
+    par un autre processus ne laisse jamais noter ni afficher une question
+    d'après un instantané périmé. Le fichier est rouvert si sa version ne
+    correspond plus et qu'il a été recompilé entre-temps.
+    """
+    global _snapshot, _snapshot_opened, _stale_version
+    from app.bank import bank_version
+
+    if not _snapshot_opened:
+        _snapshot = _open_snapshot()
+        _snapshot_opened = True
+    if _snapshot is None:
+        return None
+
+    version = encode_version(bank_version())
+    if _snapshot.version == version:
+        return _snapshot
+    path = snapshot_path(current_app)
+    try:
+        stale = (version, os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+    if stale != _stale_version:
+        snapshot = _open_snapshot()
+        if snapshot is not None:
+            _snapshot = snapshot
+            if snapshot.version == version:
+                return snapshot
+        current_app.logger.warning("Instantané %s périmé, lecture depuis la base", path)
+        _stale_version = stale
+    return None
+
+
+def reset_snapshot():
+    """Oublier l'instantané ouvert (après un import ou une recompilation)"""
+    global _snapshot, _snapshot_opened, _stale_version
+    _snapshot = None
+    _snapshot_opened = False
+    _stale_version = None
+
+
+def get_question(question_id):
+    """Lire une question depuis l'instantané, ou depuis la base à défaut"""
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        question = snapshot.get(question_id)
+        if question is not None:
+            return question
+    return db.session.get(Questions, question_id)
+
+
+def get_questions(question_ids):
+    """Lire plusieurs questions (dict ID -> question) : instantané, puis une seule requête pour le reste"""
+    questions = {}
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        for question_id in question_ids:
+            question = snapshot.get(question_id)
+            if question is not None:
+                questions[question_id] = question
+    missing = [question_id for question_id in question_ids if question_id not in questions]
+    if missing:
+        questions.update((q.id, q) for q in Questions.query.filter(Questions.id.in_(missing)))
+    return questions
+
+
+def get_question_or_404(question_id):
+    question = get_question(question_id)
+    if question is None:
+        abort(404)
+    return question
@@ -0,0 +1,34 @@
+from app import db
+
+
+def _insert(table):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def upsert(table, rows, key_columns, update_columns):
+    """INSERT ... ON CONFLICT (clé) DO UPDATE, pour SQLite et PostgreSQL"""
+    if not rows:
+        return
+    stmt = _insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: stmt.excluded[column] for column in update_columns}
+    )
+    db.session.execute(stmt, rows)
+
+
+def upsert_add(table, rows, key_columns, add_columns):
+    """INSERT ... ON CONFLICT (clé) DO UPDATE SET colonne = colonne + valeur : compteurs incrémentés"""
+    if not rows:
+        return
+    stmt = _insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: table.c[column] + stmt.excluded[column] for column in add_columns}
+    )
+    db.session.execute(stmt, rows)
@@ -0,0 +1,70 @@
+"""Démarrage rapide (STARTUP_MODE='fast') et templates Jinja précompilés.
+
+En mode 'full' (par défaut), create_app() appelle db.create_all(), applique
+les migrations et vérifie question_stats à chaque démarrage. En mode 'fast',
+une seule requête lit la version du schéma : si elle est à jour, ces étapes
+sont sautées. Une base plus ancienne (ou vide) repasse par le chemin complet.
+Toute nouvelle table doit donc venir avec une migration (voir app.migrations).
+
+Les templates compilés par Jinja sont gardés en bytecode dans
+JINJA_BYTECODE_CACHE (instance/jinja_cache par défaut, une chaîne vide le
+désactive) : precompile.py les y écrit au build, et un démarrage à froid ne
+recompile plus les templates à leur premier rendu. Sur un système de fichiers
+en lecture seule (serverless), un template absent du cache est compilé en
+mémoire, sans erreur.
+"""
+import os
+
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app import db
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """Cache de bytecode Jinja tolérant un répertoire en lecture seule"""
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+def configure_templates(app):
+    """Brancher le cache de bytecode Jinja (avant le premier accès à app.jinja_env)"""
+    directory = app.config.get('JINJA_BYTECODE_CACHE')
+    if directory is None:
+        directory = os.path.join(app.instance_path, 'jinja_cache')
+    if not directory:
+        return
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            return
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': BytecodeCache(directory)}
+
+
+def precompile_templates(app):
+    """Compiler tous les templates dans le cache de bytecode ; retourne leur nombre"""
+    env = app.jinja_env
+    if env.bytecode_cache is None:
+        raise RuntimeError("JINJA_BYTECODE_CACHE n'est pas configuré")
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def schema_is_current():
+    """Vrai si la base a déjà toutes les migrations (une requête, sans create_all)"""
+    from app.migrations import LATEST_VERSION
+
+    try:
+        version = db.session.execute(text("SELECT max(version) FROM schema_migrations")).scalar()
+    except (OperationalError, ProgrammingError):  # Table absente : base neuve
+        db.session.rollback()
+        return False
+    return version == LATEST_VERSION
@@ -0,0 +1,211 @@
+from app import db
+from app.models import Questions, SessionQuiz, SessionAnswer, QuestionStats, ThemeStats
+from app.meta import bump_revision, stats_revision_key
+from app.sql import upsert_add
+from sqlalchemy import bindparam, func, case
+from datetime import datetime, timezone
+
+
+def update_question_stats(user_id, answers):
+    """Mettre à jour les question_stats d'un apprenant à partir de ses réponses déjà insérées.
+
+    Les réponses sont celles de quiz finalisés pour la première fois (l'appelant
+    a basculé SessionQuiz.stats_applied) : chacune compte une tentative. Les
+    réponses étant enregistrées à la soumission, un quiz finalisé après un
+    autre peut avoir des réponses plus anciennes : la dernière réponse (last_*)
+    reste celle de plus grand ID. Les écritures sont groupées en un UPDATE et un INSERT, quel que soit le
+    nombre de réponses ; les totaux par thème (theme_stats) sont incrémentés
+    d'autant, en une requête.
+
+    Retourne la nouvelle révision des statistiques de l'apprenant (voir app.bank).
+    """
+    answers = sorted((a for a in answers if a.id is not None), key=lambda a: a.id)
+    if not answers:
+        return None
+
+    question_ids = {a.question_id for a in answers}
+    current = {}
+    previous = {}  # question -> ((banque, thème), dernière réponse correcte) avant ces réponses
+    for (question_id, bank_id, theme, last_answer_id, last_user_answer, last_is_correct, attempts,
+         correct_count) in db.session.query(
+        QuestionStats.question_id, QuestionStats.bank_id, QuestionStats.theme, QuestionStats.last_answer_id,
+        QuestionStats.last_user_answer, QuestionStats.last_is_correct, QuestionStats.attempts,
+        QuestionStats.correct_count
+    ).filter(QuestionStats.user_id == user_id, QuestionStats.question_id.in_(question_ids)):
+        current[question_id] = {'b_user_id': user_id, 'b_id': question_id, 'last_answer_id': last_answer_id,
+                                'last_user_answer': last_user_answer, 'last_is_correct': bool(last_is_correct),
+                                'attempts': attempts, 'correct_count': correct_count}
+        previous[question_id] = ((bank_id, theme), bool(last_is_correct))
+
+    # Récupérer la banque et le thème des questions qui n'ont pas encore de statistiques
+    missing_ids = question_ids - current.keys()
+    themes = {}
+    if missing_ids:
+        themes = {
+            question_id: (bank_id, theme) for question_id, bank_id, theme in db.session.query(
+                Questions.id, Questions.bank_id, Questions.theme
+            ).filter(Questions.id.in_(missing_ids))
+        }
+
+    now = datetime.now(timezone.utc)
+    inserts, updates = {}, {}
+    theme_deltas = {}
+    for answer in answers:
+        stats = current.get(answer.question_id)
+        if stats is None:
+            if answer.question_id not in themes:
+                continue
+            previous[answer.question_id] = (themes[answer.question_id], False)
+            bank_id, theme = themes[answer.question_id]
+            stats = current[answer.question_id] = inserts[answer.question_id] = {
+                'user_id': user_id,
+                'question_id': answer.question_id,
+                'bank_id': bank_id,
+                'theme': theme,
+                'last_answer_id': 0,
+                'attempts': 0,
+                'correct_count': 0
+            }
+        elif answer.question_id not in inserts:
+            updates[answer.question_id] = stats
+
+        if answer.id > stats['last_answer_id']:
+            stats['last_answer_id'] = answer.id
+            stats['last_user_answer'] = answer.user_answer
+            stats['last_is_correct'] = bool(answer.is_correct)
+        stats['attempts'] += 1
+        if answer.is_correct:
+            stats['correct_count'] += 1
+        stats['updated_at'] = now
+
+        delta = _theme_delta(theme_deltas, user_id, previous[answer.question_id][0])
+        delta['attempts'] += 1
+        delta['correct_attempts'] += 1 if answer.is_correct else 0
+
+    if not inserts and not updates:
+        return None
+    # Questions nouvellement répondues et changements de la dernière réponse
+    for question_id, stats in list(inserts.items()) + list(updates.items()):
+        key, was_correct = previous[question_id]
+        delta = theme_deltas[key]
+        delta['answered'] += 1 if question_id in inserts else 0
+        delta['correct'] += int(stats['last_is_correct']) - int(was_correct)
+    table = QuestionStats.__table__
+    if updates:
+        db.session.execute(table.update().where(
+            table.c.user_id == bindparam('b_user_id'), table.c.question_id == bindparam('b_id')
+        ).values(
+            last_answer_id=bindparam('last_answer_id'),
+            last_user_answer=bindparam('last_user_answer'),
+            last_is_correct=bindparam('last_is_correct'),
+            attempts=bindparam('attempts'),
+            correct_count=bindparam('correct_count'),
+            updated_at=bindparam('updated_at')
+        ), list(updates.values()))
+    if inserts:
+        db.session.execute(table.insert(), list(inserts.values()))
+    upsert_add(ThemeStats.__table__, list(theme_deltas.values()), ['user_id', 'bank_id', 'theme'],
+               ['answered', 'correct', 'attempts', 'correct_attempts'])
+    return bump_revision(stats_revision_key(user_id))
+
+
+def _theme_delta(deltas, user_id, key):
+    if key not in deltas:
+        bank_id, theme = key
+        deltas[key] = {'user_id': user_id, 'bank_id': bank_id, 'theme': theme, 'answered': 0, 'correct': 0,
+                       'attempts': 0, 'correct_attempts': 0}
+    return deltas[key]
+
+
+def theme_results(answers):
+    """Résultats par thème d'un quiz ({thème: {'correct', 'total'}}), à partir de ses réponses"""
+    results = {}
+    for answer in answers:
+        theme = results.setdefault(answer.theme, {'correct': 0, 'total': 0})
+        theme['total'] += 1
+        if answer.is_correct:
+            theme['correct'] += 1
+    return results
+
+
+def quiz_duration(created_at, now=None):
+    """Durée d'un quiz en secondes, de sa création à sa finalisation"""
+    if created_at is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    if created_at.tzinfo is None:  # SQLite rend des dates naïves, en UTC
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return max(0, int((now - created_at).total_seconds()))
+
+
+def rebuild_theme_stats():
+    """Recalculer theme_stats à partir de question_stats (dans la transaction courante)"""
+    correct_expr = func.sum(case((QuestionStats.last_is_correct == True, 1), else_=0))
+    ThemeStats.query.delete()
+    db.session.execute(ThemeStats.__table__.insert().from_select(
+        ['user_id', 'bank_id', 'theme', 'answered', 'correct', 'attempts', 'correct_attempts'],
+        db.select(
+            QuestionStats.user_id, QuestionStats.bank_id, QuestionStats.theme, func.count(QuestionStats.question_id),
+            correct_expr, func.sum(QuestionStats.attempts), func.sum(QuestionStats.correct_count)
+        ).group_by(QuestionStats.user_id, QuestionStats.bank_id, QuestionStats.theme)
+    ))
+
+
+def rebuild_question_stats():
+    """Reconstruire entièrement question_stats à partir des réponses des quiz finalisés"""
+    summary = db.session.query(
+        SessionAnswer.user_id.label('user_id'),
+        SessionAnswer.question_id.label('question_id'),
+        func.max(SessionAnswer.id).label('last_id'),
+        func.count(SessionAnswer.id).label('attempts'),
+        func.sum(case((SessionAnswer.is_correct == True, 1), else_=0)).label('correct_count')
+    ).join(SessionQuiz, SessionQuiz.id_session == SessionAnswer.session_id) \
+     .filter(SessionQuiz.stats_applied == True).group_by(SessionAnswer.user_id, SessionAnswer.question_id).subquery()
+
+    rows = db.session.query(
+        summary.c.user_id,
+        summary.c.question_id,
+        Questions.bank_id,
+        Questions.theme,
+        summary.c.last_id,
+        SessionAnswer.user_answer,
+        SessionAnswer.is_correct,
+        summary.c.attempts,
+        summary.c.correct_count
+    ).join(SessionAnswer, SessionAnswer.id == summary.c.last_id) \
+     .join(Questions, Questions.id == summary.c.question_id).all()
+
+    now = datetime.now(timezone.utc)
+    user_ids = {user_id for (user_id,) in db.session.query(QuestionStats.user_id).distinct()}
+    user_ids.update(row[0] for row in rows)
+    QuestionStats.query.delete()
+    if rows:
+        db.session.execute(QuestionStats.__table__.insert(), [
+            {
+                'user_id': user_id,
+                'question_id': question_id,
+                'bank_id': bank_id,
+                'theme': theme,
+                'last_answer_id': last_id,
+                'last_user_answer': user_answer,
+                'last_is_correct': bool(is_correct),
+                'attempts': attempts,
+                'correct_count': correct_count or 0,
+                'updated_at': now
+            }
+            for user_id, question_id, bank_id, theme, last_id, user_answer, is_correct, attempts, correct_count in rows
+        ])
+    rebuild_theme_stats()
+    # Invalider le cache des statuts de chaque apprenant concerné
+    for user_id in sorted(user_ids):
+        bump_revision(stats_revision_key(user_id))
+    db.session.commit()
+
+
+def ensure_question_stats():
+    """Remplir question_stats au premier démarrage sur une base existante"""
+    if db.session.query(QuestionStats.question_id).first() is not None:
+        return
+    if db.session.query(SessionAnswer.id).first() is None:
+        return
+    rebuild_question_stats()
@@ -0,0 +1,35 @@
+"""Identité de l'apprenant courant.
+
+Sans MULTI_USER (par défaut), toutes les requêtes sont attribuées à
+l'apprenant DEFAULT_USER_ID, ce qui conserve le fonctionnement mono-utilisateur
+et l'historique existant. Avec MULTI_USER, chaque navigateur reçoit son propre
+apprenant, mémorisé dans le cookie de session signé.
+"""
+from flask import current_app, session
+
+from app import db
+from app.models import User
+
+DEFAULT_USER_ID = 1
+
+
+def current_user_id():
+    """ID de l'apprenant de la requête courante (créé à la première visite)"""
+    if not current_app.config.get('MULTI_USER'):
+        return DEFAULT_USER_ID
+    user_id = session.get('user_id')
+    if user_id is None:
+        user = User()
+        db.session.add(user)
+        db.session.flush()
+        user_id = session['user_id'] = user.id
+        db.session.commit()
+        session.permanent = True
+    return user_id
+
+
+def ensure_default_user():
+    """Créer l'apprenant par défaut, propriétaire des données antérieures au multi-utilisateur"""
+    if db.session.get(User, DEFAULT_USER_ID) is None:
+        db.session.add(User(id=DEFAULT_USER_ID))
+        db.session.flush()
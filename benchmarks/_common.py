@@ -0,0 +1,102 @@
+"""Outils partagés par les benchmarks : base SQLite temporaire et historique synthétique"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTIONS_FILE = os.path.join(ROOT, 'cisa_questions.json')
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_app(db_path=None):
+    """Créer l'application sur une base SQLite temporaire (jamais instance/cisa.db)"""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='cisaquiz-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = os.environ['DATABASE_URL']
+
+    from app import create_app
+    return create_app()
+
+
+def seed_questions(app, json_file=QUESTIONS_FILE, bank=None):
+    """Charger une banque de questions (par défaut la banque CISA) depuis le JSON avec l'importeur par lots"""
+    from import_from_json import import_from_json
+
+    with app.app_context():
+        summary = import_from_json(json_file, verbose=False, **({'bank': bank} if bank else {}))
+    return summary['inserted'] + summary['updated'] + summary['unchanged']
+
+
+def seed_answers(app, num_answers, answers_per_session=50, seed=42, users=1):
+    """Générer un historique synthétique de sessions et de réponses, réparti entre `users` apprenants"""
+    from app import db
+    from app.models import Questions, SessionQuiz, SessionAnswer, User
+    from app.stats import rebuild_question_stats
+    from app.review import rebuild_review_states
+
+    rng = random.Random(seed)
+    with app.app_context():
+        question_ids = [row[0] for row in db.session.query(Questions.id)]
+        start_session = (db.session.query(db.func.max(SessionQuiz.id_session)).scalar() or 0) + 1
+        num_sessions = max(1, num_answers // answers_per_session)
+
+        # L'apprenant 1 (par défaut) existe déjà ; les sessions sont réparties à tour de rôle
+        existing_users = db.session.query(db.func.max(User.id)).scalar() or 0
+        if users > existing_users:
+            db.session.execute(User.__table__.insert(), [
+                {'id': user_id} for user_id in range(existing_users + 1, users + 1)
+            ])
+        db.session.execute(SessionQuiz.__table__.insert(), [
+            {'id_session': start_session + i, 'user_id': 1 + i % users, 'score': 0, 'param_quiz': '{}',
+             'stats_applied': True}
+            for i in range(num_sessions)
+        ])
+
+        batch = []
+        for i in range(num_sessions):
+            # Une réponse par question au plus dans un même quiz
+            size = answers_per_session if i < num_sessions - 1 else num_answers - i * answers_per_session
+            size = min(size, len(question_ids))
+            for question_id in rng.sample(question_ids, size):
+                batch.append({
+                    'session_id': start_session + i,
+                    'user_id': 1 + i % users,
+                    'question_id': question_id,
+                    'user_answer': rng.randrange(4),
+                    'is_correct': rng.random() < 0.6
+                })
+            if len(batch) >= 10000:
+                db.session.execute(SessionAnswer.__table__.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(SessionAnswer.__table__.insert(), batch)
+        db.session.commit()
+
+        rebuild_question_stats()
+        rebuild_review_states()
+
+
+def time_request(client, method, url, repeat=20, **kwargs):
+    """Retourner les durées (ms) de `repeat` appels à une route"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code < 400, (url, response.status_code)
+    return timings
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
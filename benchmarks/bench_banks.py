@@ -0,0 +1,106 @@
+"""Latence par banque : une banque seule contre --banks banques de même taille.
+
+Pour chaque configuration, un processus dédié importe --banks banques de
+--questions questions synthétiques (dérivées de cisa_questions.json, énoncés
+propres à chaque banque), génère un historique réparti sur toutes les banques,
+puis mesure le temps de traitement serveur des routes qui sélectionnent,
+comptent et résument une banque : la première et la dernière banque importées
+sont interrogées. Avec les index (bank_id, theme), les latences ne doivent pas
+dépendre du nombre de banques.
+
+Usage : python -m benchmarks.bench_banks [--banks 10] [--questions 5000] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks._common import ROOT, QUESTIONS_FILE, make_app, seed_questions, seed_answers, percentile
+from benchmarks.bench_questions_count import timed_wsgi
+
+
+def write_bank(path, code, size):
+    """Écrire une banque synthétique de `size` questions, distinctes de celles des autres banques"""
+    with open(QUESTIONS_FILE, 'r', encoding='utf-8') as f:
+        source = json.load(f)
+    questions = []
+    for i in range(size):
+        q = dict(source[i % len(source)])
+        q['text'] = f"[{code} #{i}] {q['text']}"
+        questions.append(q)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(questions, f, ensure_ascii=False)
+
+
+def run_configuration(num_banks, args):
+    """Mesures pour un nombre de banques (exécuté dans un processus dédié)"""
+    workdir = tempfile.mkdtemp(prefix='cisaquiz-banks-')
+    os.environ['QUESTION_SNAPSHOT'] = ''
+    app = make_app(os.path.join(workdir, 'bench.db'))
+    codes = [f'b{k:02d}' for k in range(1, num_banks + 1)]
+    for code in codes:
+        path = os.path.join(workdir, f'{code}.json')
+        write_bank(path, code, args.questions)
+        seed_questions(app, path, bank=code)
+    seed_answers(app, args.answers * num_banks)
+
+    server_ms = timed_wsgi(app)
+    client = app.test_client()
+    for code in dict.fromkeys((codes[0], codes[-1])):
+        with app.app_context():
+            from app.bank import invalidate
+            from app.banks import bank_id_for
+            from app.models import Questions
+            from app import db
+            invalidate()
+            themes = [t for (t,) in db.session.query(Questions.theme)
+                      .filter(Questions.bank_id == bank_id_for(code)).distinct()]
+
+        count_url = '/quiz/config/questions-count?' + '&'.join(
+            [f'bank={code}'] + [f'themes={t}' for t in themes] + ['question_filters=new', 'question_filters=incorrect']
+        )
+        routes = {
+            'questions-count': lambda: client.get(count_url),
+            'quiz_config GET': lambda: client.get(f'/quiz/config?bank={code}'),
+            'quiz_config POST': lambda: client.post('/quiz/config', json={
+                'bank': code, 'themes': themes, 'num_questions': 50}),
+            'dashboard': lambda: client.get(f'/dashboard?bank={code}'),
+        }
+        # Premier appel : cache de la banque à construire
+        del server_ms[:]
+        assert client.get(count_url).status_code == 200
+        cold = server_ms[0]
+        print(f"  {code} ({len(themes)} thèmes)  questions-count à froid : {cold:7.2f} ms")
+        for label, call in routes.items():
+            del server_ms[:]
+            for _ in range(args.repeat):
+                assert call().status_code < 400, (label, code)
+            print(f"      {label:<18} p50 {percentile(server_ms, 50):7.2f} ms   p95 {percentile(server_ms, 95):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--banks', type=int, default=10)
+    parser.add_argument('--questions', type=int, default=5000, help="Questions par banque")
+    parser.add_argument('--answers', type=int, default=5000, help="Réponses historiques par banque")
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--run-configuration', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    options = ['--questions', str(args.questions), '--answers', str(args.answers), '--repeat', str(args.repeat)]
+    if args.run_configuration:
+        run_configuration(args.run_configuration, args)
+        return
+
+    # Un processus par configuration : caches et base repartent de zéro
+    for num_banks in sorted({1, args.banks}):
+        print(f"{num_banks} banque(s) de {args.questions} questions")
+        sys.stdout.flush()
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_banks', '--run-configuration', str(num_banks)]
+                       + options, cwd=ROOT, check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Démarrage à froid jusqu'à la première page de quiz, avec et sans instantané binaire.
+
+Chaque mesure lance un nouveau processus Python (comme un démarrage à froid
+serverless) qui crée l'application, configure un quiz et affiche sa première
+question.
+
+Usage : python -m benchmarks.bench_cold_start [--runs 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks._common import ROOT, make_app, seed_questions, percentile
+
+CHILD = r'''
+import time
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+client = app.test_client()
+themes = ["The Process of Auditing Information Systems.", "Protection of Information Assets."]
+r = client.post('/quiz/config', json={'themes': themes, 'num_questions': 10, 'show_answers': 'end'})
+r = client.get(r.get_json()['redirect_url'])
+assert r.status_code == 200, r.status_code
+print((time.perf_counter() - start) * 1000)
+'''
+
+
+def run_child(env):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return (time.perf_counter() - start) * 1000, float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cisaquiz-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    snap_path = os.path.join(workdir, 'questions.snap')
+    app = make_app(db_path)
+    seed_questions(app)
+    with app.app_context():
+        from app.snapshot import build_from_db
+        build_from_db(snap_path)
+
+    modes = {'base de données': '', 'instantané': snap_path}
+    print(f"{'mode':<18} {'processus p50':>14} {'app p50':>9} {'app p95':>9}  (ms)")
+    for label, snapshot in modes.items():
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + db_path, QUESTION_SNAPSHOT=snapshot)
+        results = [run_child(env) for _ in range(args.runs)]
+        wall = [w for w, _ in results]
+        inner = [i for _, i in results]
+        print(f"{label:<18} {percentile(wall, 50):>14.1f} {percentile(inner, 50):>9.1f} {percentile(inner, 95):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
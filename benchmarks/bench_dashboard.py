@@ -0,0 +1,30 @@
+"""Latence de /dashboard en fonction de la taille de l'historique de réponses.
+
+Usage : python -m benchmarks.bench_dashboard [--sizes 1000,10000,100000]
+"""
+import argparse
+
+from benchmarks._common import make_app, seed_questions, seed_answers, time_request, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app()
+    seed_questions(app)
+    client = app.test_client()
+
+    seeded = 0
+    print(f"{'réponses':>10} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        seed_answers(app, size - seeded, seed=size)
+        seeded = size
+        timings = time_request(client, 'GET', '/dashboard', repeat=args.repeat)
+        print(f"{size:>10} {percentile(timings, 50):>10.2f} {percentile(timings, 95):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Lectures et écritures concurrentes selon la configuration du moteur SQLite.
+
+Pour chaque configuration, un processus dédié sert l'application (MULTI_USER,
+base SQLite temporaire) sur un serveur WSGI multi-thread. Pendant --duration
+secondes, --writers apprenants enchaînent des quiz complets (configuration,
+réponses, résultats) pendant que --readers clients consultent le tableau de
+bord et le nombre de questions disponibles. Le rapport donne les latences de
+lecture, le débit de finalisation et les erreurs (« database is locked »).
+
+- rollback : journal_mode=DELETE, synchronous=FULL (réglages par défaut de SQLite)
+- wal      : WAL, synchronous=NORMAL, mmap, cache et busy_timeout de Config
+- wal+read : idem, avec un pool de connexions dédié aux routes @read_only
+
+Usage : python -m benchmarks.bench_engine [--readers 16] [--writers 8] [--duration 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks._common import ROOT, make_app, seed_questions, seed_answers, percentile
+from benchmarks.bench_rtt import Client
+
+CONFIGURATIONS = {
+    'rollback': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': '0',
+                 'SQLITE_CACHE_SIZE': '-2000'},
+    'wal': {},
+    'wal+read': {'DB_READ_POOL': '1'},
+}
+
+
+def run_configuration(name, args):
+    """Mesures pour une configuration (exécuté dans un processus dédié)"""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    workdir = tempfile.mkdtemp(prefix='cisaquiz-engine-')
+    os.environ.update({'MULTI_USER': '1', 'QUESTION_SNAPSHOT': ''}, **CONFIGURATIONS[name])
+    app = make_app(os.path.join(workdir, 'bench.db'))
+    seed_questions(app)
+    seed_answers(app, 10000)
+    with app.app_context():
+        from app.bank import get_bank
+        themes = get_bank().themes
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    timings = {'dashboard': [], 'questions-count': [], 'quiz_results': []}
+    lock = threading.Lock()
+    errors = []
+    finalized = []
+
+    def timed(label, call):
+        start = time.perf_counter()
+        result = call()
+        with lock:
+            timings[label].append((time.perf_counter() - start) * 1000)
+        return result
+
+    def writer(deadline):
+        client = Client(server.port, 0)
+        try:
+            while time.perf_counter() < deadline:
+                session_id = json.loads(client.call(
+                    'POST', '/quiz/config', {'themes': themes, 'num_questions': args.questions}
+                ))['session_id']
+                questions = json.loads(client.call(
+                    'GET', f'/quiz/{session_id}/questions?limit={args.questions}'
+                ))['questions']
+                client.call('POST', f'/quiz/{session_id}/answers', {
+                    'answers': [{'question_id': q['id'], 'answer': 0} for q in questions]
+                })
+                timed('quiz_results', lambda: client.call('GET', f'/quiz/{session_id}/results'))
+                with lock:
+                    finalized.append(session_id)
+        except Exception as e:  # Reporté dans le rapport plutôt que d'interrompre les autres clients
+            errors.append(repr(e))
+
+    def reader(deadline):
+        client = Client(server.port, 0)
+        try:
+            while time.perf_counter() < deadline:
+                timed('dashboard', lambda: client.call('GET', '/dashboard'))
+                timed('questions-count', lambda: client.call(
+                    'POST', '/quiz/config/questions-count',
+                    {'themes': themes, 'question_filters': ['new', 'incorrect']}
+                ))
+        except Exception as e:
+            errors.append(repr(e))
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [threading.Thread(target=writer, args=(deadline,)) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(deadline,)) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    reads = len(timings['dashboard']) + len(timings['questions-count'])
+    print(f"{name:<9} {reads / elapsed:>8.1f} lectures/s {len(finalized) / elapsed:>7.1f} quiz/s"
+          f"  ({len(errors)} erreurs)")
+    for label, values in timings.items():
+        print(f"          {label:<16} p50 {percentile(values, 50):8.1f} ms   p95 {percentile(values, 95):8.1f} ms")
+    for error in errors[:3]:
+        print(f"          erreur : {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--configurations', default=','.join(CONFIGURATIONS))
+    parser.add_argument('--run-configuration', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_configuration:
+        run_configuration(args.run_configuration, args)
+        return
+
+    # Un processus par configuration : les pragmas et les pools sont fixés à la création de l'application
+    print(f"{args.readers} lecteurs, {args.writers} apprenants en quiz, "
+          f"{args.questions} questions par quiz, {args.duration:g} s")
+    sys.stdout.flush()
+    for name in args.configurations.split(','):
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_engine', '--run-configuration', name,
+                        '--readers', str(args.readers), '--writers', str(args.writers),
+                        '--questions', str(args.questions), '--duration', str(args.duration)],
+                       cwd=ROOT, check=True)
+
+
+if __name__ == '__main__':
+    main()
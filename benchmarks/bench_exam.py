@@ -0,0 +1,75 @@
+"""Examen blanc complet de 150 questions : réponses, résultats, rechargement des résultats.
+
+Mesure la durée cumulée des soumissions, celle du premier affichage des
+résultats et celle d'un rechargement, ainsi que le nombre de lignes
+session_answers écrites (un rechargement ne doit rien réinsérer).
+
+Usage : python -m benchmarks.bench_exam [--questions 150] [--history 10000]
+"""
+import argparse
+import re
+import time
+
+from benchmarks._common import make_app, seed_questions, seed_answers
+
+QUESTION_ID = re.compile(rb'name="question_id" value="(\d+)"')
+
+
+def run_exam(app, client, num_questions):
+    with app.app_context():
+        from app.bank import get_bank
+        themes = get_bank().themes
+
+    response = client.post('/quiz/config', json={
+        'themes': themes, 'num_questions': num_questions, 'show_answers': 'end'
+    })
+    session_id = response.get_json()['session_id']
+
+    pages = submits = 0.0
+    for _ in range(num_questions):
+        start = time.perf_counter()
+        page = client.get(f'/quiz/{session_id}')
+        pages += time.perf_counter() - start
+        question_id = int(QUESTION_ID.search(page.data).group(1))
+
+        start = time.perf_counter()
+        client.post(f'/quiz/{session_id}/answer', json={'question_id': question_id, 'answer': 0})
+        submits += time.perf_counter() - start
+
+    start = time.perf_counter()
+    first = client.get(f'/quiz/{session_id}/results')
+    results = time.perf_counter() - start
+    start = time.perf_counter()
+    client.get(f'/quiz/{session_id}/results')
+    reload = time.perf_counter() - start
+    assert first.status_code == 200
+
+    with app.app_context():
+        from app.models import SessionAnswer
+        rows = SessionAnswer.query.filter(SessionAnswer.session_id == session_id).count()
+    return pages, submits, results, reload, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=150)
+    parser.add_argument('--history', type=int, default=10000)
+    args = parser.parse_args()
+
+    app = make_app()
+    seed_questions(app)
+    seed_answers(app, args.history)
+    client = app.test_client()
+
+    pages, submits, results, reload, rows = run_exam(app, client, args.questions)
+    n = args.questions
+    print(f"examen de {n} questions (historique : {args.history} réponses)")
+    print(f"pages question     : {pages * 1000:8.1f} ms au total ({pages / n * 1000:.2f} ms/question)")
+    print(f"soumissions        : {submits * 1000:8.1f} ms au total ({submits / n * 1000:.2f} ms/réponse)")
+    print(f"résultats          : {results * 1000:8.1f} ms")
+    print(f"rechargement       : {reload * 1000:8.1f} ms")
+    print(f"lignes session_answers pour ce quiz : {rows}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Export colonnaire et analyse NumPy de l'historique des réponses : durée et mémoire.
+
+Pour un historique synthétique de --answers réponses (quiz étalés sur 180
+jours), mesure l'export (app.history.export_history), le chargement et
+l'analyse (app.analytics : difficulté, discrimination, séries par thème).
+La mémoire indiquée est le pic des allocations Python (tracemalloc, tableaux
+NumPy compris) de chaque étape, mesuré lors d'une seconde exécution. Avec
+--baseline, compare au calcul de la difficulté par parcours des objets ORM
+SessionAnswer.
+
+Usage : python -m benchmarks.bench_history [--answers 1000000] [--baseline]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks._common import make_app, seed_questions, seed_answers
+
+
+def measure(label, call):
+    """Chronométrer un appel, puis le rejouer sous tracemalloc (qui le ralentit) pour son pic mémoire"""
+    start = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.2f} s   pic {peak / 1e6:8.1f} Mo")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--answers', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--baseline', action='store_true')
+    args = parser.parse_args()
+
+    from app import db
+    from app.models import SessionAnswer
+    from app.history import export_history, load_history
+    from app.analytics import question_difficulty, theme_time_series
+
+    app = make_app()
+    seed_questions(app)
+    start = time.perf_counter()
+    seed_answers(app, args.answers, users=args.users)
+    with app.app_context():
+        # Étaler les quiz sur six mois pour les séries temporelles
+        db.session.execute(db.text(
+            'UPDATE "sessionQuiz" SET created_at = datetime(\'now\', -(id_session % 180) || \' days\')'
+        ))
+        db.session.commit()
+    print(f"{args.answers} réponses générées en {time.perf_counter() - start:.1f} s\n")
+
+    path = os.path.join(tempfile.mkdtemp(prefix='cisaquiz-history-'), 'history.cqh')
+    with app.app_context():
+        rows = measure('export', lambda: export_history(path))
+    print(f"{'':<28} {rows} lignes, {os.path.getsize(path) / 1e6:.1f} Mo ({os.path.getsize(path) / rows:.1f} o/ligne)")
+
+    history = measure('chargement (NumPy)', lambda: load_history(path, use_numpy=True))
+    measure('chargement (array.array)', lambda: load_history(path, use_numpy=False))
+    questions = measure('difficulté + discrimination', lambda: question_difficulty(history))
+    series = measure('séries par thème (semaine)', lambda: theme_time_series(history, period='week'))
+    print(f"{'':<28} {len(questions['question_id'])} questions, "
+          f"{series['answers'].shape[0]} thèmes × {series['answers'].shape[1]} semaines")
+
+    if args.baseline:
+        def orm_difficulty():
+            counts = {}
+            for answer in SessionAnswer.query.yield_per(10000):
+                total, correct = counts.get(answer.question_id, (0, 0))
+                counts[answer.question_id] = (total + 1, correct + (1 if answer.is_correct else 0))
+            return {question_id: correct / total for question_id, (total, correct) in counts.items()}
+
+        with app.app_context():
+            measure('ORM : difficulté seule', orm_difficulty)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Débit de finalisation d'une cohorte qui termine un examen en même temps : écriture immédiate ou différée.
+
+Pour chaque mode d'ingestion ('sync', 'async'), un processus dédié sert
+l'application (MULTI_USER, base SQLite temporaire) sur un serveur WSGI
+multi-thread. --clients apprenants enchaînent en parallèle, pendant --duration
+secondes : configuration, envoi des réponses, page de résultats. Le rapport
+donne le débit soutenu de finalisation et les latences de chaque étape.
+
+Usage : python -m benchmarks.bench_ingestion [--clients 16] [--questions 50] [--duration 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks._common import ROOT, make_app, seed_questions, seed_answers, percentile
+from benchmarks.bench_rtt import Client
+
+
+def run_mode(mode, args):
+    """Mesures pour un mode d'ingestion (exécuté dans un processus dédié)"""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    workdir = tempfile.mkdtemp(prefix='cisaquiz-ingestion-')
+    os.environ.update({'INGESTION': mode, 'INGESTION_JOURNAL': os.path.join(workdir, 'ingestion.journal'),
+                       'MULTI_USER': '1', 'QUESTION_SNAPSHOT': ''})
+    app = make_app(os.path.join(workdir, 'bench.db'))
+    seed_questions(app)
+    seed_answers(app, 10000)
+    with app.app_context():
+        from app.bank import get_bank
+        themes = get_bank().themes
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    timings = {'quiz_config POST': [], 'submit_answers': [], 'quiz_results': []}
+    lock = threading.Lock()
+    errors = []
+    finalized = []
+
+    def timed(name, call):
+        start = time.perf_counter()
+        result = call()
+        with lock:
+            timings[name].append((time.perf_counter() - start) * 1000)
+        return result
+
+    def learner(deadline):
+        client = Client(server.port, 0)
+        try:
+            while time.perf_counter() < deadline:
+                session_id = json.loads(timed('quiz_config POST', lambda: client.call(
+                    'POST', '/quiz/config', {'themes': themes, 'num_questions': args.questions}
+                )))['session_id']
+                questions = json.loads(client.call(
+                    'GET', f'/quiz/{session_id}/questions?limit={args.questions}'
+                ))['questions']
+                timed('submit_answers', lambda: client.call('POST', f'/quiz/{session_id}/answers', {
+                    'answers': [{'question_id': q['id'], 'answer': 0} for q in questions]
+                }))
+                timed('quiz_results', lambda: client.call('GET', f'/quiz/{session_id}/results'))
+                with lock:
+                    finalized.append(session_id)
+        except Exception as e:  # Reporté dans le rapport plutôt que d'interrompre les autres clients
+            errors.append(repr(e))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=learner, args=(start + args.duration,)) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"{mode:<6} {len(finalized) / elapsed:>10.1f} quiz/s  ({len(finalized)} quiz, {len(errors)} erreurs)")
+    for name, values in timings.items():
+        print(f"       {name:<18} p50 {percentile(values, 50):8.1f} ms   p95 {percentile(values, 95):8.1f} ms")
+    for error in errors[:3]:
+        print(f"       erreur : {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--run-mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        run_mode(args.run_mode, args)
+        return
+
+    # Un processus par mode : la configuration est lue à la création de l'application
+    print(f"{args.clients} apprenants, {args.questions} questions par quiz, {args.duration:g} s")
+    sys.stdout.flush()
+    for mode in args.modes.split(','):
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_ingestion', '--run-mode', mode,
+                        '--clients', str(args.clients), '--questions', str(args.questions),
+                        '--duration', str(args.duration)], cwd=ROOT, check=True)
+
+
+if __name__ == '__main__':
+    main()
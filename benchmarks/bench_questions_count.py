@@ -0,0 +1,76 @@
+"""Latence de /quiz/config/questions-count sur la banque CISA complète.
+
+Vérifie que le traitement côté serveur (appel WSGI, hors client de test) reste
+sous 1 ms (p95) et que la revalidation par ETag renvoie bien un 304.
+
+Usage : python -m benchmarks.bench_questions_count [--answers 10000]
+"""
+import argparse
+import time
+
+from benchmarks._common import make_app, seed_questions, seed_answers, time_request, percentile
+
+TARGET_MS = 1.0
+FILTERS = [['new'], ['answered'], ['incorrect'], ['new', 'answered', 'incorrect']]
+
+
+def timed_wsgi(app):
+    """Envelopper l'application WSGI pour mesurer le temps de traitement serveur"""
+    server_ms = []
+    wsgi_app = app.wsgi_app
+
+    def wrapper(environ, start_response):
+        start = time.perf_counter()
+        body = b''.join(wsgi_app(environ, start_response))
+        server_ms.append((time.perf_counter() - start) * 1000)
+        return [body]
+
+    app.wsgi_app = wrapper
+    return server_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--answers', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    app = make_app()
+    total = seed_questions(app)
+    seed_answers(app, args.answers)
+    server_ms = timed_wsgi(app)
+    client = app.test_client()
+
+    with app.app_context():
+        from app.bank import get_bank
+        bank = get_bank()
+        themes = bank.themes
+
+        # Comptage seul (compteurs précalculés), hors coût HTTP et version
+        start = time.perf_counter()
+        for i in range(args.repeat):
+            bank.count(themes[:1 + i % len(themes)], FILTERS[i % len(FILTERS)])
+        count_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+    url = '/quiz/config/questions-count?' + '&'.join(
+        [f'themes={t}' for t in themes] + ['question_filters=new', 'question_filters=incorrect']
+    )
+    time_request(client, 'GET', url, repeat=args.repeat)
+    timings = server_ms[:]
+    etag = client.get(url).headers['ETag']
+    del server_ms[:]
+    time_request(client, 'GET', url, repeat=args.repeat, headers={'If-None-Match': etag})
+    revalidated = server_ms[:]
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    print(f"questions: {total}, réponses: {args.answers}")
+    print(f"count() seul            : {count_us:8.2f} µs")
+    print(f"GET 200        p50/p95  : {percentile(timings, 50):.3f} / {percentile(timings, 95):.3f} ms")
+    print(f"GET 304 (ETag) p50/p95  : {percentile(revalidated, 50):.3f} / {percentile(revalidated, 95):.3f} ms")
+
+    p95 = percentile(timings, 95)
+    assert p95 < TARGET_MS, f"p95 {p95:.3f} ms >= objectif {TARGET_MS} ms"
+
+
+if __name__ == '__main__':
+    main()
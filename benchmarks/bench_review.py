@@ -0,0 +1,99 @@
+"""Simulation de la répétition espacée : rejoue un historique synthétique quiz après quiz.
+
+À chaque quiz simulé (plusieurs par jour fictif), les questions à réviser sont
+tirées avec le filtre 'due' puis complétées au hasard, les réponses sont
+insérées et review_state est mis à jour comme à la finalisation. Mesure la
+latence de la sélection 'due' et de la mise à jour, qui ne doivent pas
+croître avec l'historique.
+
+Usage : python -m benchmarks.bench_review [--answers 100000] [--per-quiz 50]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks._common import make_app, seed_questions, percentile
+
+
+def report(label, timings):
+    print(f"{label:<22} p50 {percentile(timings, 50):6.2f} ms   p95 {percentile(timings, 95):6.2f} ms"
+          f"   max {max(timings):6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--answers', type=int, default=100000)
+    parser.add_argument('--per-quiz', type=int, default=50)
+    parser.add_argument('--quizzes-per-day', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = make_app()
+    seed_questions(app)
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        from app import db
+        from app.bank import get_bank, ids_mask
+        from app.models import SessionQuiz, SessionAnswer, ReviewState
+        from app.review import due_question_ids, update_review_states
+        from app.routes import generate_quiz_questions
+
+        bank = get_bank()
+        themes = bank.themes
+        now = datetime.now(timezone.utc)
+        step = timedelta(days=1) / args.quizzes_per_day
+        num_quizzes = args.answers // args.per_quiz
+
+        select_timings, update_timings, due_sizes = [], [], []
+        for i in range(num_quizzes):
+            now += step
+
+            start = time.perf_counter()
+            due_ids = due_question_ids(1, themes, args.per_quiz, now=now)
+            select_timings.append((time.perf_counter() - start) * 1000)
+            due_sizes.append(len(due_ids))
+            question_ids = due_ids + bank.sample(themes, ['new', 'answered', 'incorrect'],
+                                                 args.per_quiz - len(due_ids), rng=rng,
+                                                 exclude=ids_mask(due_ids))
+
+            quiz = SessionQuiz(score=0, param_quiz='{}', created_at=now, stats_applied=True)
+            db.session.add(quiz)
+            db.session.flush()
+            answers = []
+            for question_id in question_ids:
+                answers.append(SessionAnswer(session_id=quiz.id_session, question_id=question_id,
+                                             user_answer=rng.randrange(4), is_correct=rng.random() < 0.7))
+            db.session.add_all(answers)
+            db.session.flush()
+
+            start = time.perf_counter()
+            update_review_states(1, answers, now=now)
+            db.session.flush()
+            update_timings.append((time.perf_counter() - start) * 1000)
+            db.session.commit()
+
+            if (i + 1) % 500 == 0:
+                print(f"[{(i + 1) * args.per_quiz} réponses] sélection p95 "
+                      f"{percentile(select_timings[-500:], 95):.2f} ms, mise à jour p95 "
+                      f"{percentile(update_timings[-500:], 95):.2f} ms")
+
+        states = db.session.query(db.func.count(ReviewState.question_id)).scalar()
+        due_now = len(due_question_ids(1, themes, now=now))
+
+        # Le chemin complet de la route, tirage aléatoire compris
+        start = time.perf_counter()
+        generate_quiz_questions(1, themes, args.per_quiz, ['due', 'new'])
+        route_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\n{num_quizzes} quiz, {num_quizzes * args.per_quiz} réponses, {states} questions suivies, "
+          f"{due_now} à réviser à la fin")
+    print(f"questions 'due' par quiz : moyenne {sum(due_sizes) / len(due_sizes):.1f}")
+    report("sélection 'due'", select_timings)
+    report("mise à jour", update_timings)
+    print(f"generate_quiz_questions(['due', 'new']) : {route_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
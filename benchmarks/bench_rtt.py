@@ -0,0 +1,114 @@
+"""Durée d'un quiz complet sur un lien à forte latence : question par question ou par lots.
+
+L'application est servie par un serveur WSGI local ; chaque requête du client
+subit en plus un délai fixe (--rtt), qui simule l'aller-retour réseau.
+
+- unitaire : une page et une réponse par question (2N requêtes) ;
+- par lots : /quiz/<id>/questions et /quiz/<id>/answers par lots de
+  --batch questions (2 x N/batch requêtes).
+
+Usage : python -m benchmarks.bench_rtt [--questions 50] [--batch 10] [--rtt 0,50,150]
+"""
+import argparse
+import http.client
+import json
+import re
+import threading
+import time
+
+from benchmarks._common import make_app, seed_questions
+
+QUESTION_ID = re.compile(rb'name="question_id" value="(\d+)"')
+
+
+class Client:
+    """Client HTTP qui compte ses requêtes et attend `rtt` secondes à chacune"""
+
+    def __init__(self, port, rtt):
+        self.port = port
+        self.rtt = rtt
+        self.requests = 0
+        self.cookie = None
+
+    def call(self, method, path, body=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        time.sleep(self.rtt)
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        connection.close()
+        self.requests += 1
+        assert response.status < 400, (path, response.status)
+        return data
+
+
+def start_quiz(client, themes, num_questions):
+    return json.loads(client.call('POST', '/quiz/config', {
+        'themes': themes, 'num_questions': num_questions, 'show_answers': 'end'
+    }))['session_id']
+
+
+def run_single(client, themes, num_questions, batch):
+    session_id = start_quiz(client, themes, num_questions)
+    for _ in range(num_questions):
+        page = client.call('GET', f'/quiz/{session_id}')
+        question_id = int(QUESTION_ID.search(page).group(1))
+        client.call('POST', f'/quiz/{session_id}/answer', {'question_id': question_id, 'answer': 0})
+    client.call('GET', f'/quiz/{session_id}/results')
+
+
+def run_batched(client, themes, num_questions, batch):
+    session_id = start_quiz(client, themes, num_questions)
+    client.call('GET', f'/quiz/{session_id}')  # Première question rendue par le serveur
+    loaded = 0
+    while loaded < num_questions:
+        questions = json.loads(client.call('GET', f'/quiz/{session_id}/questions?start={loaded}&limit={batch}'))
+        loaded += len(questions['questions'])
+        client.call('POST', f'/quiz/{session_id}/answers', {
+            'answers': [{'question_id': q['id'], 'answer': 0} for q in questions['questions']]
+        })
+    client.call('GET', f'/quiz/{session_id}/results')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=10)
+    parser.add_argument('--rtt', default='0,50,150', help="Latences simulées (ms)")
+    args = parser.parse_args()
+
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app = make_app()
+    seed_questions(app)
+    with app.app_context():
+        from app.bank import get_bank
+        themes = get_bank().themes
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{args.questions} questions, lots de {args.batch}")
+    print(f"{'RTT (ms)':>9} {'mode':<10} {'requêtes':>9} {'durée (s)':>10}")
+    for rtt in (int(r) for r in args.rtt.split(',')):
+        for name, run in (('unitaire', run_single), ('par lots', run_batched)):
+            client = Client(server.port, rtt / 1000)
+            start = time.perf_counter()
+            run(client, themes, args.questions, args.batch)
+            elapsed = time.perf_counter() - start
+            print(f"{rtt:>9} {name:<10} {client.requests:>9} {elapsed:>10.2f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Durée du tirage d'un quiz selon la taille de la banque et le mode de tirage.
+
+Les banques sont synthétiques et construites en mémoire (QuestionBank,
+LearnerBank), sans base : seule la sélection des IDs est mesurée. La
+référence est l'ancien tirage, qui énumérait toutes les questions éligibles
+avant d'en garder N (list(iter_bits(masque)) puis random.sample).
+
+Usage : python -m benchmarks.bench_sampling [--sizes 3442,30000,300000] [--questions 10,150]
+"""
+import argparse
+import random
+import time
+
+from benchmarks._common import percentile
+
+THEMES = [f'Domaine {i}' for i in range(1, 6)]
+
+
+def make_learner(size, seed=42):
+    """Banque de `size` questions réparties sur 5 thèmes ; l'apprenant a répondu à un tiers d'entre elles"""
+    from app.bank import QuestionBank, LearnerBank
+
+    rng = random.Random(seed)
+    bank = QuestionBank(None, [(question_id, rng.choice(THEMES)) for question_id in range(1, size + 1)])
+    learner = LearnerBank(bank, 1)
+    rows = []
+    for question_id in rng.sample(range(1, size + 1), size // 3):
+        attempts = rng.randint(1, 5)
+        rows.append((question_id, attempts, rng.randint(0, attempts)))
+    learner.load_statuses(1, rows)
+    return learner
+
+
+def timed(call, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return percentile(timings, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='3442,30000,300000')
+    parser.add_argument('--questions', default='10,150')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    from app.bank import iter_bits
+    from app.sampling import sample_questions
+
+    filters = ['new', 'answered', 'incorrect']
+    modes = [
+        ('uniforme', {}),
+        ('examen', {'balance': 'exam', 'theme_weights': dict(zip(THEMES, (18, 18, 12, 26, 26)))}),
+        ('par erreurs', {'weighting': 'errors'}),
+    ]
+    print(f"{'questions':>9} {'N':>5} {'référence':>11}" + ''.join(f"{name:>13}" for name, _ in modes) + "   (p50, ms)")
+    for size in map(int, args.sizes.split(',')):
+        learner = make_learner(size)
+        for n in map(int, args.questions.split(',')):
+            rng = random.Random(1)
+
+            def baseline():
+                candidates = list(iter_bits(learner.select(THEMES, filters)))
+                return rng.sample(candidates, min(n, len(candidates)))
+
+            row = f"{size:>9} {n:>5} {timed(baseline, args.repeat):>11.3f}"
+            for _, options in modes:
+                row += f"{timed(lambda: sample_questions(learner, THEMES, filters, n, rng=rng, **options), args.repeat):>13.3f}"
+            print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Latence de /search : FTS5, index inversé en mémoire et, pour comparaison, LIKE.
+
+Chaque requête du jeu est rejouée plusieurs fois par backend ; la première
+recherche (synchronisation de l'index) est mesurée à part.
+
+Usage : python -m benchmarks.bench_search [--repeat 20]
+"""
+import argparse
+import time
+
+from benchmarks._common import make_app, seed_questions, time_request, percentile
+
+QUERIES = [
+    'business continuity plan',
+    'audit',
+    'firewall',
+    'segregation of duties',
+    'encryption key management',
+    'risk assessment',
+    'change management',
+    'IS auditor recommend',
+]
+
+
+def like_search(query, limit=20):
+    """Recherche naïve : un LIKE par terme sur l'énoncé, les options et l'explication"""
+    from app import db
+    from app.models import Questions
+
+    filters = []
+    for term in query.split():
+        pattern = f'%{term}%'
+        filters.append(db.or_(Questions.text.ilike(pattern), db.cast(Questions.options, db.Text).ilike(pattern),
+                              Questions.explanation.ilike(pattern)))
+    return db.session.query(Questions.id).filter(*filters).limit(limit).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app()
+    seed_questions(app)
+    client = app.test_client()
+
+    for backend in ('fts', 'memory'):
+        app.config['SEARCH_BACKEND'] = backend
+        app.extensions.pop('search', None)
+
+        start = time.perf_counter()
+        client.get('/search', query_string={'q': 'audit'})
+        first = (time.perf_counter() - start) * 1000
+
+        timings = []
+        for query in QUERIES:
+            timings += time_request(client, 'GET', '/search', repeat=args.repeat,
+                                    query_string={'q': query, 'page': 2})
+        print(f"/search [{backend:<6}] premier appel {first:7.1f} ms   p50 {percentile(timings, 50):6.2f} ms"
+              f"   p95 {percentile(timings, 95):6.2f} ms   p99 {percentile(timings, 99):6.2f} ms")
+
+    with app.app_context():
+        timings = []
+        for query in QUERIES:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                like_search(query)
+                timings.append((time.perf_counter() - start) * 1000)
+    print(f"LIKE (sans classement)        p50 {percentile(timings, 50):6.2f} ms   p95 {percentile(timings, 95):6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Latence à chaud des routes qui lisent des questions, avec et sans instantané binaire.
+
+Un même processus sert les routes d'un quiz en cours (page de question, lot de
+questions, lot de réponses) en lisant les questions depuis la base, puis
+depuis l'instantané ; la version de l'instantané est vérifiée à chaque lecture.
+Le temps mesuré est le temps de traitement serveur.
+
+Usage : python -m benchmarks.bench_snapshot [--repeat 500] [--batch 10]
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks._common import make_app, seed_questions, percentile
+from benchmarks.bench_questions_count import timed_wsgi
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=10, help="Questions par lot")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cisaquiz-bench-')
+    snap_path = os.path.join(workdir, 'questions.snap')
+    app = make_app(os.path.join(workdir, 'bench.db'))
+    seed_questions(app)
+    with app.app_context():
+        from app.bank import get_bank
+        from app.snapshot import build_from_db, reset_snapshot
+        build_from_db(snap_path)
+        themes = get_bank().themes
+
+    server_ms = timed_wsgi(app)
+    client = app.test_client()
+    session_id = client.post('/quiz/config', json={
+        'themes': themes, 'num_questions': args.batch, 'show_answers': 'end'
+    }).get_json()['session_id']
+    question_ids = [q['id'] for q in client.get(
+        f'/quiz/{session_id}/questions', query_string={'limit': args.batch}).get_json()['questions']]
+    routes = {
+        'page de question': lambda: client.get(f'/quiz/{session_id}'),
+        f'lot de {args.batch} questions': lambda: client.get(
+            f'/quiz/{session_id}/questions', query_string={'limit': args.batch}),
+        f'lot de {args.batch} réponses': lambda: client.post(f'/quiz/{session_id}/answers', json={
+            'answers': [{'question_id': qid, 'answer': 0} for qid in question_ids]}),
+    }
+
+    print(f"{'route':<22} {'mode':<16} {'p50':>8} {'p95':>8}  (ms)")
+    for label, call in routes.items():
+        for mode, path in (('base de données', ''), ('instantané', snap_path)):
+            app.config['QUESTION_SNAPSHOT'] = path
+            with app.app_context():
+                reset_snapshot()
+            call()  # Ouverture de l'instantané hors mesure
+            del server_ms[:]
+            for _ in range(args.repeat):
+                assert call().status_code == 200, label
+            print(f"{label:<22} {mode:<16} {percentile(server_ms, 50):>8.3f} {percentile(server_ms, 95):>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
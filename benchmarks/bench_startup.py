@@ -0,0 +1,108 @@
+"""Démarrage à froid, de l'import jusqu'à la première réponse, selon STARTUP_MODE.
+
+Chaque mesure lance `python -X importtime` dans un nouveau processus qui
+importe run.py (comme la plateforme serverless), puis sert une première page
+(/quiz/config, qui rend un template). Le rapport sépare le temps d'import
+(somme des temps propres relevés par -X importtime, puis par paquet racine),
+l'import du paquet app, create_app() (avec les imports qu'il déclenche) et
+la première réponse.
+
+- full          : create_all, migrations et vérifications à chaque démarrage,
+                  templates compilés au premier rendu
+- fast          : STARTUP_MODE='fast' (une requête sur la version du schéma)
+- fast+bytecode : idem, avec les templates précompilés par precompile.py
+
+Usage : python -m benchmarks.bench_startup [--runs 10] [--top 8]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks._common import ROOT, make_app, seed_questions, percentile
+
+CHILD = r'''
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+import run  # create_app()
+created = time.perf_counter()
+client = run.app.test_client()
+r = client.get('/quiz/config')
+assert r.status_code == 200, r.status_code
+done = time.perf_counter()
+print(f"{(imported - start) * 1000} {(created - imported) * 1000} {(done - created) * 1000} {(done - start) * 1000}")
+'''
+
+
+def parse_importtime(stderr):
+    """Total des imports (µs, somme des temps propres) et ce total par paquet racine"""
+    total, packages = 0, {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        total += int(self_us)
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return total, packages
+
+
+def run_child(env):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=ROOT, env=env,
+                             capture_output=True, text=True)
+    wall = (time.perf_counter() - start) * 1000
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr[-2000:])
+    import_ms, app_ms, first_ms, total_ms = map(float, process.stdout.strip().splitlines()[-1].split())
+    imports, packages = parse_importtime(process.stderr)
+    return {'wall': wall, 'imports': imports / 1000, 'import': import_ms, 'app': app_ms, 'first': first_ms, 'total': total_ms,
+            'packages': packages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cisaquiz-startup-')
+    db_path = os.path.join(workdir, 'bench.db')
+    cache_dir = os.path.join(workdir, 'jinja_cache')
+    app = make_app(db_path)
+    seed_questions(app)
+
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + db_path, QUESTION_SNAPSHOT='', JINJA_BYTECODE_CACHE='')
+    subprocess.run([sys.executable, 'precompile.py'], cwd=ROOT, check=True, stdout=subprocess.DEVNULL,
+                   env=dict(env, JINJA_BYTECODE_CACHE=cache_dir))
+    configurations = {
+        'full': dict(env, STARTUP_MODE='full'),
+        'fast': dict(env, STARTUP_MODE='fast'),
+        'fast+bytecode': dict(env, STARTUP_MODE='fast', JINJA_BYTECODE_CACHE=cache_dir),
+    }
+
+    print(f"{'mode':<15} {'processus':>10} {'imports':>8} {'import app':>11} {'create_app':>11} "
+          f"{'1re rép.':>9} {'import→rép.':>12} {'p95':>7}  (ms, p50)")
+    packages = {}
+    for label, child_env in configurations.items():
+        results = [run_child(child_env) for _ in range(args.runs)]
+        column = lambda key: [r[key] for r in results]
+        print(f"{label:<15} {percentile(column('wall'), 50):>10.1f} {percentile(column('imports'), 50):>8.1f} "
+              f"{percentile(column('import'), 50):>11.1f} {percentile(column('app'), 50):>11.1f} "
+              f"{percentile(column('first'), 50):>9.1f} "
+              f"{percentile(column('total'), 50):>12.1f} {percentile(column('total'), 95):>7.1f}")
+        for result in results:
+            for name, self_us in result['packages'].items():
+                packages[name] = packages.get(name, 0) + self_us / len(results) / len(configurations)
+
+    print("\nImports par paquet racine (ms, moyenne) :")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<20} {self_us / 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
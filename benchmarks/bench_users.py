@@ -0,0 +1,63 @@
+"""Latence des pages d'un apprenant en fonction du nombre d'apprenants.
+
+Chaque apprenant a le même historique (--per-user réponses). Pour 10, 100 puis
+1000 apprenants, les pages d'un seul apprenant sont mesurées avec MULTI_USER :
+leur latence doit dépendre de son historique, pas de la taille de la base.
+
+Usage : python -m benchmarks.bench_users [--users 10,100,1000] [--per-user 200]
+"""
+import argparse
+import subprocess
+import sys
+
+from benchmarks._common import ROOT, make_app, seed_questions, seed_answers, time_request, percentile
+
+
+def run_users(users, args):
+    """Mesures pour un nombre d'apprenants (exécuté dans un processus dédié)"""
+    app = make_app()
+    app.config['MULTI_USER'] = True
+    seed_questions(app)
+    seed_answers(app, users * args.per_user, users=users, seed=users)
+
+    with app.app_context():
+        from app.bank import get_bank
+        themes = get_bank().themes
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    routes = [
+        ('dashboard', 'GET', '/dashboard', {}),
+        ('questions-count', 'GET', '/quiz/config/questions-count',
+         {'query_string': {'themes': themes, 'question_filters': ['new', 'incorrect']}}),
+        ('quiz_config GET', 'GET', '/quiz/config', {}),
+    ]
+    for name, method, url, kwargs in routes:
+        timings = time_request(client, method, url, repeat=args.repeat, **kwargs)
+        print(f"{users:>10} {users * args.per_user:>10} {name:<18} "
+              f"{percentile(timings, 50):>10.2f} {percentile(timings, 95):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', default='10,100,1000')
+    parser.add_argument('--per-user', type=int, default=200, help="Réponses par apprenant")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--run-users', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_users is not None:
+        run_users(args.run_users, args)
+        return
+
+    # Un processus par taille : base et caches neufs à chaque fois
+    print(f"{'apprenants':>10} {'réponses':>10} {'route':<18} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    sys.stdout.flush()
+    for users in (int(u) for u in args.users.split(',')):
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_users', '--run-users', str(users),
+                        '--per-user', str(args.per_user), '--repeat', str(args.repeat)], cwd=ROOT, check=True)
+
+
+if __name__ == '__main__':
+    main()
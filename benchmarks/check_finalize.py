@@ -0,0 +1,130 @@
+"""Vérifier que finaliser des quiz dans le désordre compte chaque réponse une fois.
+
+Deux quiz tirés avec la même graine portent sur les mêmes questions ; les
+réponses du premier sont soumises avant celles du second (IDs plus petits),
+puis le second est finalisé avant le premier, et chaque page de résultats est
+rechargée. Les statistiques incrémentales (question_stats, theme_stats,
+review_state) et le cache des statuts doivent alors être identiques à une
+reconstruction complète depuis l'historique. Chaque mode d'écriture
+(INGESTION='sync', 'async') est vérifié dans un processus dédié. Code de sortie
+1 au premier écart.
+
+Usage : python -m benchmarks.check_finalize [--questions 20]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks._common import ROOT, make_app, seed_questions
+
+MODES = ('sync', 'async')
+
+
+def check(condition, message):
+    if not condition:
+        print(f"ÉCHEC : {message}")
+        sys.exit(1)
+    print(f"[   ok] {message}")
+
+
+def snapshot_stats():
+    """Statistiques de l'apprenant 1, telles que les routes les lisent"""
+    from app import db
+    from app.bank import get_bank
+    from app.models import QuestionStats, ThemeStats, ReviewState
+
+    question_stats = sorted(db.session.query(
+        QuestionStats.question_id, QuestionStats.attempts, QuestionStats.correct_count,
+        QuestionStats.last_answer_id, QuestionStats.last_is_correct
+    ).filter(QuestionStats.user_id == 1).all())
+    theme_stats = sorted(db.session.query(
+        ThemeStats.bank_id, ThemeStats.theme, ThemeStats.answered, ThemeStats.correct,
+        ThemeStats.attempts, ThemeStats.correct_attempts
+    ).filter(ThemeStats.user_id == 1).all())
+    # L'ordre d'application des réponses (donc l'intervalle) dépend de l'ordre de finalisation
+    review_state = sorted(db.session.query(ReviewState.question_id, ReviewState.last_answer_id)
+                          .filter(ReviewState.user_id == 1).all())
+    bank = get_bank(1)
+    statuses = {theme: list(counts) for theme, counts in bank.status_counts.items()}
+    return question_stats, theme_stats, review_state, statuses
+
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix='cisaquiz-finalize-')
+    os.environ.update({'INGESTION': mode, 'INGESTION_JOURNAL': os.path.join(workdir, 'ingestion.journal'),
+                       'QUESTION_SNAPSHOT': ''})
+    app = make_app(os.path.join(workdir, 'check.db'))
+    seed_questions(app)
+    client = app.test_client()
+
+    with app.app_context():
+        from app import db
+        from app.bank import get_bank, invalidate
+        from app.models import Questions
+        from app.review import rebuild_review_states
+        from app.stats import rebuild_question_stats
+
+        themes = get_bank().themes
+        config = {'themes': themes, 'num_questions': args.questions, 'seed': 42}
+        first = client.post('/quiz/config', json=config).get_json()['session_id']
+        second = client.post('/quiz/config', json=config).get_json()['session_id']
+        questions = client.get(f'/quiz/{first}/questions', query_string={'limit': args.questions}) \
+            .get_json()['questions']
+        question_ids = [q['id'] for q in questions]
+        check(question_ids == [q['id'] for q in client.get(
+            f'/quiz/{second}/questions', query_string={'limit': args.questions}).get_json()['questions']],
+            f"[{mode}] deux quiz sur les mêmes {len(question_ids)} questions")
+        correct, wrong = {}, {}
+        for qid, answer, options in db.session.query(Questions.id, Questions.correct, Questions.options) \
+                .filter(Questions.id.in_(question_ids)):
+            correct[qid], wrong[qid] = answer, (answer + 1) % len(options)
+
+        # Premier quiz : bonnes réponses, soumises d'abord ; second quiz : une sur deux
+        for session_id, answer_of in ((first, lambda qid, i: correct[qid]),
+                                      (second, lambda qid, i: correct[qid] if i % 2 else wrong[qid])):
+            response = client.post(f'/quiz/{session_id}/answers', json={'answers': [
+                {'question_id': qid, 'answer': answer_of(qid, i)} for i, qid in enumerate(question_ids)
+            ]})
+            check(response.status_code == 200, f"[{mode}] réponses du quiz {session_id} soumises")
+
+        # Finalisation dans le désordre, puis rechargements
+        for session_id in (second, first, second, first):
+            check(client.get(f'/quiz/{session_id}/results').status_code == 200,
+                  f"[{mode}] résultats du quiz {session_id}")
+        client.get('/dashboard')  # Attend la fin des écritures différées
+
+        incremental = snapshot_stats()
+        check(all(attempts == 2 for _, attempts, _, _, _ in incremental[0]),
+              f"[{mode}] deux tentatives par question")
+
+        rebuild_question_stats()
+        rebuild_review_states()
+        invalidate()
+        rebuilt = snapshot_stats()
+        for name, before, after in zip(('question_stats', 'theme_stats', 'review_state', 'cache des statuts'),
+                                       incremental, rebuilt):
+            check(before == after, f"[{mode}] {name} identique à la reconstruction")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--run-mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        run_mode(args.run_mode, args)
+        return
+
+    # Un processus par mode : l'écriture différée est démarrée par create_app
+    for mode in MODES:
+        result = subprocess.run([sys.executable, '-m', 'benchmarks.check_finalize', '--run-mode', mode,
+                                 '--questions', str(args.questions)], cwd=ROOT)
+        if result.returncode:
+            sys.exit(result.returncode)
+
+
+if __name__ == '__main__':
+    main()
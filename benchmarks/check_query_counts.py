@@ -0,0 +1,108 @@
+"""Vérifier le nombre maximal de requêtes SQL par route (régressions N+1).
+
+Parcourt le cycle complet d'un quiz avec le client de test ; chaque appel
+doit rester sous son budget, indépendant du nombre de questions du quiz et
+de la taille de l'historique. Code de sortie 1 au premier dépassement.
+
+Usage : python -m benchmarks.check_query_counts [--questions 20]
+"""
+import argparse
+import re
+import sys
+
+from benchmarks._common import make_app, seed_questions, seed_answers
+
+QUESTION_ID = re.compile(rb'name="question_id" value="(\d+)"')
+
+# Budgets par route : constants, quel que soit le nombre de questions du quiz
+BUDGETS = {
+    'index': 0,
+    'dashboard': 6,
+    'quiz_config GET': 3,
+    'questions-count': 3,
+    'quiz_config POST': 8,
+    'quiz_page': 6,
+    'submit_answer': 8,
+    'quiz_results': 15,
+    'results (rechargement)': 8,
+    'search': 6,
+    'quiz_questions': 6,
+    'submit_answers': 8,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=20)
+    args = parser.parse_args()
+
+    from app.instrumentation import assert_max_queries
+
+    app = make_app()
+    seed_questions(app)
+    seed_answers(app, 5000)
+    seed_questions(app, bank='cism')  # Seconde banque : mêmes budgets, banque choisie par ?bank=
+    client = app.test_client()
+    counts = {}
+
+    def check(name, method, url, **kwargs):
+        response, queries = assert_max_queries(client, method, url, BUDGETS[name], **kwargs)
+        assert response.status_code < 400, (name, response.status_code)
+        counts[name] = max(counts.get(name, 0), queries)
+        return response
+
+    try:
+        with app.app_context():
+            from app.bank import get_bank
+            themes = get_bank().themes
+
+            check('index', 'GET', '/')
+            check('dashboard', 'GET', '/dashboard')
+            check('quiz_config GET', 'GET', '/quiz/config')
+            check('questions-count', 'GET', '/quiz/config/questions-count',
+                  query_string={'themes': themes, 'question_filters': ['new', 'incorrect']})
+            response = check('quiz_config POST', 'POST', '/quiz/config',
+                             json={'themes': themes, 'num_questions': args.questions})
+            session_id = response.get_json()['session_id']
+
+            for _ in range(args.questions):
+                page = check('quiz_page', 'GET', f'/quiz/{session_id}')
+                question_id = int(QUESTION_ID.search(page.data).group(1))
+                check('submit_answer', 'POST', f'/quiz/{session_id}/answer',
+                      json={'question_id': question_id, 'answer': 1})
+
+            check('quiz_results', 'GET', f'/quiz/{session_id}/results')
+            check('results (rechargement)', 'GET', f'/quiz/{session_id}/results')
+            check('search', 'GET', '/search', query_string={'q': 'business continuity'})
+
+            # Même quiz avec l'API par lots : budgets indépendants de la taille des lots
+            response = client.post('/quiz/config', json={'themes': themes, 'num_questions': args.questions})
+            session_id = response.get_json()['session_id']
+            for start in range(0, args.questions, 10):
+                questions = check('quiz_questions', 'GET', f'/quiz/{session_id}/questions',
+                                  query_string={'start': start, 'limit': 10}).get_json()['questions']
+                check('submit_answers', 'POST', f'/quiz/{session_id}/answers',
+                      json={'answers': [{'question_id': q['id'], 'answer': 1} for q in questions]})
+
+            # Seconde banque
+            check('quiz_config GET', 'GET', '/quiz/config', query_string={'bank': 'cism'})
+            check('questions-count', 'GET', '/quiz/config/questions-count',
+                  query_string={'bank': 'cism', 'themes': themes, 'question_filters': ['new']})
+            response = check('quiz_config POST', 'POST', '/quiz/config',
+                             json={'bank': 'cism', 'themes': themes, 'num_questions': args.questions})
+            session_id = response.get_json()['session_id']
+            questions = client.get(f'/quiz/{session_id}/questions', query_string={'limit': 100}).get_json()
+            check('submit_answers', 'POST', f'/quiz/{session_id}/answers',
+                  json={'answers': [{'question_id': q['id'], 'answer': 1} for q in questions['questions']]})
+            check('quiz_results', 'GET', f'/quiz/{session_id}/results')
+            check('dashboard', 'GET', '/dashboard', query_string={'bank': 'cism'})
+    except AssertionError as e:
+        print(f"ÉCHEC : {e}")
+        sys.exit(1)
+
+    for name, queries in counts.items():
+        print(f"[   ok] {name:<24} {queries:3d} requêtes (budget {BUDGETS[name]})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Vérifier par EXPLAIN QUERY PLAN qu'aucune requête chaude ne parcourt une table entière.
+
+Un parcours d'index couvrant (« SCAN ... USING COVERING INDEX ») est accepté :
+il ne lit que l'index, borné par la taille de la banque. Un « SCAN <table> »
+sans index fait échouer la vérification (code de sortie 1).
+
+Usage : python -m benchmarks.check_query_plans
+"""
+import re
+import sys
+
+from benchmarks._common import make_app, seed_questions, seed_answers
+
+FULL_SCAN = re.compile(r'^SCAN (\S+)(?!.* USING )')
+
+
+def hot_queries():
+    """Les requêtes exécutées à chaque requête HTTP, telles que les routes les construisent.
+
+    Chaque entrée associe la requête aux tables dont le parcours est attendu.
+    """
+    from datetime import datetime, timezone
+    from sqlalchemy import func, case
+    from app import db, bank
+    from app.models import Questions, SessionQuiz, SessionAnswer, QuestionStats, ThemeStats, ReviewState
+
+    bank._current_versions(1, 1)
+    session_ids = [1, 2, 3]
+    return {
+        'version de la banque': (bank._versions_query.params(bank_id=1, revision_key='stats_revision:1'),
+                                 {'CONSTANT'}),
+        # Index couvrant (bank_id, theme, id) : seules les questions de la banque sont lues
+        'chargement de la banque': db.session.query(Questions.id, Questions.theme).filter(Questions.bank_id == 1),
+        'statuts de l\'apprenant': db.session.query(
+            QuestionStats.question_id, QuestionStats.attempts, QuestionStats.correct_count
+        ).filter(QuestionStats.user_id == 1, QuestionStats.bank_id == 1),
+        'thèmes de la banque': db.session.query(Questions.theme).filter(Questions.bank_id == 1).distinct(),
+        # Totaux par thème : clé primaire (user_id, bank_id, theme), dans l'ordre du ORDER BY
+        'dashboard : par thème': db.session.query(ThemeStats.theme, ThemeStats.correct, ThemeStats.answered)
+            .filter(ThemeStats.user_id == 1, ThemeStats.bank_id == 1, ThemeStats.answered > 0)
+            .order_by(ThemeStats.theme),
+        'dashboard : questions de la banque': db.session.query(func.count(Questions.id))
+            .filter(Questions.bank_id == 1),
+        # Index (user_id, bank_id, id_session) parcouru à rebours, interrompu par le LIMIT
+        'dashboard : sessions récentes': SessionQuiz.query.filter(SessionQuiz.user_id == 1, SessionQuiz.bank_id == 1)
+            .order_by(SessionQuiz.id_session.desc()).limit(10),
+        'dashboard : réponses des sessions': db.session.query(
+            SessionAnswer.session_id,
+            func.sum(case((SessionAnswer.is_correct == True, 1), else_=0)),
+            func.count(SessionAnswer.id)
+        ).filter(SessionAnswer.session_id.in_(session_ids)).group_by(SessionAnswer.session_id),
+        'progression du quiz': db.session.query(
+            SessionAnswer.question_id, SessionAnswer.user_answer, SessionAnswer.is_correct
+        ).filter(SessionAnswer.session_id == 1).order_by(SessionAnswer.id),
+        'résultats : réponses + questions': db.session.query(
+            SessionAnswer, Questions.text, Questions.options, Questions.correct,
+            Questions.explanation, Questions.theme
+        ).join(Questions, Questions.id == SessionAnswer.question_id)
+         .filter(SessionAnswer.session_id == 1).order_by(SessionAnswer.id),
+        'résultats : statistiques existantes': QuestionStats.query.filter(
+            QuestionStats.user_id == 1, QuestionStats.question_id.in_([1, 2, 3])
+        ),
+        'filtre due': db.session.query(ReviewState.question_id).filter(
+            ReviewState.user_id == 1, ReviewState.bank_id == 1, ReviewState.next_due <= datetime.now(timezone.utc),
+            ReviewState.theme.in_(bank.get_bank().themes)
+        ).order_by(ReviewState.next_due).limit(50),
+    }
+
+
+def explain(query):
+    from app import db
+
+    statement = getattr(query, 'statement', query)
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)).all()
+    return [row[-1] for row in rows]
+
+
+def main():
+    app = make_app()
+    seed_questions(app)
+    seed_answers(app, 5000)
+
+    failures = 0
+    with app.app_context():
+        for name, query in hot_queries().items():
+            query, allowed = query if isinstance(query, tuple) else (query, set())
+            plan = explain(query)
+            scans = [m.group(1) for m in map(FULL_SCAN.match, plan) if m and m.group(1) not in allowed]
+            status = 'ÉCHEC' if scans else 'ok'
+            failures += bool(scans)
+            print(f"[{status:>5}] {name}")
+            for line in plan:
+                print(f"          {line}")
+    if failures:
+        print(f"\n{failures} requête(s) chaude(s) parcourent une table entière")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Vérifier le cache des réponses : en-têtes, 304 et invalidation après un import.
+
+Pour chaque backend ('memory', 'filesystem') : une page en cache ne relit que
+la révision de la banque, une requête conditionnelle reçoit un 304, des
+paramètres d'URL que la vue ignore ne créent pas d'entrée, le cache reste
+borné à RESPONSE_CACHE_MAX_ENTRIES, et un import qui ajoute une question rend
+les pages en cache périmées (nouvel ETag, nouveau contenu). Code de sortie 1
+au premier échec.
+
+Usage : python -m benchmarks.check_response_cache
+"""
+import json
+import os
+import sys
+import tempfile
+
+from benchmarks._common import make_app, seed_questions
+
+
+def check(condition, message):
+    if not condition:
+        print(f"ÉCHEC : {message}")
+        sys.exit(1)
+    print(f"[   ok] {message}")
+
+
+def import_question(app, theme, word):
+    """Importer une question d'un nouveau thème, contenant un mot introuvable ailleurs"""
+    from import_from_json import import_from_json
+
+    path = os.path.join(tempfile.mkdtemp(prefix='cisaquiz-cache-'), 'questions.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([{'text': f'Question {word} ?', 'options': {'A': 'a', 'B': 'b', 'C': 'c', 'D': 'd'},
+                    'correct': 'A', 'explanation': '', 'theme': theme}], f)
+    with app.app_context():
+        import_from_json(path, verbose=False)
+
+
+def main():
+    from app.instrumentation import count_queries
+    from app.response_cache import get_response_cache
+
+    app = make_app()
+    seed_questions(app)
+    client = app.test_client()
+
+    for backend in ('memory', 'filesystem'):
+        print(f"-- {backend}")
+        app.config['RESPONSE_CACHE'] = backend
+        app.config['RESPONSE_CACHE_DIR'] = tempfile.mkdtemp(prefix='cisaquiz-cache-')
+        app.extensions.pop('response_cache', None)
+        theme, word = f'Thème ajouté ({backend})', f'zorglub{backend}'
+
+        first = client.get('/quiz/config')
+        etag, last_modified = first.headers.get('ETag'), first.headers.get('Last-Modified')
+        check(first.status_code == 200 and etag and last_modified, "ETag et Last-Modified présents")
+        check('s-maxage' in first.headers.get('Cache-Control', ''), "Cache-Control public avec s-maxage")
+
+        with app.app_context(), count_queries() as statements:
+            second = client.get('/quiz/config')
+        check(second.data == first.data and len(statements) == 1,
+              f"page servie depuis le cache ({len(statements)} requête SQL)")
+
+        check(client.get('/quiz/config', headers={'If-None-Match': etag}).status_code == 304,
+              "If-None-Match : 304")
+        check(client.get('/quiz/config', headers={'If-Modified-Since': last_modified}).status_code == 304,
+              "If-Modified-Since : 304")
+        check(client.get('/search', query_string={'q': word}).get_json()['total'] == 0,
+              "recherche avant import : aucun résultat")
+
+        with app.app_context(), count_queries() as statements:
+            client.get('/quiz/config', query_string={'junk': backend})
+        check(len(statements) == 1, "paramètre ignoré par la vue : page servie depuis le cache")
+        with app.app_context():
+            cache = get_response_cache()
+            cache.max_entries = 8
+            for i in range(20):
+                client.get('/search', query_string={'q': f'audit{i}'})
+            entries = len(cache._entries) if backend == 'memory' else len(os.listdir(cache.directory))
+        check(entries <= 8, f"cache borné : {entries} entrées pour 20 recherches (maximum 8)")
+
+        import_question(app, theme, word)
+
+        after = client.get('/quiz/config', headers={'If-None-Match': etag})
+        check(after.status_code == 200 and after.headers['ETag'] != etag, "après import : nouvel ETag")
+        check(theme.encode() in after.data, "après import : nouveau thème affiché")
+        check(client.get('/search', query_string={'q': word}).get_json()['total'] == 1,
+              "recherche après import : question trouvée")
+
+
+if __name__ == '__main__':
+    main()
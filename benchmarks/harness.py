@@ -0,0 +1,290 @@
+"""Banc d'essai complet du cycle de vie d'un quiz, avec rapport JSON comparable.
+
+Pour chaque taille d'historique (10k, 100k, 1M réponses par défaut), un
+processus séparé :
+
+1. crée une base SQLite temporaire, importe cisa_questions.json et génère un
+   historique synthétique de sessions et de réponses ;
+2. parcourt plusieurs fois config -> questions-count -> N x (page + réponse)
+   -> résultats -> dashboard avec le client de test Flask, en comptant les
+   requêtes SQL de chaque appel ;
+3. sert l'application sur un serveur WSGI multi-thread local et y envoie des
+   quiz complets depuis plusieurs clients concurrents pendant une durée fixe.
+
+Le rapport donne, par endpoint, p50/p95/p99, débit, requêtes SQL et pic de
+mémoire résidente. --compare affiche l'évolution des p95 par rapport à un
+rapport précédent.
+
+Usage : python -m benchmarks.harness [--sizes 10000 100000 1000000] [--output rapport.json]
+        python -m benchmarks.harness --compare ancien.json nouveau.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import re
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from benchmarks._common import ROOT, make_app, seed_questions, seed_answers, percentile
+
+QUESTION_ID = re.compile(rb'name="question_id" value="(\d+)"')
+
+
+def peak_rss_kb():
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+class Recorder:
+    """Durées, requêtes SQL et pic de mémoire par endpoint (partagé entre threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.queries = {}
+        self.rss = {}
+
+    def add(self, endpoint, seconds, queries=None):
+        with self._lock:
+            self.timings.setdefault(endpoint, []).append(seconds * 1000)
+            if queries is not None:
+                self.queries.setdefault(endpoint, []).append(queries)
+            self.rss[endpoint] = max(self.rss.get(endpoint, 0), peak_rss_kb())
+
+    def summary(self, elapsed):
+        report = {}
+        for endpoint, timings in sorted(self.timings.items()):
+            queries = self.queries.get(endpoint)
+            report[endpoint] = {
+                'requests': len(timings),
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'throughput_rps': round(len(timings) / elapsed, 1) if elapsed else None,
+                'sql_queries': max(queries) if queries else None,
+                'peak_rss_kb': self.rss[endpoint],
+            }
+        return report
+
+
+def run_lifecycle(app, recorder, themes, num_questions):
+    """Un quiz complet avec le client de test, requêtes SQL comptées à chaque appel"""
+    from app.instrumentation import count_queries
+
+    client = app.test_client()
+
+    def call(endpoint, method, url, **kwargs):
+        with app.app_context(), count_queries() as statements:
+            start = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            elapsed = time.perf_counter() - start
+        assert response.status_code < 400, (endpoint, response.status_code)
+        recorder.add(endpoint, elapsed, len(statements))
+        return response
+
+    call('quiz_config GET', 'GET', '/quiz/config')
+    call('questions-count', 'GET', '/quiz/config/questions-count',
+         query_string={'themes': themes, 'question_filters': ['new', 'answered', 'incorrect']})
+    session_id = call('quiz_config POST', 'POST', '/quiz/config',
+                      json={'themes': themes, 'num_questions': num_questions}).get_json()['session_id']
+    for _ in range(num_questions):
+        page = call('quiz_page', 'GET', f'/quiz/{session_id}')
+        question_id = int(QUESTION_ID.search(page.data).group(1))
+        call('submit_answer', 'POST', f'/quiz/{session_id}/answer',
+             json={'question_id': question_id, 'answer': 0})
+    call('quiz_results', 'GET', f'/quiz/{session_id}/results')
+    call('dashboard', 'GET', '/dashboard')
+
+
+def http_lifecycle(port, recorder, themes, num_questions, deadline):
+    """Quiz complets envoyés par HTTP jusqu'à l'échéance (un thread client)"""
+    def call(endpoint, method, path, body=None):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        start = time.perf_counter()
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        recorder.add(endpoint, time.perf_counter() - start)
+        connection.close()
+        assert response.status < 400, (endpoint, response.status)
+        return data
+
+    while time.perf_counter() < deadline:
+        query = urlencode([('themes', t) for t in themes] + [('question_filters', 'new'), ('question_filters', 'incorrect')])
+        call('questions-count', 'GET', '/quiz/config/questions-count?' + query)
+        session_id = json.loads(call('quiz_config POST', 'POST', '/quiz/config',
+                                     {'themes': themes, 'num_questions': num_questions}))['session_id']
+        for _ in range(num_questions):
+            page = call('quiz_page', 'GET', f'/quiz/{session_id}')
+            question_id = int(QUESTION_ID.search(page).group(1))
+            call('submit_answer', 'POST', f'/quiz/{session_id}/answer', {'question_id': question_id, 'answer': 0})
+        call('quiz_results', 'GET', f'/quiz/{session_id}/results')
+        call('dashboard', 'GET', '/dashboard')
+
+
+def run_load(app, themes, num_questions, concurrency, duration):
+    """Charge concurrente sur un serveur WSGI multi-thread local"""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    recorder = Recorder()
+    errors = []
+
+    def worker():
+        try:
+            http_lifecycle(server.port, recorder, themes, num_questions, deadline)
+        except Exception as e:  # Reporté dans le rapport plutôt que d'interrompre les autres clients
+            errors.append(repr(e))
+
+    start = time.perf_counter()
+    deadline = start + duration
+    workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    total = sum(len(t) for t in recorder.timings.values())
+    return {
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 2),
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 1),
+        'errors': errors,
+        'endpoints': recorder.summary(elapsed),
+    }
+
+
+def run_size(num_answers, args):
+    """Mesures pour une taille d'historique (exécuté dans un processus dédié)"""
+    workdir = tempfile.mkdtemp(prefix='cisaquiz-harness-')
+    os.environ['QUESTION_SNAPSHOT'] = ''
+    app = make_app(os.path.join(workdir, 'bench.db'))
+
+    start = time.perf_counter()
+    seed_questions(app)
+    seed_answers(app, num_answers)
+    seed_seconds = time.perf_counter() - start
+
+    with app.app_context():
+        from app.bank import get_bank
+        themes = get_bank().themes
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    for _ in range(args.quizzes):
+        run_lifecycle(app, recorder, themes, args.questions)
+    client_elapsed = time.perf_counter() - start
+
+    return {
+        'answers': num_answers,
+        'seed_seconds': round(seed_seconds, 2),
+        'client': {
+            'quizzes': args.quizzes,
+            'questions_per_quiz': args.questions,
+            'seconds': round(client_elapsed, 2),
+            'endpoints': recorder.summary(client_elapsed),
+        },
+        'load': run_load(app, themes, args.questions, args.concurrency, args.duration),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+    }
+
+
+def compare(old_path, new_path):
+    """Afficher l'évolution des p95 par taille et par endpoint"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['environment'].get('commit')} -> {new['environment'].get('commit')}  (p95 en ms)")
+    for size, result in new['sizes'].items():
+        previous = old['sizes'].get(size)
+        if previous is None:
+            continue
+        for phase in ('client', 'load'):
+            for endpoint, stats in result[phase]['endpoints'].items():
+                before = previous[phase]['endpoints'].get(endpoint)
+                if before is None:
+                    continue
+                delta = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+                print(f"{size:>8} {phase:<6} {endpoint:<18} {before['p95_ms']:9.2f} {stats['p95_ms']:9.2f} {delta:+7.1f} %")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--quizzes', type=int, default=5, help="Quiz parcourus avec le client de test")
+    parser.add_argument('--questions', type=int, default=20, help="Questions par quiz")
+    parser.add_argument('--concurrency', type=int, default=4, help="Clients HTTP concurrents")
+    parser.add_argument('--duration', type=float, default=10, help="Durée de la charge concurrente (s)")
+    parser.add_argument('--output', help="Fichier du rapport JSON (sortie standard par défaut)")
+    parser.add_argument('--compare', nargs=2, metavar=('ANCIEN', 'NOUVEAU'))
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.run_size is not None:
+        # Processus enfant : une taille, résultat JSON sur la dernière ligne
+        print(json.dumps(run_size(args.run_size, args)))
+        return
+
+    report = {'environment': environment(), 'sizes': {}}
+    for size in args.sizes:
+        print(f"[{size} réponses] ...", file=sys.stderr)
+        command = [sys.executable, '-m', 'benchmarks.harness', '--run-size', str(size),
+                   '--quizzes', str(args.quizzes), '--questions', str(args.questions),
+                   '--concurrency', str(args.concurrency), '--duration', str(args.duration)]
+        output = subprocess.run(command, cwd=ROOT, stdout=subprocess.PIPE, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        report['sizes'][str(size)] = result
+        load = result['load']
+        print(f"[{size} réponses] import {result['seed_seconds']} s, charge {load['throughput_rps']} req/s, "
+              f"{len(load['errors'])} erreurs, pic RSS {result['peak_rss_kb'] // 1024} Mo", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
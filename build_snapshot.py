@@ -0,0 +1,32 @@
+import argparse
+import os
+import time
+
+from app import create_app
+from app.snapshot import build_from_db, snapshot_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compiler la banque de questions de la base en un instantané binaire (à lancer au build)"
+    )
+    parser.add_argument('--output', help="Chemin de l'instantané (par défaut QUESTION_SNAPSHOT ou instance/questions.snap)")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        path = args.output or snapshot_path(app)
+        if not path:
+            print("Erreur: QUESTION_SNAPSHOT est vide, aucun chemin de sortie.")
+            raise SystemExit(1)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        start = time.perf_counter()
+        count = build_from_db(path)
+        elapsed = time.perf_counter() - start
+        print(f"✓ {count} questions compilées dans {path} "
+              f"({os.path.getsize(path) / 1024:.0f} Ko, {elapsed:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
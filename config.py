@@ -3,4 +3,62 @@ import os
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Base de lecture (réplica) pour les routes @read_only ; sinon DB_READ_POOL ouvre un second pool sur la même base
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('DATABASE_READ_URL')
+    DB_READ_POOL = os.environ.get('DB_READ_POOL', '').lower() in ('1', 'true', 'yes')
+    DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', 10))
+    # Pool de connexions (bases fichier et serveur) ; pre-ping et recyclage pour PostgreSQL
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # secondes
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # secondes
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes')
+    # Pragmas appliqués à chaque connexion SQLite (une chaîne vide laisse la valeur par défaut)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))  # octets
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -16000))  # négatif : en Kio
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # millisecondes
+    # Instantané binaire des questions (build_snapshot.py) ; par défaut instance/questions.snap,
+    # une chaîne vide le désactive
+    QUESTION_SNAPSHOT = os.environ.get('QUESTION_SNAPSHOT')
+    # Stockage de l'état des quiz en cours : 'sql' (table partagée) ou 'memory' (LRU par processus)
+    QUIZ_STATE_BACKEND = os.environ.get('QUIZ_STATE_BACKEND', 'sql')
+    QUIZ_STATE_TTL = int(os.environ.get('QUIZ_STATE_TTL', 24 * 3600))  # secondes sans activité
+    QUIZ_STATE_MAX_ENTRIES = int(os.environ.get('QUIZ_STATE_MAX_ENTRIES', 10000))  # backend 'memory'
+    # Recherche plein texte : 'fts' (SQLite FTS5), 'memory' (index inversé) ou 'auto'
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+    # Instrumentation (Server-Timing, /metrics) : désactivée par défaut
+    INSTRUMENTATION = os.environ.get('INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+    INSTRUMENTATION_SLOW_STATEMENTS = int(os.environ.get('INSTRUMENTATION_SLOW_STATEMENTS', 10))
+    # Un apprenant par navigateur (cookie de session) ; sinon tout est attribué à l'apprenant par défaut
+    MULTI_USER = os.environ.get('MULTI_USER', '').lower() in ('1', 'true', 'yes')
+    # Poids des domaines de l'examen CISA (répartition 'exam' du tirage, voir app.sampling)
+    EXAM_THEME_WEIGHTS = {
+        'The Process of Auditing Information Systems.': 18,
+        'Governance and Management of IT.': 18,
+        'Information Systems Acquisition, Development and Implementation.': 12,
+        'Information Systems Operations, Maintenance and Service Management.': 26,
+        'Protection of Information Assets.': 26,
+    }
+    # Démarrage : 'full' (create_all et migrations à chaque démarrage) ou 'fast' (voir app.startup)
+    STARTUP_MODE = os.environ.get('STARTUP_MODE', 'full')
+    # Bytecode des templates Jinja (precompile.py) ; par défaut instance/jinja_cache, une chaîne vide le désactive
+    JINJA_BYTECODE_CACHE = os.environ.get('JINJA_BYTECODE_CACHE')
+    # Questions renvoyées par lot à la page de quiz (API JSON /quiz/<id>/questions)
+    QUIZ_PREFETCH_SIZE = int(os.environ.get('QUIZ_PREFETCH_SIZE', 10))
+    # Cache des pages qui ne dépendent que de la banque : 'memory', 'filesystem' ou 'none'
+    RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'memory')
+    RESPONSE_CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR')  # backend 'filesystem', défaut instance/response_cache
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 256))  # par processus ou répertoire
+    RESPONSE_CACHE_SHARED_MAX_AGE = int(os.environ.get('RESPONSE_CACHE_SHARED_MAX_AGE', 60))  # s-maxage (edge)
+    # Écriture des réponses : 'sync' (dans la requête) ou 'async' (file + thread, voir app.ingestion)
+    INGESTION = os.environ.get('INGESTION', 'sync')
+    INGESTION_BATCH_SIZE = int(os.environ.get('INGESTION_BATCH_SIZE', 500))  # opérations par transaction
+    INGESTION_FLUSH_INTERVAL = float(os.environ.get('INGESTION_FLUSH_INTERVAL', 0.05))  # secondes
+    INGESTION_JOURNAL = os.environ.get('INGESTION_JOURNAL')  # défaut instance/ingestion.journal
+    INGESTION_FSYNC = os.environ.get('INGESTION_FSYNC', '').lower() in ('1', 'true', 'yes')
+    INGESTION_WAIT_TIMEOUT = float(os.environ.get('INGESTION_WAIT_TIMEOUT', 10))  # secondes (lire ses écritures)
+    INGESTION_MAX_RETRIES = int(os.environ.get('INGESTION_MAX_RETRIES', 3))  # essais d'un lot avant isolement
+    INGESTION_DEAD_LETTER = os.environ.get('INGESTION_DEAD_LETTER')  # défaut INGESTION_JOURNAL + '.failed'
@@ -0,0 +1,30 @@
+import argparse
+import os
+import time
+
+from app import create_app
+from app.history import export_history
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exporter l'historique des réponses en fichier colonnaire (voir app.history)"
+    )
+    parser.add_argument('--output', help="Chemin du fichier (par défaut instance/history.cqh)")
+    parser.add_argument('--user', type=int, help="N'exporter que les réponses de cet apprenant")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        path = args.output or os.path.join(app.instance_path, 'history.cqh')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        start = time.perf_counter()
+        rows = export_history(path, user_id=args.user)
+        elapsed = time.perf_counter() - start
+        print(f"✓ {rows} réponses exportées dans {path} "
+              f"({os.path.getsize(path) / 1024:.0f} Ko, {elapsed:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,91 +1,271 @@
+import argparse
+import hashlib
 import json
+import os
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import bindparam
+
 from app import create_app, db
-from app.models import Questions
+from app.models import Questions, QuestionStats, ReviewState
+from app.banks import DEFAULT_BANK_CODE, get_or_create_bank
+from app.bank import invalidate
+from app.snapshot import build_from_db, reset_snapshot, snapshot_path
+from app.search import get_search_index
+from app.response_cache import bank_changed
+from app.stats import rebuild_theme_stats
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """Lire un tableau JSON élément par élément sans charger tout le fichier"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    pos = 0
+    eof = not buffer
+    started = False
+
+    while True:
+        # Sauter les blancs et les virgules, en relisant si le tampon est épuisé
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            buffer = f.read(chunk_size)
+            pos = 0
+            eof = not buffer
+
+        if pos >= len(buffer):
+            raise ValueError("Fichier JSON tronqué : tableau non terminé")
+
+        if not started:
+            if buffer[pos] != '[':
+                raise ValueError("Le fichier JSON doit contenir un tableau de questions")
+            started = True
+            pos += 1
+            continue
+
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            if end == len(buffer) and not eof:
+                raise json.JSONDecodeError("Élément peut-être incomplet", buffer, end)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Élément coupé par la fin du tampon : compléter et réessayer
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        yield item
+        pos = end
+
+
+def normalize_question(q_data):
+    """Convertir une question du JSON source au format de la table questions"""
+    # Convertir les options du format dictionnaire au format liste
+    if isinstance(q_data.get('options'), dict):
+        options_list = [
+            q_data['options'].get('A', ''),
+            q_data['options'].get('B', ''),
+            q_data['options'].get('C', ''),
+            q_data['options'].get('D', '')
+        ]
+    else:
+        options_list = q_data.get('options', [])
+
+    # Convertir la réponse correcte de lettre à index
+    correct = q_data.get('correct', '')
+    if isinstance(correct, str) and correct in 'ABCD':
+        correct_index = ord(correct) - ord('A')
+    else:
+        correct_index = int(correct) if isinstance(correct, (int, str)) and str(correct).isdigit() else 0
+
+    # Limiter l'explication
+    explanation = q_data.get('explanation', '') or ''
+    if len(explanation) > 1000:
+        explanation = explanation[:997] + "..."
+
+    return {
+        'text': q_data.get('text', ''),
+        'options': options_list,
+        'correct': correct_index,
+        'explanation': explanation,
+        'theme': q_data.get('theme', 'General').strip()
+    }
+
+
+def identity_hash(row):
+    """Identité d'une question : énoncé + options.
+
+    Les `id` du JSON source ne sont pas uniques (plusieurs banques concaténées
+    recommencent à 1), ils ne peuvent donc pas servir de clé.
+    """
+    payload = json.dumps([row['text'], row['options']], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def content_hash(row):
+    """Empreinte des champs modifiables, pour détecter les questions inchangées"""
+    payload = json.dumps([row['correct'], row['explanation'], row['theme']], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def load_existing_index(bank_id):
+    """Associer chaque identité de question existante de la banque à ses (id, empreinte, thème), par ID croissant"""
+    index = {}
+    query = db.session.query(
+        Questions.id, Questions.text, Questions.options, Questions.correct,
+        Questions.explanation, Questions.theme
+    ).filter(Questions.bank_id == bank_id).order_by(Questions.id).execution_options(yield_per=1000)
+    for question_id, text, options, correct, explanation, theme in query:
+        row = {'text': text, 'options': options, 'correct': correct,
+               'explanation': explanation or '', 'theme': theme}
+        index.setdefault(identity_hash(row), []).append((question_id, content_hash(row), theme))
+    return index
+
+
+def import_from_json(json_file, batch_size=500, verbose=True, bank=DEFAULT_BANK_CODE, bank_name=None):
+    """Importer (ou mettre à jour) les questions du fichier JSON dans une banque, par lots.
+
+    La banque est désignée par son code et créée au besoin. Les questions déjà
+    présentes dans la banque sont retrouvées par leur identité (énoncé +
+    options) et mises à jour sur place : leurs IDs, et donc les réponses
+    enregistrées qui y font référence, restent valides. Les autres banques ne
+    sont ni lues ni modifiées. Retourne le résumé.
+    """
+    summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+    table = Questions.__table__
+    update_stmt = table.update().where(table.c.id == bindparam('b_id')).values(
+        correct=bindparam('correct'),
+        explanation=bindparam('explanation'),
+        theme=bindparam('theme'),
+        updated_at=bindparam('updated_at')
+    )
 
-app = create_app()
+    start = time.perf_counter()
+    bank_id = get_or_create_bank(bank, bank_name)
+    existing = load_existing_index(bank_id)
+    to_insert, to_update, retheme = [], [], []
+
+    def flush():
+        if to_insert:
+            db.session.execute(table.insert(), to_insert)
+        if to_update:
+            db.session.execute(update_stmt, to_update)
+        if retheme:
+            # Questions changées de thème : les copies du thème dans les statistiques
+            # suivent, dans la même transaction, et theme_stats est réagrégé
+            for model in (QuestionStats, ReviewState):
+                db.session.query(model).filter(model.question_id.in_(retheme)).update(
+                    {model.theme: db.select(Questions.theme).where(Questions.id == model.question_id)
+                     .scalar_subquery()},
+                    synchronize_session=False
+                )
+            rebuild_theme_stats()
+        db.session.commit()
+        to_insert.clear()
+        to_update.clear()
+        retheme.clear()
 
-def import_from_json(json_file):
-    """Importe les questions depuis le fichier JSON dans la base de données"""
     with open(json_file, 'r', encoding='utf-8') as f:
-        questions_data = json.load(f)
-    
-    with app.app_context():
-        # Vérifier si des questions existent déjà
-        existing_count = Questions.query.count()
-        if existing_count > 0:
-            response = input(f"La base de données contient déjà {existing_count} questions. Continuer ? (y/n): ")
-            if response.lower() != 'y':
-                print("Import annulé.")
-                return
-            # Supprimer les questions existantes
-            Questions.query.delete()
-            db.session.commit()
-            print("Questions existantes supprimées.")
-        
-        # Ajouter les questions du JSON
-        added_count = 0
-        for i, q_data in enumerate(questions_data, 1):
+        for i, q_data in enumerate(iter_json_array(f), 1):
             try:
-                # Convertir les options du format dictionnaire au format liste
-                if isinstance(q_data.get('options'), dict):
-                    options_list = [
-                        q_data['options'].get('A', ''),
-                        q_data['options'].get('B', ''),
-                        q_data['options'].get('C', ''),
-                        q_data['options'].get('D', '')
-                    ]
-                else:
-                    options_list = q_data.get('options', [])
-                
-                # Convertir la réponse correcte de lettre à index
-                correct = q_data.get('correct', '')
-                if isinstance(correct, str) and correct in 'ABCD':
-                    correct_index = ord(correct) - ord('A')
-                else:
-                    correct_index = int(correct) if isinstance(correct, (int, str)) and str(correct).isdigit() else 0
-                
-                # Extraire le thème
-                theme = q_data.get('theme', 'General').strip()
-                
-                # Limiter l'explication
-                explanation = q_data.get('explanation', '')
-                if len(explanation) > 1000:
-                    explanation = explanation[:997] + "..."
-                
-                question = Questions(
-                    text=q_data.get('text', ''),
-                    options=options_list,
-                    correct=correct_index,
-                    explanation=explanation,
-                    theme=theme
-                )
-                db.session.add(question)
-                added_count += 1
-                
-                if i % 100 == 0:
-                    print(f"[{i}/{len(questions_data)}] Traitement en cours...")
-                
+                row = normalize_question(q_data)
             except Exception as e:
                 print(f"Erreur à la ligne {i}: {e}")
+                summary['errors'] += 1
                 continue
-        
-        # Commiter les changements
+
+            row['updated_at'] = datetime.now(timezone.utc)
+            row['bank_id'] = bank_id
+            matches = existing.get(identity_hash(row))
+            if matches:
+                # Les doublons du fichier sont associés, dans l'ordre, aux doublons de la base
+                question_id, old_hash, old_theme = matches.pop(0)
+                if old_hash == content_hash(row):
+                    summary['unchanged'] += 1
+                else:
+                    to_update.append({'b_id': question_id, 'correct': row['correct'],
+                                      'explanation': row['explanation'], 'theme': row['theme'],
+                                      'updated_at': row['updated_at']})
+                    summary['updated'] += 1
+                    if row['theme'] != old_theme:
+                        retheme.append(question_id)
+            else:
+                to_insert.append(row)
+                summary['inserted'] += 1
+
+            if len(to_insert) + len(to_update) >= batch_size:
+                flush()
+            if verbose and i % 1000 == 0:
+                print(f"[{i}] Traitement en cours...")
+
+    flush()
+    invalidate()
+    if summary['inserted'] or summary['updated']:
+        # Nouvelle version de la banque : les pages en cache sont périmées
+        bank_changed()
         db.session.commit()
-        print(f"\n✓ {added_count} questions ont été importées avec succès !")
-        
-        # Afficher les statistiques
-        total = Questions.query.count()
-        themes = db.session.query(Questions.theme).distinct().all()
-        print(f"Total questions: {total}")
+
+    # Un instantané existant ne correspond plus à la base : le recompiler
+    path = snapshot_path(current_app)
+    if path and os.path.exists(path):
+        build_from_db(path)
+    reset_snapshot()
+
+    # Réindexer pour la recherche les questions ajoutées ou modifiées
+    get_search_index().sync()
+
+    elapsed = time.perf_counter() - start
+    processed = summary['inserted'] + summary['updated'] + summary['unchanged']
+    summary['bank_id'] = bank_id
+    summary['seconds'] = round(elapsed, 3)
+    summary['rows_per_sec'] = round(processed / elapsed) if elapsed > 0 else processed
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importer les questions depuis un fichier JSON (sans interaction)")
+    parser.add_argument('json_file', nargs='?', default='cisa_questions.json')
+    parser.add_argument('--batch-size', type=int, default=500, help="Nombre de lignes écrites par transaction")
+    parser.add_argument('--bank', default=DEFAULT_BANK_CODE, help="Code de la banque (créée si besoin)")
+    parser.add_argument('--bank-name', help="Nom affiché d'une nouvelle banque (par défaut le code en majuscules)")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.json_file):
+        print(f"Erreur: Le fichier {args.json_file} n'existe pas.")
+        raise SystemExit(1)
+
+    app = create_app()
+    with app.app_context():
+        print("Import du fichier JSON dans la base de données...")
+        summary = import_from_json(args.json_file, batch_size=args.batch_size, verbose=not args.quiet,
+                                   bank=args.bank, bank_name=args.bank_name)
+
+        print(f"\n✓ {summary['inserted']} ajoutées, {summary['updated']} mises à jour, "
+              f"{summary['unchanged']} inchangées, {summary['errors']} erreurs "
+              f"({summary['rows_per_sec']} lignes/s, {summary['seconds']} s)")
+
+        # Afficher les statistiques de la banque
+        bank_questions = Questions.query.filter(Questions.bank_id == summary['bank_id'])
+        total = bank_questions.count()
+        themes = bank_questions.with_entities(Questions.theme).distinct().all()
+        print(f"Questions dans la banque {args.bank}: {total}")
         print(f"Nombre de thèmes: {len(themes)}")
         print(f"Thèmes: {', '.join([t[0][:50] for t in themes[:10]])}")
 
+    if summary['errors']:
+        raise SystemExit(1)
+
+
 if __name__ == "__main__":
-    import os
-    json_file = "cisa_questions.json"
-    
-    if not os.path.exists(json_file):
-        print(f"Erreur: Le fichier {json_file} n'existe pas.")
-    else:
-        print("Import du fichier JSON dans la base de données...")
-        import_from_json(json_file)
+    main()
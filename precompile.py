@@ -0,0 +1,40 @@
+import argparse
+import compileall
+import os
+import time
+
+from app import create_app
+from app.startup import precompile_templates
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Précompiler les templates Jinja et les modules Python (à lancer au build)"
+    )
+    parser.parse_args()
+
+    app = create_app()
+    start = time.perf_counter()
+    with app.app_context():
+        try:
+            count = precompile_templates(app)
+        except RuntimeError as e:
+            print(f"Erreur: {e}")
+            raise SystemExit(1)
+    print(f"✓ {count} templates compilés dans {app.jinja_env.bytecode_cache.directory} "
+          f"({time.perf_counter() - start:.2f} s)")
+
+    # Bytecode Python du projet : un déploiement en lecture seule ne peut pas l'écrire au premier import
+    root = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    ok = compileall.compile_dir(os.path.join(root, 'app'), quiet=1)
+    for name in ('config.py', 'run.py'):
+        ok = compileall.compile_file(os.path.join(root, name), quiet=1) and ok
+    if not ok:
+        print("Erreur: échec de la compilation des modules Python")
+        raise SystemExit(1)
+    print(f"✓ Modules Python compilés ({time.perf_counter() - start:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
+import os
+
 from app import create_app
-from dotenv import load_dotenv
 
-load_dotenv()
+# python-dotenv n'est importé que s'il y a un fichier .env (jamais en production serverless)
+if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 app = create_app()
 